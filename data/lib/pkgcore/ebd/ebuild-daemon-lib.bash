@@ -119,6 +119,8 @@ __internal_inherit() {
 	elif [[ ${line} == "transfer" ]]; then
 		__ebd_read_line line
 		__qa_invoke eval "${line}" || die "failed evaluating eclass $1 on transfer"
+	elif [[ ${line} == "unknown" ]]; then
+		die "inherit requires unknown eclass: $1.eclass"
 	else
 		die "unknown inherit command from python for eclass $1: '${line}'"
 	fi
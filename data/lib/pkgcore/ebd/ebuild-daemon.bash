@@ -285,21 +285,26 @@ __ebd_process_ebuild_phases() {
 }
 
 __ebd_process_metadata() {
+	local __data
+	__ebd_read_size "$1" __data
+	__ebd_run_metadata "$2" "${__data}"
+}
+
+# Generate metadata for a given ebuild environment.
+__ebd_run_metadata() {
 	# protect the env.
 	# note the local usage is redundant in light of it, but prefer to write it this
 	# way so that if someone ever drops the (), it'll still not bleed out.
 	(
 		# Heavy QA checks (IFS, shopt, etc) are suppressed for speed
 		declare -r PKGCORE_QA_SUPPRESSED=false
-		# Wipe __mode; it bleeds from our parent.
-		unset -v __mode
-		local __data
+		# Wipe __mode and queued envs; they bleed from our parent.
+		unset -v __mode __data __envs
 		local __ret
-		__ebd_read_size "$1" __data
 		local IFS=$'\0'
-		eval "$__data"
+		eval "$2"
 		__ret=$?
-		unset -v __data
+		set -- "$1"
 		[[ ${__ret} -ne 0 ]] && exit 1
 		unset -v __ret
 		local IFS=$' \t\n'
@@ -314,12 +319,38 @@ __ebd_process_metadata() {
 			die "external commands disallowed during metadata regen: '${*}'"
 		}
 
-		__execute_phases "${2:-depend}" && exit 0
+		__execute_phases "${1:-depend}" && exit 0
 		__ebd_process_sandbox_results
 		exit 1
 	)
 }
 
+# Generate metadata for multiple ebuilds in a single request.
+#
+# All ebuild environments are read up front so the pipe is free for inherit
+# requests while they're processed. Each ebuild's metadata is sent back as a
+# single NUL-delimited line followed by its status line.
+__ebd_process_metadata_batch() {
+	local -a __envs __lines
+	local __i __size __error_output
+	for (( __i = 0; __i < $1; __i++ )); do
+		__ebd_read_line __size
+		__ebd_read_size "${__size}" "__envs[${__i}]"
+	done
+
+	for (( __i = 0; __i < $1; __i++ )); do
+		# capture sourcing stderr output
+		if __error_output=$(PKGCORE_EBD_BATCH=true __ebd_run_metadata depend "${__envs[${__i}]}" 2>&1 1>/dev/null); then
+			__ebd_write_line "batch_item succeeded"
+		else
+			[[ -n ${__error_output} ]] || __error_output="ebd::gen_metadata failed"
+			mapfile -t __lines <<< "${__error_output}"
+			{ printf 'batch_item failed'; printf '\0%s' "${__lines[@]}"; echo; } >&${PKGCORE_EBD_WRITE_FD}
+		fi
+		unset -v "__envs[${__i}]"
+	done
+}
+
 __make_preloaded_eclass_func() {
 	eval "__preloaded_eclass_$1() {
 		$2
@@ -328,7 +359,7 @@ __make_preloaded_eclass_func() {
 }
 
 __ebd_main_loop() {
-	PKGCORE_BLACKLIST_VARS+=( __mode com is_depends phases line cont )
+	PKGCORE_BLACKLIST_VARS+=( __mode com is_depends phases line cont __envs __lines __i __size __error_output )
 	SANDBOX_ON=1
 	while :; do
 		local com=''
@@ -389,6 +420,10 @@ __ebd_main_loop() {
 					__ebd_write_line "phases failed ${error_output}"
 				fi
 				;;
+			gen_metadata_batch\ *)
+				__ebd_process_metadata_batch "${com#gen_metadata_batch }"
+				__ebd_write_line "phases succeeded"
+				;;
 			alive)
 				__ebd_write_line "yep!"
 				;;
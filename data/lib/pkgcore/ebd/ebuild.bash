@@ -502,6 +502,26 @@ __dump_metadata_keys() {
 	# and directly screw w/ it for speed reasons- about 5% speedup in metadata regen.
 	set -f
 	local key phases phase
+	if [[ -n ${PKGCORE_EBD_BATCH} ]]; then
+		# send all keys as a single NUL-delimited line for batched requests
+		local IFS=$' \t\n'
+		local -a keys
+		for key in "${PKGCORE_METADATA_KEYS[@]}"; do
+			if [[ ${key} == DEFINED_PHASES ]]; then
+				for phase in "${PKGCORE_EBUILD_PHASES[@]}"; do
+					__is_function "${phase}" && phases+=( ${phase} )
+				done
+				keys+=( "DEFINED_PHASES=${phases[*]:--}" )
+			elif [[ ${!key:-unset} != "unset" ]]; then
+				# word splitting normalizes whitespace, matching echo below
+				set -- ${!key}
+				keys+=( "${key}=$*" )
+			fi
+		done
+		{ printf 'metadata '; printf '%s\0' "${keys[@]}"; echo; } >&${PKGCORE_EBD_WRITE_FD}
+		set +f
+		return
+	fi
 	for key in "${PKGCORE_METADATA_KEYS[@]}"; do
 		if [[ ${key} == DEFINED_PHASES ]]; then
 			for phase in "${PKGCORE_EBUILD_PHASES[@]}"; do
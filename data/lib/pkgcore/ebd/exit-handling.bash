@@ -23,12 +23,16 @@ die() {
 		fi
 	fi
 
-	# Notify the python side we're dying so it should handle cleanup,
-	# this forces die() to work in subshell environments.
-	__ebd_write_line "dying ${PORTAGE_LOGFILE}"
+	# Batched metadata requests capture error output per ebuild and keep the
+	# daemon running.
+	if [[ -z ${PKGCORE_EBD_BATCH} ]]; then
+		# Notify the python side we're dying so it should handle cleanup,
+		# this forces die() to work in subshell environments.
+		__ebd_write_line "dying ${PORTAGE_LOGFILE}"
 
-	# Send any error messages back to python for output.
-	exec 2>&${PKGCORE_EBD_WRITE_FD}
+		# Send any error messages back to python for output.
+		exec 2>&${PKGCORE_EBD_WRITE_FD}
+	fi
 
 	local n filespacing=0 linespacing=0 sourcefile lineno
 	# setup spacing to make output easier to read
@@ -71,7 +75,7 @@ die() {
 		eerror "Working directory: '${working_dir}'"
 	fi
 
-	__ebd_write_line "dead"
+	[[ -z ${PKGCORE_EBD_BATCH} ]] && __ebd_write_line "dead"
 	exit 1
 }
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""Benchmark memory usage of metadata cache entries loaded for a whole tree.
+
+A synthetic md5-cache is generated with values repeated at rates similar to
+the gentoo tree, e.g. keywords, licenses, and inherited eclasses shared
+between packages and dependencies shared between versions of a package. All
+entries are then loaded at once using compact entries and using plain dicts
+without any value sharing.
+"""
+
+import argparse
+import gc
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from hashlib import md5
+
+try:
+    from pkgcore.cache.flat_hash import md5_cache
+except ImportError:
+    print("Cannot import pkgcore!", file=sys.stderr)
+    print(
+        "Verify it is properly installed and/or PYTHONPATH is set correctly.",
+        file=sys.stderr,
+    )
+    if "--debug" not in sys.argv:
+        print("Add --debug to the commandline for a traceback.", file=sys.stderr)
+    else:
+        raise
+    sys.exit(1)
+
+
+class dict_cache(md5_cache):
+    """md5-cache loading entries into dicts without sharing any values."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cdict_kls = dict
+
+    def reconstruct_eclasses(self, cpv, eclass_string):
+        return self._parse_eclasses(cpv, eclass_string)
+
+
+def _hexdigest(*args):
+    return md5(" ".join(map(str, args)).encode()).hexdigest()
+
+
+def generate_cache(location, entries, seed=0):
+    """Populate an md5-cache with synthetic entries."""
+    rng = random.Random(seed)
+    arches = ("alpha", "amd64", "arm", "arm64", "hppa", "ppc", "ppc64", "x86")
+    keywords = [
+        " ".join(rng.choice(("", "~")) + x for x in rng.sample(arches, k))
+        for k in range(1, len(arches) + 1)
+        for _ in range(4)
+    ]
+    licenses = ["GPL-2", "GPL-2+", "GPL-3", "MIT", "BSD", "Apache-2.0", "LGPL-2.1"]
+    phases = ["compile install", "configure compile install", "prepare", "-"]
+    eclasses = [(f"eclass{i}", _hexdigest("eclass", i)) for i in range(200)]
+    inherits = [rng.sample(eclasses, rng.randint(0, 6)) for _ in range(500)]
+
+    cache = md5_cache(location)
+    count = 0
+    while count < entries:
+        cat, pkg = f"cat-{count % 150}", f"pkg{count}"
+        inherit = rng.choice(inherits)
+        # most values are shared between versions of a package
+        shared = {
+            "DEFINED_PHASES": rng.choice(phases),
+            "DEPEND": " ".join(f"dev-libs/lib{rng.randrange(2000)}" for _ in range(4)),
+            "DESCRIPTION": f"synthetic package {pkg}",
+            "EAPI": rng.choice(("7", "8", "8")),
+            "HOMEPAGE": f"https://example.com/{pkg}",
+            "INHERIT": " ".join(x[0] for x in inherit),
+            "IUSE": rng.choice(("", "doc", "doc test", "+ssl test")),
+            "LICENSE": rng.choice(licenses),
+            "SLOT": "0",
+            "_eclasses_": "\t".join("\t".join(x) for x in inherit),
+        }
+        shared["RDEPEND"] = shared["DEPEND"]
+        for ver in range(1, rng.randint(2, 4)):
+            if count >= entries:
+                break
+            values = dict(shared)
+            values["KEYWORDS"] = "".join(rng.choice(keywords))
+            values["SRC_URI"] = f"https://example.com/{pkg}-{ver}.tar.gz"
+            values["_md5_"] = _hexdigest(cat, pkg, ver)
+            cache.set_raw(f"{cat}/{pkg}-{ver}", values)
+            count += 1
+    return cache
+
+
+def measure(cache):
+    """Load all entries, returning the memory they use in bytes."""
+    keys = list(cache.keys())
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    entries = cache.get_many(keys)
+    elapsed = time.time() - start
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(entries) == len(keys)
+    del entries
+    return size, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--entries",
+        type=int,
+        default=30000,
+        help="number of synthetic cache entries (default: %(default)s)",
+    )
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        generate_cache(tmpdir, options.entries)
+        results = {}
+        for name, kls in (("dict", dict_cache), ("compact", md5_cache)):
+            results[name] = size, elapsed = measure(kls(tmpdir))
+            print(
+                f"{name}: {size / 1024**2:.1f} MiB for {options.entries} entries "
+                f"({size / options.entries:.0f} bytes/entry), loaded in {elapsed:.2f}s"
+            )
+    reduction = 1 - results["compact"][0] / results["dict"][0]
+    print(f"reduction: {reduction:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""Benchmark matching restriction trees against every package in a repo.
+
+A package set style restriction, an OR of versioned and unversioned atoms
+along with glob and regex matches, is applied to all packages of an in-memory repo via
+itermatch using compiled restrictions and using the previous approach of
+walking the restriction tree via match() for every package.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+try:
+    from pkgcore.ebuild.atom import atom
+    from pkgcore.repository.util import SimpleTree
+    from pkgcore.restrictions import packages, values
+except ImportError:
+    print("Cannot import pkgcore!", file=sys.stderr)
+    print(
+        "Verify it is properly installed and/or PYTHONPATH is set correctly.",
+        file=sys.stderr,
+    )
+    if "--debug" not in sys.argv:
+        print("Add --debug to the commandline for a traceback.", file=sys.stderr)
+    else:
+        raise
+    sys.exit(1)
+
+
+class legacy_tree(SimpleTree):
+    """In-memory repo matching packages via the restriction's match method."""
+
+    def _internal_match(self, candidates, match_func, *args, **kwds):
+        match_func = self._restrict.match
+        return super()._internal_match(candidates, match_func, *args, **kwds)
+
+    def itermatch(self, restrict, **kwds):
+        self._restrict = restrict
+        return super().itermatch(restrict, **kwds)
+
+
+def generate_repo(kls, packages_count, versions, seed=0):
+    """Create an in-memory repo with a number of versions per package."""
+    rng = random.Random(seed)
+    d = {}
+    for pkg in range(packages_count):
+        vers = sorted(
+            {f"{rng.randint(0, 9)}.{rng.randint(0, 20)}" for _ in range(versions)}
+        )
+        d.setdefault(f"cat-{pkg % 150}", {})[f"pkg{pkg}"] = vers
+    return kls(d)
+
+
+def generate_restrict(atoms, packages_count, seed=0):
+    """Create an OR restriction of atoms similar to a package set or mask list."""
+    rng = random.Random(seed)
+    restricts = []
+    for _ in range(atoms):
+        pkg = rng.randrange(packages_count)
+        op = rng.choice(("<", "<=", "=", ">=", ">", "~", ""))
+        if op:
+            s = f"{op}cat-{pkg % 150}/pkg{pkg}-{rng.randint(0, 9)}.{rng.randint(0, 20)}"
+        else:
+            s = f"cat-{pkg % 150}/pkg{pkg}"
+        restricts.append(atom(s))
+    restricts.append(
+        packages.AndRestriction(
+            packages.PackageRestriction("category", values.StrGlobMatch("cat-1")),
+            packages.PackageRestriction("package", values.StrRegex("^pkg[0-9]*7$")),
+        )
+    )
+    return packages.OrRestriction(*restricts)
+
+
+def measure(repo, restrict, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.time()
+        matches = list(repo.itermatch(restrict))
+        times.append(time.time() - start)
+    return min(times), matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-p",
+        "--packages",
+        type=int,
+        default=5000,
+        help="number of packages in the repo (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-V",
+        "--versions",
+        type=int,
+        default=5,
+        help="number of versions per package (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-a",
+        "--atoms",
+        type=int,
+        default=50,
+        help="number of atoms in the restriction (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-r",
+        "--rounds",
+        type=int,
+        default=3,
+        help="number of timing rounds (default: %(default)s)",
+    )
+    options = parser.parse_args(argv)
+
+    restrict = generate_restrict(options.atoms, options.packages)
+    legacy_time, legacy = measure(
+        generate_repo(legacy_tree, options.packages, options.versions),
+        restrict,
+        options.rounds,
+    )
+    compiled_time, compiled = measure(
+        generate_repo(SimpleTree, options.packages, options.versions),
+        restrict,
+        options.rounds,
+    )
+    assert [x.cpvstr for x in legacy] == [x.cpvstr for x in compiled]
+    print(
+        f"{len(compiled)} matches, match(): {legacy_time:.2f}s, "
+        f"compiled: {compiled_time:.2f}s "
+        f"({legacy_time / max(compiled_time, 1e-6):.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
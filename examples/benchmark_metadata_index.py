@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""Benchmark metadata queries against an ebuild repo.
+
+Queries similar to pquery's --maintainer, --description, --eapi, and
+--license options are run against all packages of an ebuild repo with a
+populated metadata cache, e.g. a gentoo tree checkout, matching packages
+by loading the metadata for every package and by only loading the metadata
+for the candidates returned by the repo's metadata index.
+"""
+
+import argparse
+import sys
+import time
+
+try:
+    from pkgcore.ebuild.repo_objs import RepoConfig
+    from pkgcore.ebuild.repository import UnconfiguredTree
+    from pkgcore.cache.flat_hash import md5_cache
+    from pkgcore.restrictions import packages, values
+    from snakeoil.osutils import pjoin
+except ImportError:
+    print("Cannot import pkgcore!", file=sys.stderr)
+    print(
+        "Verify it is properly installed and/or PYTHONPATH is set correctly.",
+        file=sys.stderr,
+    )
+    if "--debug" not in sys.argv:
+        print("Add --debug to the commandline for a traceback.", file=sys.stderr)
+    else:
+        raise
+    sys.exit(1)
+
+
+def queries(maintainer, description, eapi, license):
+    return {
+        "maintainer": packages.PackageRestriction(
+            "maintainers",
+            values.AnyMatch(
+                values.UnicodeConversion(
+                    values.StrRegex(maintainer, case_sensitive=False)
+                )
+            ),
+        ),
+        "description": packages.OrRestriction(
+            *(
+                packages.PackageRestriction(
+                    attr, values.StrRegex(description, case_sensitive=False)
+                )
+                for attr in ("description", "longdescription")
+            )
+        ),
+        "eapi": packages.PackageRestriction("eapi", values.StrExactMatch(eapi)),
+        "license": packages.PackageRestriction(
+            "license", values.ContainmentMatch(frozenset([license]))
+        ),
+    }
+
+
+def make_repo(location):
+    return UnconfiguredTree(
+        location,
+        repo_config=RepoConfig(location),
+        cache=(md5_cache(pjoin(location, "metadata", "md5-cache"), readonly=True),),
+    )
+
+
+def measure(location, restrict, **kwds):
+    """Match a restriction using a new repo instance, avoiding in-memory caching."""
+    repo = make_repo(location)
+    start = time.time()
+    matches = list(repo.itermatch(restrict, sorter=sorted, **kwds))
+    return time.time() - start, matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("repo", help="ebuild repo with a populated md5-cache")
+    parser.add_argument("--maintainer", default="python@gentoo.org")
+    parser.add_argument("--description", default="library")
+    parser.add_argument("--eapi", default="7")
+    parser.add_argument("--license", default="MIT")
+    options = parser.parse_args(argv)
+
+    # build the index so the timings show repeated queries
+    start = time.time()
+    make_repo(options.repo).metadata_index.update()
+    build_time = time.time() - start
+    print(f"index update: {build_time:.2f}s")
+    for name, restrict in queries(
+        options.maintainer, options.description, options.eapi, options.license
+    ).items():
+        full_time, full = measure(options.repo, restrict)
+        index_time, indexed = measure(options.repo, restrict, metadata_index=True)
+        assert [x.cpvstr for x in full] == [x.cpvstr for x in indexed]
+        print(
+            f"{name}: {len(indexed)} matches, full scan: {full_time:.2f}s, "
+            f"indexed: {index_time:.2f}s ({full_time / max(index_time, 1e-6):.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
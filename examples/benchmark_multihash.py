@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""Benchmark calculating multiple checksums for a set of files.
+
+Files are hashed with the checksum types commonly used in Manifest files via
+snakeoil's chksum support, one file at a time, and via single pass hashing
+across a thread pool as used for distfile verification and manifest
+generation.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+try:
+    from pkgcore.util import multihash
+    from snakeoil.chksum import get_chksums
+except ImportError:
+    print("Cannot import pkgcore!", file=sys.stderr)
+    print(
+        "Verify it is properly installed and/or PYTHONPATH is set correctly.",
+        file=sys.stderr,
+    )
+    if "--debug" not in sys.argv:
+        print("Add --debug to the commandline for a traceback.", file=sys.stderr)
+    else:
+        raise
+    sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="*", help="files to hash")
+    parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=8,
+        help="number of files to generate if none are given (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        type=int,
+        default=64,
+        help="size in MiB of generated files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-c",
+        "--chksums",
+        default="size,blake2b,sha512",
+        help="comma separated checksum types (default: %(default)s)",
+    )
+    options = parser.parse_args(argv)
+    chfs = options.chksums.split(",")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = options.files
+        if not files:
+            for i in range(options.count):
+                path = os.path.join(tmpdir, str(i))
+                with open(path, "wb") as f:
+                    for _ in range(options.size):
+                        f.write(os.urandom(1 << 20))
+                files.append(path)
+
+        start = time.time()
+        legacy = [get_chksums(path, *chfs) for path in files]
+        legacy_time = time.time() - start
+
+        start = time.time()
+        results = [list(x.values()) for _, x in multihash.hash_files(files, chfs)]
+        multihash_time = time.time() - start
+
+    assert legacy == results
+    print(
+        f"{len(files)} files, get_chksums: {legacy_time:.2f}s, "
+        f"multihash: {multihash_time:.2f}s "
+        f"({legacy_time / max(multihash_time, 1e-6):.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
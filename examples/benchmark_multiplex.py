@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""Benchmark sorted matching across multiplexed repositories.
+
+Matches for a query spanning a number of in-memory repos are pulled via
+sorted itermatch calls using the k-way heap merge, and using the previous
+approach of fully sorting the head of every repo's matches via pairwise
+sorter calls for each yielded package.
+"""
+
+import argparse
+import sys
+import time
+from functools import partial
+from operator import itemgetter
+
+try:
+    from pkgcore.repository.multiplex import tree as multiplex_tree
+    from pkgcore.repository.util import SimpleTree
+    from pkgcore.restrictions import packages
+    from snakeoil.compatibility import sorted_cmp
+    from snakeoil.currying import post_curry
+    from snakeoil.iterables import iter_sort
+except ImportError:
+    print("Cannot import pkgcore!", file=sys.stderr)
+    print(
+        "Verify it is properly installed and/or PYTHONPATH is set correctly.",
+        file=sys.stderr,
+    )
+    if "--debug" not in sys.argv:
+        print("Add --debug to the commandline for a traceback.", file=sys.stderr)
+    else:
+        raise
+    sys.exit(1)
+
+
+class legacy_tree(multiplex_tree):
+    """Multiplexed repo merging matches via iter_sort and pairwise sorter calls."""
+
+    def itermatch(self, restrict, **kwds):
+        sorter = kwds.get("sorter", iter)
+
+        def f(x, y):
+            l = sorter([x, y])
+            if l[0] == y:
+                return 1
+            return -1
+
+        f = post_curry(sorted_cmp, f, key=itemgetter(0))
+        return iter_sort(f, *[repo.itermatch(restrict, **kwds) for repo in self.trees])
+
+
+def generate_repos(count, packages_per_repo, versions):
+    """Create in-memory repos with overlapping packages and versions."""
+    repos = []
+    for i in range(count):
+        d = {}
+        for pkg in range(packages_per_repo):
+            cat = f"cat-{pkg % 20}"
+            vers = [f"{v}.{i}" for v in range(versions)]
+            d.setdefault(cat, {})[f"pkg{pkg}"] = vers
+        repos.append(SimpleTree(d, repo_id=f"repo{i}"))
+    return repos
+
+
+def measure(repo, sorter):
+    start = time.time()
+    matches = list(repo.itermatch(packages.AlwaysTrue, sorter=sorter))
+    return time.time() - start, matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-r",
+        "--repos",
+        type=int,
+        default=15,
+        help="number of multiplexed repos (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-p",
+        "--packages",
+        type=int,
+        default=200,
+        help="number of packages per repo (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-V",
+        "--versions",
+        type=int,
+        default=5,
+        help="number of versions per package (default: %(default)s)",
+    )
+    options = parser.parse_args(argv)
+
+    repos = generate_repos(options.repos, options.packages, options.versions)
+    sorters = (
+        ("sorted", partial(sorted, reverse=True)),
+        ("pairwise", lambda l: sorted(l, reverse=True)),
+    )
+    for name, sorter in sorters:
+        legacy_time, legacy = measure(legacy_tree(*repos), sorter)
+        merge_time, merged = measure(multiplex_tree(*repos), sorter)
+        assert [x.cpvstr for x in legacy] == [x.cpvstr for x in merged]
+        print(
+            f"{name}: {len(merged)} matches across {options.repos} repos, "
+            f"iter_sort: {legacy_time:.2f}s, heap merge: {merge_time:.2f}s "
+            f"({legacy_time / max(merge_time, 1e-6):.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
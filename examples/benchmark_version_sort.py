@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""Benchmark sorting every package version in a repo.
+
+Versions are either pulled from an ebuild repo or generated synthetically,
+then sorted using cached version keys and using the previous comparisons
+reparsing both versions via ver_cmp() for every comparison. Both the initial
+sort of new package instances, where keys are parsed on demand, and
+resorting the same instances are timed.
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+
+try:
+    from pkgcore.ebuild.cpv import VersionedCPV, ver_cmp
+    from pkgcore.ebuild.repository import UnconfiguredTree
+except ImportError:
+    print("Cannot import pkgcore!", file=sys.stderr)
+    print(
+        "Verify it is properly installed and/or PYTHONPATH is set correctly.",
+        file=sys.stderr,
+    )
+    if "--debug" not in sys.argv:
+        print("Add --debug to the commandline for a traceback.", file=sys.stderr)
+    else:
+        raise
+    sys.exit(1)
+
+
+class legacy_cpv(VersionedCPV):
+    """CPV comparing versions via ver_cmp() without cached keys."""
+
+    __slots__ = ()
+
+    def __lt__(self, other):
+        if self.category == other.category:
+            if self.package == other.package:
+                return (
+                    ver_cmp(self.version, self.revision, other.version, other.revision)
+                    < 0
+                )
+            return self.package < other.package
+        return self.category < other.category
+
+
+def repo_cpvs(path):
+    """Return the CPV strings for all ebuilds in a repo."""
+    repo = UnconfiguredTree(path)
+    return [
+        f"{cat}/{pkg}-{ver}"
+        for (cat, pkg), vers in repo.versions.items()
+        for ver in vers
+    ]
+
+
+def synthetic_cpvs(count, seed=0):
+    """Return CPV strings with version distributions similar to the gentoo tree."""
+    rng = random.Random(seed)
+    cpvs = []
+    pkg = 0
+    while len(cpvs) < count:
+        cat, name = f"cat-{pkg % 150}", f"pkg{pkg}"
+        major = rng.randint(0, 20)
+        for _ in range(rng.randint(1, 8)):
+            ver = ".".join(
+                [str(major)]
+                + [str(rng.randint(0, 30)) for _ in range(rng.randint(0, 3))]
+            )
+            if rng.random() < 0.05:
+                ver += rng.choice("abc")
+            if rng.random() < 0.15:
+                ver += f"_{rng.choice(('alpha', 'beta', 'rc', 'pre', 'p'))}"
+                ver += str(rng.randint(0, 20090728))
+            if rng.random() < 0.3:
+                ver += f"-r{rng.randint(1, 5)}"
+            cpvs.append(f"{cat}/{name}-{ver}")
+        pkg += 1
+    return cpvs[:count]
+
+
+def measure(kls, cpvs, rounds):
+    """Sort fresh CPV instances and then resort them.
+
+    :return: best times for the initial sort and resorting, and the result
+    """
+    first, resort = [], []
+    for _ in range(rounds):
+        pkgs = [kls(x) for x in cpvs]
+        # as with timeit, garbage collection is disabled while timing
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.time()
+            result = sorted(pkgs)
+            first.append(time.time() - start)
+            start = time.time()
+            sorted(pkgs)
+            resort.append(time.time() - start)
+        finally:
+            gc.enable()
+    return min(first), min(resort), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repo", help="ebuild repo to pull versions from")
+    parser.add_argument(
+        "-n",
+        "--versions",
+        type=int,
+        default=100000,
+        help="number of synthetic versions (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-r",
+        "--rounds",
+        type=int,
+        default=3,
+        help="number of timing rounds (default: %(default)s)",
+    )
+    options = parser.parse_args(argv)
+
+    if options.repo:
+        cpvs = repo_cpvs(options.repo)
+    else:
+        cpvs = synthetic_cpvs(options.versions)
+    random.Random(0).shuffle(cpvs)
+
+    legacy_first, legacy_resort, legacy = measure(legacy_cpv, cpvs, options.rounds)
+    key_first, key_resort, result = measure(VersionedCPV, cpvs, options.rounds)
+    assert [x.cpvstr for x in legacy] == [x.cpvstr for x in result]
+    print(f"sorting {len(cpvs)} versions:")
+    for name, legacy_time, key_time in (
+        ("initial sort", legacy_first, key_first),
+        ("resort", legacy_resort, key_resort),
+    ):
+        print(
+            f"  {name}: ver_cmp: {legacy_time:.2f}s, cached keys: {key_time:.2f}s "
+            f"({legacy_time / max(key_time, 1e-6):.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,6 @@ import os
 from operator import itemgetter
 from time import time
 
-from snakeoil.chksum import get_chksums
 from snakeoil.containers import RefCountingSet
 from snakeoil.fileutils import AtomicWriteFile, readlines
 from snakeoil.mappings import ImmutableDict, StackedDict
@@ -19,6 +18,7 @@ from snakeoil.mappings import ImmutableDict, StackedDict
 from .. import cache
 from ..log import logger
 from ..restrictions import packages
+from ..util import multihash
 
 
 def _iter_till_empty_newline(data):
@@ -194,9 +194,9 @@ class PackagesCacheV0(cache.bulk):
             key = key.upper()
             d[cls._serialize_map.get(key, key)] = value
 
-        for key, value in zip(
-            cls._stored_chfs, get_chksums(pkg.path, *cls._stored_chfs)
-        ):
+        # calculate all chksums in a single read of the file
+        chfs = [x for x in cls._stored_chfs if x != "mtime"]
+        for key, value in multihash.hash_file(pkg.path, chfs).items():
             if key != "size":
                 value = "%x" % (value,)
             d[key.upper()] = value
@@ -253,7 +253,7 @@ class PackagesCacheV0(cache.bulk):
         new_dict = {k: xpak[k] for k in self._known_keys if k in xpak}
         new_dict["_chf_"] = xpak._chf_
         chfs = [x for x in self._stored_chfs if x != "mtime"]
-        for key, value in zip(chfs, get_chksums(pkg.path, *chfs)):
+        for key, value in multihash.hash_file(pkg.path, chfs).items():
             if key != "size":
                 value = "%x" % (value,)
             new_dict[key.upper()] = value
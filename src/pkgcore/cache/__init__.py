@@ -8,13 +8,14 @@ import math
 import operator
 import os
 from functools import partial
+from types import SimpleNamespace
 
 from snakeoil import klass
 from snakeoil.chksum import get_handler
 from snakeoil.mappings import ProtectedDict
 
 from ..ebuild.const import metadata_keys
-from . import errors
+from . import entry, errors
 
 
 class base:
@@ -55,7 +56,11 @@ class base:
         self._chf_serializer = self._get_chf_serializer(self.chf_type)
         self._chf_deserializer = self._get_chf_deserializer(self.chf_type)
         self._known_keys |= frozenset([self._chf_key])
-        self._cdict_kls = dict
+        # entries share a fixed key layout and interned values to keep memory
+        # usage down when loading entries for whole trees
+        self._cdict_kls = entry.get_layout(self._known_keys)
+        # reconstructed eclass data shared between entries
+        self._eclasses_memo = {}
         self.readonly = readonly
         self.set_sync_rate(self.default_sync_rate)
         self.updates = 0
@@ -136,6 +141,52 @@ class base:
         """
         raise NotImplementedError
 
+    def get_many(self, cpvs):
+        """Pull the entries for multiple cpvs at once.
+
+        Missing or corrupted entries are skipped; callers wanting errors for
+        those should fall back to :obj:`__getitem__`.
+
+        :param cpvs: iterable of cpv strings
+        :return: dict mapping cpv to its cache entry
+        """
+        self._sync_if_needed()
+        d = {}
+        for cpv, entry in self._getitems(cpvs):
+            if "_eclasses_" in entry:
+                try:
+                    entry["_eclasses_"] = self.reconstruct_eclasses(
+                        cpv, entry["_eclasses_"]
+                    )
+                except errors.CacheCorruption:
+                    continue
+            d[cpv] = entry
+        return d
+
+    def _getitems(self, cpvs):
+        """Yield (cpv, values) tuples for existing, uncorrupted entries.
+
+        Derived classes can override this to batch or parallelize reads.
+        """
+        for cpv in cpvs:
+            try:
+                yield cpv, self._getitem(cpv)
+            except (KeyError, errors.CacheCorruption):
+                continue
+
+    def categories(self):
+        """Return the set of categories with cache entries."""
+        return frozenset(x.split("/", 1)[0] for x in self.keys())
+
+    def category_keys(self, category):
+        """Return the cpvs of all entries in a category."""
+        prefix = category + "/"
+        return [x for x in self.keys() if x.startswith(prefix)]
+
+    def iter_category(self, category):
+        """Yield (cpv, values) tuples for all entries in a category."""
+        return iter(self.get_many(self.category_keys(category)).items())
+
     def __setitem__(self, cpv, values):
         """set a cpv to values
 
@@ -166,6 +217,39 @@ class base:
         """
         raise NotImplementedError
 
+    def check_compatible(self, source):
+        """Verify entries from another cache can be copied in their raw form.
+
+        :raise CacheError: if the caches use different checksum types
+        """
+        if (source.chf_type, tuple(source.eclass_chf_types)) != (
+            self.chf_type,
+            tuple(self.eclass_chf_types),
+        ):
+            raise errors.CacheError(
+                f"incompatible cache formats: can't import {source.chf_type!r} "
+                f"entries into {self.chf_type!r} cache"
+            )
+
+    def get_raw(self, cpv):
+        """Return a cpv's values in their serialized form.
+
+        Eclass data isn't reconstructed, allowing entries to be compared or
+        copied between caches of the same format via :obj:`set_raw`.
+        """
+        values = dict(self._getitem(cpv))
+        values[self._chf_key] = self._chf_serializer(
+            SimpleNamespace(**{self.chf_type: values[self._chf_key]})
+        )
+        return values
+
+    def set_raw(self, cpv, values):
+        """Set a cpv to values in the serialized form returned by :obj:`get_raw`."""
+        if self.readonly:
+            raise errors.ReadOnly()
+        self._setitem(cpv, values)
+        self._sync_if_needed(True)
+
     def __delitem__(self, cpv):
         """delete a key from the cache.
 
@@ -213,6 +297,31 @@ class base:
         if not self.autocommits:
             raise NotImplementedError
 
+    def set_write_behind(self, size=0):
+        """Queue updates for a background writer, if supported by the backend.
+
+        Queued updates are immediately visible via this instance and are
+        guaranteed to be written once :obj:`commit` returns.
+
+        :param size: maximum number of queued updates, 0 disables queueing
+        """
+
+    def get_regen_state(self):
+        """Return the tree state recorded by the last regen, if any.
+
+        Caches unable to store state always return None, forcing full regens.
+        """
+        return None
+
+    def set_regen_state(self, state):
+        """Record an opaque tree state string for the current cache contents."""
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        # memoized eclass data is rebuilt on demand
+        d["_eclasses_memo"] = {}
+        return d
+
     def deconstruct_eclasses(self, eclass_dict):
         """takes a dict, returns a string representing said dict"""
         l = []
@@ -229,6 +338,13 @@ class base:
 
     def reconstruct_eclasses(self, cpv, eclass_string):
         """Turn a string from :obj:`serialize_eclasses` into a dict."""
+        if (eclasses := self._eclasses_memo.get(eclass_string)) is None:
+            eclasses = self._parse_eclasses(cpv, eclass_string)
+            self._eclasses_memo[eclass_string] = eclasses
+        # callers get their own list while the eclass tuples are shared
+        return list(eclasses)
+
+    def _parse_eclasses(self, cpv, eclass_string):
         if not isinstance(eclass_string, str):
             raise TypeError("eclass_string must be basestring, got %r" % eclass_string)
         eclass_data = eclass_string.strip().split(self.eclass_splitter)
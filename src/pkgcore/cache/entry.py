@@ -0,0 +1,155 @@
+"""
+compact mapping type for parsed cache entries
+"""
+
+__all__ = ("Layout", "Entry", "get_layout")
+
+import threading
+from collections.abc import Mapping, MutableMapping
+from sys import intern
+
+# values commonly shared between ebuilds, and between versions of a package
+_interned_keys = frozenset(
+    (
+        "BDEPEND",
+        "DEFINED_PHASES",
+        "DEPEND",
+        "DESCRIPTION",
+        "EAPI",
+        "HOMEPAGE",
+        "IDEPEND",
+        "INHERIT",
+        "IUSE",
+        "KEYWORDS",
+        "LICENSE",
+        "PDEPEND",
+        "PROPERTIES",
+        "RDEPEND",
+        "REQUIRED_USE",
+        "RESTRICT",
+        "SLOT",
+        "_eclasses_",
+    )
+)
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+_unset = object()
+
+
+class Layout:
+    """Fixed key order shared by all entries of a cache.
+
+    Calling a layout creates a new :obj:`Entry` using it, allowing layouts to
+    be used in place of a dict class.
+    """
+
+    __slots__ = ("keys", "index", "interned")
+
+    def __init__(self, keys):
+        self.keys = tuple(sorted(keys))
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        self.interned = _interned_keys.intersection(self.keys)
+
+    def __call__(self, data=()):
+        return Entry(self, data)
+
+    def __reduce__(self):
+        return get_layout, (self.keys,)
+
+
+def get_layout(keys):
+    """Return the shared :obj:`Layout` for a set of keys."""
+    keys = frozenset(keys)
+    with _layouts_lock:
+        if (layout := _layouts.get(keys)) is None:
+            layout = _layouts[keys] = Layout(keys)
+    return layout
+
+
+class Entry(MutableMapping):
+    """Mapping storing cache entry values in a list ordered by its layout.
+
+    Values for highly repeated keys are interned so entries for a whole tree
+    share their strings. Keys unknown to the layout are supported, but are
+    stored in a regular dict.
+    """
+
+    __slots__ = ("_layout", "_values", "_extra")
+
+    def __init__(self, layout, data=()):
+        self._layout = layout
+        self._values = values = [_unset] * len(layout.keys)
+        self._extra = None
+        if isinstance(data, Mapping):
+            data = data.items()
+        index = layout.index
+        interned = layout.interned
+        for k, v in data:
+            if (i := index.get(k)) is None:
+                self[k] = v
+            elif k in interned and v.__class__ is str:
+                values[i] = intern(v)
+            else:
+                values[i] = v
+
+    def __getitem__(self, key):
+        if (i := self._layout.index.get(key)) is not None:
+            if (val := self._values[i]) is not _unset:
+                return val
+        elif self._extra is not None:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if (i := self._layout.index.get(key)) is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        elif key in self._layout.interned and value.__class__ is str:
+            self._values[i] = intern(value)
+        else:
+            self._values[i] = value
+
+    def __delitem__(self, key):
+        if (i := self._layout.index.get(key)) is None:
+            if self._extra is None:
+                raise KeyError(key)
+            del self._extra[key]
+        elif self._values[i] is _unset:
+            raise KeyError(key)
+        else:
+            self._values[i] = _unset
+
+    def __contains__(self, key):
+        if (i := self._layout.index.get(key)) is not None:
+            return self._values[i] is not _unset
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for k, v in zip(self._layout.keys, self._values):
+            if v is not _unset:
+                yield k
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        count = len(self._values) - self._values.count(_unset)
+        if self._extra is not None:
+            count += len(self._extra)
+        return count
+
+    def copy(self):
+        return Entry(self._layout, self)
+
+    def __reduce__(self):
+        return Entry, (self._layout, dict(self))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self)!r})"
@@ -4,15 +4,150 @@ per key file based backend
 
 __all__ = ("database",)
 
+import atexit
+import errno
 import os
-import stat
+import queue
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from snakeoil.fileutils import readlines_utf8
+from snakeoil.fileutils import AtomicWriteFile, readlines_utf8
 from snakeoil.osutils import pjoin
 
 from ..config.hint import ConfigHint
+from ..log import logger
 from . import errors, fs_template
 
+# active background writers flushed at exit
+_writers = weakref.WeakSet()
+_missing = object()
+
+
+@atexit.register
+def _flush_writers():
+    for writer in list(_writers):
+        if writer.pid == os.getpid():
+            try:
+                writer.close()
+            except errors.CacheError as e:
+                logger.error("failed flushing cache updates: %s", e)
+
+
+class _Writer:
+    """Background writer applying queued updates to a flat cache.
+
+    Queued updates are coalesced per entry and applied in batches. Every entry
+    is still written to a temporary file and atomically renamed into place,
+    with a single directory fsync per category for each batch.
+    """
+
+    # maximum number of queued updates applied per batch
+    batch_size = 256
+
+    def __init__(self, db, size):
+        self.db = db
+        self.size = size
+        self.pid = os.getpid()
+        self.queue = queue.Queue(size)
+        # latest queued values per entry, None for deletions
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._run, name=f"cache writer: {db.location}", daemon=True
+        )
+        self.thread.start()
+        _writers.add(self)
+
+    def put(self, cpv, values):
+        with self.lock:
+            self.pending[cpv] = values
+        self.queue.put((cpv, values))
+
+    def get(self, cpv):
+        """Return the queued values for an entry, None if it's queued for removal."""
+        with self.lock:
+            return self.pending.get(cpv, _missing)
+
+    def flush(self):
+        """Wait for all queued updates to be written."""
+        self.queue.join()
+        if (error := self.error) is not None:
+            self.error = None
+            raise error
+
+    def close(self):
+        """Flush queued updates and stop the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        _writers.discard(self)
+        self.flush()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            items = [self.queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in items:
+                stopping = True
+                items.remove(None)
+            try:
+                self._apply(items)
+            except Exception as e:
+                self.error = self.error or e
+            finally:
+                for _ in range(len(items) + stopping):
+                    self.queue.task_done()
+
+    def _apply(self, items):
+        # only the last update for an entry in a batch matters
+        updates = {}
+        for cpv, values in items:
+            updates.pop(cpv, None)
+            updates[cpv] = values
+
+        dirs = set()
+        for cpv, values in updates.items():
+            try:
+                if values is None:
+                    try:
+                        os.remove(pjoin(self.db.location, cpv))
+                    except FileNotFoundError:
+                        pass
+                else:
+                    self.db._write_entry(cpv, values)
+                dirs.add(os.path.dirname(pjoin(self.db.location, cpv)))
+            except (EnvironmentError, errors.CacheError) as e:
+                if not isinstance(e, errors.CacheError):
+                    e = errors.CacheCorruption(cpv, e)
+                self.error = self.error or e
+
+        for path in dirs:
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # directory fsync isn't supported by all filesystems
+                if e.errno not in (errno.EINVAL, errno.ENOTSUP):
+                    self.error = self.error or errors.GeneralCacheCorruption(e)
+
+        with self.lock:
+            for cpv, values in updates.items():
+                if self.pending.get(cpv, _missing) is values:
+                    del self.pending[cpv]
+
 
 class database(fs_template.FsBased):
     """Stores cache entries in key=value form, stripping newlines."""
@@ -24,6 +159,7 @@ class database(fs_template.FsBased):
             "location": "str",
             "label": "str",
             "auxdbkeys": "list",
+            "write_behind": "int",
         },
         required=["location"],
         positional=["location"],
@@ -32,9 +168,60 @@ class database(fs_template.FsBased):
 
     autocommits = True
     mtime_in_entry = True
+    # batched reads smaller than this are done sequentially
+    min_parallel_reads = 8
+    max_read_threads = 16
     eclass_chf_types = ("eclassdir", "mtime")
 
+    def __init__(self, *args, write_behind=0, **config):
+        """
+        :keyword write_behind: maximum number of updates queued for a
+            background writer, disabled by default
+        """
+        super().__init__(*args, **config)
+        self._write_behind = 0
+        self._writer = None
+        self.set_write_behind(write_behind)
+
+    def set_write_behind(self, size=0):
+        writer = self._writer
+        self._write_behind, self._writer = size, None
+        if writer is not None and writer.pid == os.getpid():
+            writer.close()
+
+    @property
+    def _active_writer(self):
+        """Background writer for the current process, if enabled."""
+        writer = self._writer
+        if not self._write_behind or self.readonly:
+            return None
+        if writer is None or writer.pid != os.getpid():
+            # writer threads don't survive forks, queued updates are left to
+            # the parent process
+            writer = self._writer = _Writer(self, self._write_behind)
+        return writer
+
+    def __getstate__(self):
+        d = super().__getstate__()
+        # writer threads are recreated on demand
+        d["_writer"] = None
+        return d
+
+    def commit(self, force=False):
+        writer = self._writer
+        if writer is not None and writer.pid == os.getpid():
+            writer.flush()
+
     def _getitem(self, cpv):
+        if (writer := self._writer) is not None and writer.pid == os.getpid():
+            values = writer.get(cpv)
+            if values is None:
+                raise KeyError(cpv)
+            elif values is not _missing:
+                # parse queued updates as they'll be written
+                return self._parse_data(
+                    self._serialize(values).splitlines(), values.get("_mtime_", 0)
+                )
         path = pjoin(self.location, cpv)
         try:
             data = readlines_utf8(path, True, True, True)
@@ -44,6 +231,88 @@ class database(fs_template.FsBased):
         except (EnvironmentError, ValueError) as e:
             raise errors.CacheCorruption(cpv, e) from e
 
+    def _getitems(self, cpvs):
+        cpvs = list(cpvs)
+        if len(cpvs) < self.min_parallel_reads:
+            yield from super()._getitems(cpvs)
+            return
+
+        def _read(cpv):
+            try:
+                return cpv, self._getitem(cpv)
+            except (KeyError, errors.CacheCorruption):
+                return cpv, None
+
+        # file reads release the GIL, so overlapping them hides I/O latency
+        # for cold caches and network filesystems
+        workers = min(len(cpvs), self.max_read_threads)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for cpv, entry in executor.map(_read, cpvs):
+                if entry is not None:
+                    yield cpv, entry
+
+    def categories(self):
+        self.commit()
+        try:
+            with os.scandir(self.location) as it:
+                return frozenset(
+                    entry.name
+                    for entry in it
+                    if not entry.name.startswith(".")
+                    and entry.is_dir(follow_symlinks=False)
+                )
+        except FileNotFoundError:
+            return frozenset()
+
+    def category_keys(self, category):
+        self.commit()
+        try:
+            with os.scandir(pjoin(self.location, category)) as it:
+                return [
+                    f"{category}/{entry.name}"
+                    for entry in it
+                    if not entry.name.startswith(".")
+                    and entry.is_file(follow_symlinks=False)
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+    @property
+    def _regen_state_path(self):
+        return pjoin(self.location, ".regen-state")
+
+    def get_regen_state(self):
+        try:
+            with open(self._regen_state_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+        except (EnvironmentError, UnicodeDecodeError) as e:
+            raise errors.GeneralCacheCorruption(e) from e
+
+    def set_regen_state(self, state):
+        if self.readonly:
+            raise errors.ReadOnly()
+        path = self._regen_state_path
+        if state is None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                raise errors.GeneralCacheCorruption(e) from e
+            return
+        try:
+            if not self._ensure_dirs():
+                raise errors.GeneralCacheCorruption(
+                    f"error creating directory for {path!r}"
+                )
+            with AtomicWriteFile(path) as f:
+                f.write(f"{state}\n")
+            self._ensure_access(path)
+        except EnvironmentError as e:
+            raise errors.GeneralCacheCorruption(e) from e
+
     def _parse_data(self, data, mtime):
         d = self._cdict_kls()
         known = self._known_keys
@@ -61,7 +330,16 @@ class database(fs_template.FsBased):
             d[self._chf_key] = self._chf_deserializer(d[self._chf_key])
         return d
 
+    def _serialize(self, values):
+        return "".join(f"{k}={v}\n" for k, v in sorted(values.items()))
+
     def _setitem(self, cpv, values):
+        if (writer := self._active_writer) is not None:
+            writer.put(cpv, dict(values.items()))
+        else:
+            self._write_entry(cpv, values)
+
+    def _write_entry(self, cpv, values):
         # might seem weird, but we rely on the trailing +1; this
         # makes it behave properly for any cache depth (including no depth)
         s = cpv.rfind("/") + 1
@@ -83,8 +361,7 @@ class database(fs_template.FsBased):
         if self._mtime_used:
             if not self.mtime_in_entry:
                 mtime = values["_mtime_"]
-        for k, v in sorted(values.items()):
-            myf.writelines(f"{k}={v}\n")
+        myf.write(self._serialize(values))
 
         myf.close()
         if self._mtime_used and not self.mtime_in_entry:
@@ -101,6 +378,11 @@ class database(fs_template.FsBased):
             raise errors.CacheCorruption(cpv, e) from e
 
     def _delitem(self, cpv):
+        if (writer := self._active_writer) is not None:
+            if cpv not in self:
+                raise KeyError(cpv)
+            writer.put(cpv, None)
+            return
         try:
             os.remove(pjoin(self.location, cpv))
         except FileNotFoundError:
@@ -109,36 +391,39 @@ class database(fs_template.FsBased):
             raise errors.CacheCorruption(cpv, e) from e
 
     def __contains__(self, cpv):
+        if (writer := self._writer) is not None and writer.pid == os.getpid():
+            values = writer.get(cpv)
+            if values is not _missing:
+                return values is not None
         return os.path.exists(pjoin(self.location, cpv))
 
     def keys(self):
         """generator for walking the dir struct"""
-        dirs = [self.location]
+        self.commit()
+        dirs = deque([self.location])
         len_base = len(self.location)
         # Note: the misc try/except clauses are to protect against concurrent
         # modification of the cache resulting in transient errors.
         while dirs:
-            d = dirs.pop(0)
+            d = dirs.popleft()
             try:
-                subdirs = os.listdir(d)
-            except FileNotFoundError:
+                with os.scandir(d) as it:
+                    entries = list(it)
+            except (FileNotFoundError, NotADirectoryError):
                 continue
             except EnvironmentError as e:
-                raise KeyError(cpv, f"access failure: {e}")
-            for l in os.listdir(d):
-                if l.endswith(".cpickle"):
+                raise KeyError(d, f"access failure: {e}")
+            for entry in entries:
+                # skip state and in-progress update files
+                if entry.name.startswith(".") or entry.name.endswith(".cpickle"):
                     continue
-                p = pjoin(d, l)
                 try:
-                    st = os.lstat(p)
-                except FileNotFoundError:
-                    continue
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                        continue
                 except EnvironmentError as e:
-                    raise KeyError(cpv, f"Unhandled IO error: {e}")
-                if stat.S_ISDIR(st.st_mode):
-                    dirs.append(p)
-                    continue
-                yield p[len_base + 1 :]
+                    raise KeyError(entry.path, f"Unhandled IO error: {e}")
+                yield entry.path[len_base + 1 :]
 
 
 class md5_cache(database):
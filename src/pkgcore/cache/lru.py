@@ -0,0 +1,275 @@
+"""
+bounded in-memory cache tier wrapping another cache backend
+"""
+
+__all__ = ("database",)
+
+import atexit
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+from ..config.hint import ConfigHint
+from ..log import logger
+
+# entry stores shared between wrappers of the same backend location
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class _Entry(dict):
+    """Copy of a memory cache entry tracking the cpv it was pulled for."""
+
+    __slots__ = ("cpv",)
+
+
+def _entry_size(entry):
+    """Roughly estimate the memory used by a parsed cache entry."""
+    size = sys.getsizeof(entry)
+    for k, v in entry.items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+        if isinstance(v, (list, tuple)):
+            size += sum(map(sys.getsizeof, v))
+    return size
+
+
+class _Store:
+    """Thread-safe LRU of parsed cache entries."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, cpv):
+        with self.lock:
+            try:
+                entry, _size = self.entries[cpv]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(cpv)
+            self.hits += 1
+        return entry
+
+    def add(self, cpv, entry):
+        size = _entry_size(entry)
+        with self.lock:
+            self._discard(cpv)
+            if self.max_bytes and size > self.max_bytes:
+                return
+            self.entries[cpv] = (entry, size)
+            self.size += size
+            self._trim()
+
+    def resize(self, max_entries, max_bytes):
+        with self.lock:
+            self.max_entries, self.max_bytes = max_entries, max_bytes
+            self._trim()
+
+    def _trim(self):
+        while self.entries and (
+            (self.max_entries and len(self.entries) > self.max_entries)
+            or (self.max_bytes and self.size > self.max_bytes)
+        ):
+            _cpv, (_entry, size) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def _discard(self, cpv):
+        if (item := self.entries.pop(cpv, None)) is not None:
+            self.size -= item[1]
+            return True
+        return False
+
+    def discard(self, cpv, invalidated=False):
+        with self.lock:
+            if self._discard(cpv) and invalidated:
+                self.invalidations += 1
+
+    def __contains__(self, cpv):
+        return cpv in self.entries
+
+
+class database:
+    """Bounded in-memory LRU tier in front of another cache backend.
+
+    Parsed entries are kept in memory up to the configured entry count and
+    approximate byte budget, with the least recently used entries evicted
+    first. Entries failing validation against their ebuild's hash are dropped
+    so they're pulled fresh from the backend on the next request. Writes go
+    directly to the backend.
+
+    Wrappers for backends at the same location share their entries, so
+    consumers re-instantiating their repos keep their warm entries.
+
+    :ivar stats: mapping of hit, miss, eviction, and invalidation counters
+    """
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "cache": "ref:cache",
+            "max_entries": "int",
+            "max_bytes": "int",
+            "stats_file": "str",
+        },
+        required=["cache"],
+        positional=["cache"],
+        typename="cache",
+    )
+
+    def __init__(
+        self, cache, max_entries=10000, max_bytes=64 * 1024**2, stats_file=None
+    ):
+        """
+        :param cache: cache backend to wrap
+        :param max_entries: maximum number of entries kept in memory, 0 for no limit
+        :param max_bytes: approximate memory budget for entries, 0 for no limit
+        :param stats_file: path the counters are dumped to in JSON format at exit
+        """
+        self._cache = cache
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._store = self._get_store()
+        if stats_file is not None:
+            atexit.register(self.dump_stats, stats_file)
+
+    def _get_store(self):
+        location = getattr(self._cache, "location", None)
+        if location is None:
+            return _Store(self._max_entries, self._max_bytes)
+        key = (self._cache.__class__, location)
+        with _stores_lock:
+            if (store := _stores.get(key)) is None:
+                store = _stores[key] = _Store(self._max_entries, self._max_bytes)
+        store.resize(self._max_entries, self._max_bytes)
+        return store
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d["_store"]
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._store = self._get_store()
+
+    def __getattr__(self, attr):
+        if attr.startswith("__") or attr == "_cache":
+            raise AttributeError(attr)
+        return getattr(self._cache, attr)
+
+    def _copy(self, cpv, entry):
+        copy = _Entry(entry)
+        copy.cpv = cpv
+        return copy
+
+    @property
+    def readonly(self):
+        return self._cache.readonly
+
+    frozen = readonly
+
+    @property
+    def autocommits(self):
+        return self._cache.autocommits
+
+    @property
+    def stats(self):
+        store = self._store
+        return {
+            "hits": store.hits,
+            "misses": store.misses,
+            "evictions": store.evictions,
+            "invalidations": store.invalidations,
+            "entries": len(store.entries),
+            "bytes": store.size,
+        }
+
+    def dump_stats(self, path):
+        """Write the counters to a given path in JSON format."""
+        try:
+            with open(path, "w") as f:
+                json.dump(self.stats, f, indent=2, sort_keys=True)
+                f.write("\n")
+        except OSError as e:
+            logger.warning("failed writing cache stats to %r: %s", path, e)
+
+    def __getitem__(self, cpv):
+        if (entry := self._store.get(cpv)) is None:
+            entry = self._cache[cpv]
+            self._store.add(cpv, entry)
+        return self._copy(cpv, entry)
+
+    def get_many(self, cpvs):
+        d = {}
+        missing = []
+        for cpv in cpvs:
+            if (entry := self._store.get(cpv)) is None:
+                missing.append(cpv)
+            else:
+                d[cpv] = self._copy(cpv, entry)
+        if missing:
+            for cpv, entry in self._cache.get_many(missing).items():
+                self._store.add(cpv, entry)
+                d[cpv] = self._copy(cpv, entry)
+        return d
+
+    def iter_category(self, category):
+        for cpv, entry in self._cache.iter_category(category):
+            self._store.add(cpv, entry)
+            yield cpv, self._copy(cpv, entry)
+
+    def validate_entry(self, cache_item, ebuild_hash_item, eclass_db):
+        if self._cache.validate_entry(cache_item, ebuild_hash_item, eclass_db):
+            return True
+        if (cpv := getattr(cache_item, "cpv", None)) is not None:
+            self._store.discard(cpv, invalidated=True)
+        return False
+
+    def __setitem__(self, cpv, values):
+        self._store.discard(cpv)
+        self._cache[cpv] = values
+
+    def set_raw(self, cpv, values):
+        self._store.discard(cpv)
+        self._cache.set_raw(cpv, values)
+
+    def __delitem__(self, cpv):
+        self._store.discard(cpv)
+        del self._cache[cpv]
+
+    def __contains__(self, cpv):
+        return cpv in self._store or cpv in self._cache
+
+    def keys(self):
+        return self._cache.keys()
+
+    def __iter__(self):
+        return iter(self._cache.keys())
+
+    def items(self):
+        for cpv in self.keys():
+            yield cpv, self[cpv]
+
+    def commit(self, force=False):
+        self._cache.commit(force=force)
+
+    def set_sync_rate(self, rate=0):
+        self._cache.set_sync_rate(rate)
+
+    def get_regen_state(self):
+        return self._cache.get_regen_state()
+
+    def set_regen_state(self, state):
+        self._cache.set_regen_state(state)
+
+    def set_write_behind(self, size=0):
+        self._cache.set_write_behind(size)
@@ -0,0 +1,295 @@
+"""
+single file, indexed cache backend using sqlite
+"""
+
+__all__ = ("database", "md5_cache")
+
+import os
+import sqlite3
+import threading
+from types import SimpleNamespace
+from urllib.parse import quote
+
+from snakeoil.osutils import ensure_dirs, pjoin
+
+from ..config.hint import ConfigHint
+from ..log import logger
+from . import errors, flat_hash, fs_template
+
+
+class database(fs_template.FsBased):
+    """Stores all cache entries in a single sqlite database file.
+
+    Entries are serialized in the same key=value form used by
+    :obj:`pkgcore.cache.flat_hash.database`, but are stored as rows indexed by
+    CPV instead of one file per entry which avoids per-entry open/read/close
+    calls and directory walks when iterating over the whole cache.
+    """
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "readonly": "bool",
+            "location": "str",
+            "label": "str",
+            "auxdbkeys": "list",
+        },
+        required=["location"],
+        positional=["location"],
+        typename="cache",
+    )
+
+    autocommits = False
+    eclass_chf_types = ("eclassdir", "mtime")
+
+    def __init__(self, *args, **config):
+        super().__init__(*args, **config)
+        self._lock = threading.RLock()
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def _db(self):
+        """Lazily opened database connection."""
+        if self._connection_pid != os.getpid():
+            # connections can't be shared with forked processes
+            with self._lock:
+                if self._connection_pid != os.getpid():
+                    created = not os.path.exists(self.location)
+                    self._connection = self._connect()
+                    self._connection_pid = os.getpid()
+                    if created and not self.readonly:
+                        self._seed()
+        return self._connection
+
+    def _seed(self):
+        """Populate a newly created database.
+
+        Override this in derived classes to import existing entries.
+        """
+
+    def _connect(self):
+        if self.readonly:
+            if not os.path.exists(self.location):
+                logger.warning(
+                    "sqlite cache %r doesn't exist and can't be created, "
+                    "run `pmaint regen` to generate it",
+                    self.location,
+                )
+                return None
+            uri = f"file:{quote(self.location)}?mode=ro"
+        else:
+            if not ensure_dirs(
+                os.path.dirname(self.location), mode=0o775, minimal=True
+            ):
+                raise errors.InitializationError(
+                    self.__class__, f"failed creating cache dir for {self.location!r}"
+                )
+            uri = f"file:{quote(self.location)}"
+
+        try:
+            db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            if not self.readonly:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS entries "
+                    "(cpv TEXT PRIMARY KEY NOT NULL, data TEXT NOT NULL)"
+                )
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS state "
+                    "(key TEXT PRIMARY KEY NOT NULL, value TEXT NOT NULL)"
+                )
+                db.commit()
+                self._ensure_access(self.location)
+        except sqlite3.Error as e:
+            raise errors.InitializationError(self.__class__, e) from e
+        return db
+
+    def _execute(self, *args):
+        db = self._db
+        if db is None:
+            return ()
+        try:
+            with self._lock:
+                return db.execute(*args).fetchall()
+        except sqlite3.OperationalError as e:
+            # readonly databases created by foreign tools may lack the table
+            if self.readonly and "no such table" in str(e):
+                return ()
+            raise errors.GeneralCacheCorruption(e) from e
+        except sqlite3.Error as e:
+            raise errors.GeneralCacheCorruption(e) from e
+
+    def _getitem(self, cpv):
+        rows = self._execute("SELECT data FROM entries WHERE cpv=?", (cpv,))
+        if not rows:
+            raise KeyError(cpv)
+        try:
+            return self._parse_data(rows[0][0].splitlines())
+        except ValueError as e:
+            raise errors.CacheCorruption(cpv, e) from e
+
+    def _getitems(self, cpvs):
+        cpvs = list(cpvs)
+        # stay below sqlite's default bound parameter limit
+        for i in range(0, len(cpvs), 500):
+            chunk = cpvs[i : i + 500]
+            rows = self._execute(
+                "SELECT cpv, data FROM entries WHERE cpv IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for cpv, data in rows:
+                try:
+                    yield cpv, self._parse_data(data.splitlines())
+                except ValueError:
+                    continue
+
+    def category_keys(self, category):
+        # range scan over the primary key for all "category/*" entries
+        rows = self._execute(
+            "SELECT cpv FROM entries WHERE cpv >= ? AND cpv < ?",
+            (f"{category}/", f"{category}0"),
+        )
+        return [row[0] for row in rows]
+
+    def _parse_data(self, data):
+        d = self._cdict_kls()
+        known = self._known_keys
+        for x in data:
+            k, v = x.split("=", 1)
+            if k in known:
+                d[k] = v
+        d[self._chf_key] = self._chf_deserializer(d[self._chf_key])
+        return d
+
+    @staticmethod
+    def _serialize(values):
+        return "".join(f"{k}={v}\n" for k, v in sorted(values.items()))
+
+    def _setitem(self, cpv, values):
+        self._execute(
+            "INSERT OR REPLACE INTO entries (cpv, data) VALUES (?, ?)",
+            (cpv, self._serialize(values)),
+        )
+
+    def _delitem(self, cpv):
+        if cpv not in self:
+            raise KeyError(cpv)
+        self._execute("DELETE FROM entries WHERE cpv=?", (cpv,))
+
+    def __contains__(self, cpv):
+        return bool(self._execute("SELECT 1 FROM entries WHERE cpv=?", (cpv,)))
+
+    def keys(self):
+        return iter([row[0] for row in self._execute("SELECT cpv FROM entries")])
+
+    def commit(self, force=False):
+        db = self._connection
+        if db is None or self.readonly or self._connection_pid != os.getpid():
+            return
+        try:
+            with self._lock:
+                db.commit()
+        except sqlite3.Error as e:
+            raise errors.GeneralCacheCorruption(e) from e
+
+    def get_regen_state(self):
+        rows = self._execute("SELECT value FROM state WHERE key='regen'")
+        return rows[0][0] if rows else None
+
+    def set_regen_state(self, state):
+        if self.readonly:
+            raise errors.ReadOnly()
+        if state is None:
+            self._execute("DELETE FROM state WHERE key='regen'")
+        else:
+            self._execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('regen', ?)",
+                (state,),
+            )
+        self.commit()
+
+    def import_cache(self, source):
+        """Import all entries from another cache without regenerating them.
+
+        The source cache must use the same entry and eclass checksum types,
+        e.g. a :obj:`pkgcore.cache.flat_hash.md5_cache` instance can be imported
+        into a :obj:`md5_cache` instance.
+
+        :param source: cache instance to read entries from
+        :return: number of imported entries
+        """
+        if self.readonly:
+            raise errors.ReadOnly()
+        self.check_compatible(source)
+
+        count = 0
+        for category in source.categories():
+            # missing or corrupted entries are skipped
+            for cpv, values in source.iter_category(category):
+                values = dict(values)
+                if "_eclasses_" in values:
+                    values["_eclasses_"] = {
+                        eclass: SimpleNamespace(**dict(data))
+                        for eclass, data in values["_eclasses_"]
+                    }
+                values["_chf_"] = SimpleNamespace(
+                    **{self.chf_type: values.pop(f"_{self.chf_type}_")}
+                )
+                self[cpv] = values
+                count += 1
+        self.commit()
+        return count
+
+    def __getstate__(self):
+        d = super().__getstate__()
+        del d["_lock"]
+        d["_connection"] = None
+        d["_connection_pid"] = None
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__ = state.copy()
+        self._lock = threading.RLock()
+
+
+class md5_cache(database):
+    """Single file variant of :obj:`pkgcore.cache.flat_hash.md5_cache`.
+
+    :param seed: if not None, repo location whose md5-cache entries are
+        imported when the database is first created, avoiding a full regen
+    """
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "readonly": "bool",
+            "location": "str",
+            "label": "str",
+            "auxdbkeys": "list",
+            "seed": "str",
+        },
+        required=["location"],
+        positional=["location"],
+        typename="cache",
+    )
+
+    chf_type = "md5"
+    eclass_chf_types = ("md5",)
+    chf_base = 16
+
+    def __init__(self, location, seed=None, **config):
+        self.seed = seed
+        location = pjoin(location, "metadata", "md5-cache.sqlite")
+        super().__init__(location, **config)
+
+    def _seed(self):
+        if self.seed is None:
+            return
+        source = flat_hash.md5_cache(self.seed, readonly=True)
+        if not os.path.isdir(source.location):
+            return
+        try:
+            count = self.import_cache(source)
+        except errors.CacheError as e:
+            logger.warning("failed importing %r: %s", source.location, e)
+            return
+        logger.info("imported %i entries from %r", count, source.location)
@@ -1,6 +1,7 @@
 """gentoo ebuild specific base package class"""
 
 from collections import UserString
+from functools import lru_cache
 
 from snakeoil.compatibility import cmp
 from snakeoil.demandload import demand_compile_regexp
@@ -235,6 +236,48 @@ def ver_cmp(ver1: str, rev1: str, ver2: str, rev2: str) -> int:
     return cmp(rev1, rev2)
 
 
+@lru_cache(maxsize=16384)
+def _parse_version(ver: str) -> tuple:
+    """Return a flat tuple ordering version strings the same as :func:`ver_cmp`."""
+    ver, *suffixes = ver.split("_")
+    letter = -1
+    if ver[-1].isalpha():
+        letter = ord(ver[-1])
+        ver = ver[:-1]
+    # Components are stored as (type, value) pairs where those with leading
+    # zeroes are compared as fractional strings and always sort before
+    # integer components. The -1 separator sorts before any pair so versions
+    # with more components are greater regardless of what follows.
+    key = []
+    for x in ver.split("."):
+        if x[0] != "0":
+            key += (1, int(x))
+        else:
+            key += (0, x.rstrip("0"))
+    key += (-1, letter)
+    # Suffixes are stored as (rank, number) pairs, terminated by a pair that
+    # sorts between the pre-release and patch suffixes to handle suffix lists
+    # of differing lengths.
+    for x in suffixes:
+        match = suffix_regexp.match(x)
+        key += (suffix_value[match.group(1)], int("0" + match.group(2)))
+    key += (0, 0)
+    return tuple(key)
+
+
+def ver_key(ver: str, rev) -> tuple:
+    """Return a key ordering versions the same as :func:`ver_cmp`.
+
+    Versions comparing equal via :func:`ver_cmp` have equal keys, allowing
+    versions to be parsed once and then compared or sorted via their keys.
+    """
+    if isinstance(rev, Revision):
+        rev = rev._revint
+    elif rev:
+        rev = int(rev)
+    return (_parse_version(ver), rev or 0)
+
+
 class CPV(base.base):
     """base ebuild package class
 
@@ -255,6 +298,7 @@ class CPV(base.base):
         "version",
         "revision",
         "fullver",
+        "_parsed_version",
     )
 
     def __init__(self, *args, versioned=None):
@@ -355,15 +399,44 @@ class CPV(base.base):
     def __str__(self):
         return getattr(self, "cpvstr", "None")
 
+    @property
+    def version_key(self):
+        """Sort key for the version and revision, None if unversioned.
+
+        See :func:`ver_key` for details.
+        """
+        if self.version is None:
+            return None
+        return (self._get_parsed_version(), self.revision._revint)
+
+    def _get_parsed_version(self):
+        # Parsed versions are cached per instance and shared between instances
+        # with the same version string, so repeated comparisons neither reparse
+        # nor allocate.
+        try:
+            return self._parsed_version
+        except AttributeError:
+            parsed = _parse_version(self.version)
+            object.__setattr__(self, "_parsed_version", parsed)
+            return parsed
+
+    def _ver_cmp(self, other):
+        try:
+            key1 = self._get_parsed_version()
+            key2 = other._get_parsed_version()
+        except AttributeError:
+            # unversioned or foreign objects
+            return ver_cmp(self.version, self.revision, other.version, other.revision)
+        if key1 is not key2 and key1 != key2:
+            return 1 if key1 > key2 else -1
+        return cmp(self.revision._revint, other.revision._revint)
+
     def __eq__(self, other):
         try:
             if self.cpvstr == other.cpvstr:
                 return True
             if self.category == other.category and self.package == other.package:
-                return (
-                    ver_cmp(self.version, self.revision, other.version, other.revision)
-                    == 0
-                )
+                return self._ver_cmp(other) == 0
         except AttributeError:
             pass
         return False
@@ -375,12 +448,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        < 0
-                    )
+                    return self._ver_cmp(other) < 0
                 return self.package < other.package
             return self.category < other.category
         except AttributeError:
@@ -393,12 +461,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        <= 0
-                    )
+                    return self._ver_cmp(other) <= 0
                 return self.package < other.package
             return self.category < other.category
         except AttributeError:
@@ -411,12 +474,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        > 0
-                    )
+                    return self._ver_cmp(other) > 0
                 return self.package > other.package
             return self.category > other.category
         except AttributeError:
@@ -429,12 +487,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        >= 0
-                    )
+                    return self._ver_cmp(other) >= 0
                 return self.package > other.package
             return self.category > other.category
         except AttributeError:
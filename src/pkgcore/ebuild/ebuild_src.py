@@ -471,6 +471,8 @@ class package_factory(metadata.factory):
         super().__init__(parent, *args, **kwargs)
         self._cache = cachedb
         self._ecache = eclass_cache
+        self._prefetch_batch = frozenset()
+        self._prefetched = {}
 
         if mirrors:
             mirrors = {k: fetch.mirror(v, k) for k, v in mirrors.items()}
@@ -492,17 +494,77 @@ class package_factory(metadata.factory):
     def _get_ebuild_mtime(self, pkg):
         return os.stat(self._get_ebuild_path(pkg)).st_mtime
 
-    def _get_metadata(self, pkg, ebp=None, force_regen=False):
+    @klass.jit_attr
+    def _chksum_memo(self):
+        return getattr(self._parent_repo, "ebuild_chksums", None)
+
+    def _get_ebuild_hash(self, pkg):
+        """Return a lazily hashed ebuild path seeded with memoized checksums.
+
+        :return: (:obj:`snakeoil.chksum.LazilyHashedPath`, stat result) tuple
+            where the stat result is None if memoization isn't possible
+        """
+        return self._get_path_hash(pkg.path)
+
+    def _get_path_hash(self, path):
+        memo = self._chksum_memo
+        if memo is None:
+            return chksum.LazilyHashedPath(path), None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return chksum.LazilyHashedPath(path), None
+        chksums = memo.get(path, st)
+        return chksum.LazilyHashedPath(path, mtime=int(st.st_mtime), **chksums), st
+
+    def _memoize_ebuild_hash(self, ebuild_hash, st):
+        """Store checksums calculated for an ebuild in the memo."""
+        if st is not None:
+            chksums = {
+                k: v for k, v in vars(ebuild_hash).items() if k not in ("path", "mtime")
+            }
+            self._chksum_memo.update(ebuild_hash.path, st, chksums)
+
+    def prefetch_metadata(self, cpvs):
+        """Register a batch of packages whose metadata will likely be requested.
+
+        The cache entries for the whole batch are pulled at once via
+        :obj:`pkgcore.cache.base.get_many` when the metadata for any package
+        in the batch is first requested. Only the most recent batch is kept.
+
+        :param cpvs: iterable of cpv strings
+        """
+        self._prefetch_batch = frozenset(cpvs)
+        self._prefetched = {}
+
+    def _get_cache_entry(self, cache, cpvstr):
+        if cache is self._cache[0]:
+            batch = self._prefetch_batch
+            if cpvstr in batch:
+                self._prefetch_batch = frozenset()
+                self._prefetched = cache.get_many(batch)
+            data = self._prefetched.pop(cpvstr, None)
+            if data is not None:
+                return data
+        return cache[cpvstr]
+
+    def _get_cached_metadata(self, pkg, force_regen=False):
+        """Return valid cached metadata for a package.
+
+        :return: (metadata, ebuild hash) tuple where metadata is None if no
+            valid cache entry exists
+        """
         caches = self._cache
         if force_regen:
             caches = ()
-        ebuild_hash = chksum.LazilyHashedPath(pkg.path)
+        ebuild_hash, st = self._get_ebuild_hash(pkg)
         for cache in caches:
             if cache is not None:
                 try:
-                    data = cache[pkg.cpvstr]
+                    data = self._get_cache_entry(cache, pkg.cpvstr)
                     if cache.validate_entry(data, ebuild_hash, self._ecache):
-                        return data
+                        self._memoize_ebuild_hash(ebuild_hash, st)
+                        return data, (ebuild_hash, st)
                     if not cache.readonly:
                         del cache[pkg.cpvstr]
                 except KeyError:
@@ -511,11 +573,58 @@ class package_factory(metadata.factory):
                     logger.warning("caught cache error: %s", e)
                     del e
                     continue
+        return None, (ebuild_hash, st)
 
+    def _get_metadata(self, pkg, ebp=None, force_regen=False):
+        data, ebuild_hash = self._get_cached_metadata(pkg, force_regen=force_regen)
+        if data is not None:
+            return data
         # no cache entries, regen
-        return self._update_metadata(pkg, ebp=ebp)
+        return self._update_metadata(pkg, ebp=ebp, ebuild_hash=ebuild_hash)
+
+    def _get_metadata_batch(self, pkgs, ebp=None, force_regen=False):
+        """Get the metadata for multiple packages, regenerating it as needed.
+
+        Packages lacking valid cache entries are regenerated using a single
+        batched request to the ebuild processor.
+
+        :return: list of (package, result) tuples in the same order as the
+            given packages where result is a metadata dict when successful or
+            a :obj:`pkgcore.package.errors.MetadataException` instance when
+            failed
+        """
+        pkgs = tuple(pkgs)
+        results = {}
+        regen = []
+        for pkg in pkgs:
+            try:
+                data, ebuild_hash = self._get_cached_metadata(pkg, force_regen)
+                if data is None and not pkg.eapi.is_supported:
+                    data = {"EAPI": str(pkg.eapi)}
+            except metadata_errors.MetadataException as e:
+                data = e
+            if data is None:
+                regen.append((pkg, ebuild_hash))
+            else:
+                results[pkg] = data
 
-    def _update_metadata(self, pkg, ebp=None):
+        if regen:
+            with processor.reuse_or_request(ebp) as my_proc:
+                batch = my_proc.get_keys_batch((x[0] for x in regen), self._ecache)
+            for (pkg, mydata), (_, ebuild_hash) in zip(batch, regen):
+                try:
+                    if isinstance(mydata, processor.ProcessorError):
+                        raise metadata_errors.MetadataException(
+                            pkg, "data", "failed sourcing ebuild", mydata
+                        )
+                    data = self._store_metadata(pkg, mydata, ebuild_hash)
+                except metadata_errors.MetadataException as e:
+                    data = e
+                results[pkg] = data
+
+        return [(pkg, results[pkg]) for pkg in pkgs]
+
+    def _update_metadata(self, pkg, ebp=None, ebuild_hash=None):
         parsed_eapi = pkg.eapi
         if not parsed_eapi.is_supported:
             return {"EAPI": str(parsed_eapi)}
@@ -527,7 +636,11 @@ class package_factory(metadata.factory):
                 raise metadata_errors.MetadataException(
                     pkg, "data", "failed sourcing ebuild", e
                 )
+        return self._store_metadata(pkg, mydata, ebuild_hash)
 
+    def _store_metadata(self, pkg, mydata, ebuild_hash=None):
+        """Validate and normalize sourced metadata, writing it to the cache."""
+        parsed_eapi = pkg.eapi
         # Rewrite defined_phases as needed, since we now know the EAPI.
         eapi = get_eapi(mydata.get("EAPI", "0"))
         if parsed_eapi != eapi:
@@ -550,7 +663,9 @@ class package_factory(metadata.factory):
 
         if inherited := mydata.pop("INHERITED", None):
             mydata["_eclasses_"] = self._ecache.get_eclass_data(inherited.split())
-        mydata["_chf_"] = chksum.LazilyHashedPath(pkg.path)
+        if ebuild_hash is None:
+            ebuild_hash = self._get_ebuild_hash(pkg)
+        mydata["_chf_"] = ebuild_hash[0]
 
         for x in wipes:
             del mydata[x]
@@ -564,6 +679,7 @@ class package_factory(metadata.factory):
                         logger.warning("caught cache error: %s", e)
                         del e
                         continue
+                    self._memoize_ebuild_hash(*ebuild_hash)
                     break
 
         return mydata
@@ -15,6 +15,37 @@ from snakeoil.mappings import ImmutableDict, OrderedFrozenSet, StackedDict
 from snakeoil.osutils import listdir_files, normpath, pjoin
 
 from ..config.hint import ConfigHint
+from ..util import chksum_memo
+
+
+class _MemoizedPath(LazilyHashedPath):
+    """Lazily hashed path pulling checksums from a persistent memo.
+
+    Checksums are looked up in the memo on first access, falling back to
+    hashing the file and memoizing the result, so unchanged files only cost a
+    stat across runs.
+    """
+
+    def __init__(self, path, memo, **initial_values):
+        super().__init__(path, **initial_values)
+        object.__setattr__(self, "_memo", memo)
+
+    def __getattr__(self, attr):
+        if attr.startswith("_") or attr == "mtime":
+            return super().__getattr__(attr)
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return super().__getattr__(attr)
+        chksums = self._memo.get(self.path, st)
+        if attr not in chksums:
+            val = super().__getattr__(attr)
+            self._memo.update(self.path, st, {attr: val})
+            return val
+        for chf, val in chksums.items():
+            if chf not in self.__dict__:
+                object.__setattr__(self, chf, val)
+        return chksums[attr]
 
 
 class base:
@@ -102,12 +133,15 @@ class cache(base):
             files = listdir_files(self.eclassdir)
         except (FileNotFoundError, NotADirectoryError):
             return ImmutableDict()
+        # eclass checksums are memoized per eclass dir so trees sharing
+        # masters share their memos
+        memo = chksum_memo.get_memo("eclass-chksums", self.eclassdir, self.eclassdir)
         for y in sorted(files):
             if not y.endswith(".eclass"):
                 continue
             ys = y[:-eclass_len]
-            ec[intern(ys)] = LazilyHashedPath(
-                pjoin(self.eclassdir, y), eclassdir=self.eclassdir
+            ec[intern(ys)] = _MemoizedPath(
+                pjoin(self.eclassdir, y), memo, eclassdir=self.eclassdir
             )
         return ImmutableDict(ec)
 
@@ -0,0 +1,526 @@
+"""
+persistent inverted index of ebuild repo metadata
+
+Metadata commonly used for queries, e.g. EAPI, descriptions, licenses,
+keywords, USE flags, inherited eclasses, and metadata.xml maintainers, is
+pulled from valid metadata cache entries and stored per repo, allowing
+restrictions on those attributes to be answered without loading the
+metadata for every package in the repo.
+
+Entries are validated in the same manner as metadata cache entries, i.e. via
+the ebuild's checksum and the checksums of its inherited eclasses, while
+package level data is validated via the stat data of the package's
+metadata.xml file. Entries are only validated for the package versions a
+query touches, while packages lacking a current entry are always returned as
+candidates so queries never miss matches.
+"""
+
+__all__ = ("MetadataIndex", "Candidates")
+
+import json
+import os
+import time
+from collections import defaultdict
+from itertools import chain
+from types import SimpleNamespace
+
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.mappings import OrderedFrozenSet
+from snakeoil.osutils import ensure_dirs, pjoin
+
+from .. import const
+from ..log import logger
+from ..package import errors as pkg_errors
+from ..restrictions import boolean, packages, restriction, values
+from ..util.chksum_memo import stat_key
+from .cpv import CPV
+from .eapi import get_eapi
+from .errors import InvalidCPV
+from .repo_objs import Maintainer
+
+INDEX_VERSION = 1
+
+# per package version entry fields
+_CHKSUM, _ECLASSES, _EAPI, _DESCRIPTION, _LICENSE, _KEYWORDS, _IUSE, _INHERITED = range(
+    8
+)
+# per package entry fields, shared between all versions of a package
+_STAT, _LONGDESCRIPTION, _MAINTAINERS = range(3)
+
+# indexed package attributes mapped to their entry type, field, and a function
+# converting hashable index values into the values the package attribute returns
+_fields = {
+    "eapi": (False, _EAPI, get_eapi),
+    "description": (False, _DESCRIPTION, str),
+    "keywords": (False, _KEYWORDS, tuple),
+    "iuse_stripped": (False, _IUSE, frozenset),
+    "inherited": (False, _INHERITED, OrderedFrozenSet),
+    "longdescription": (True, _LONGDESCRIPTION, lambda x: x),
+    "maintainers": (True, _MAINTAINERS, lambda x: tuple(Maintainer(*m) for m in x)),
+}
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(map(_hashable, value))
+    return value
+
+
+def _cpv_key(cpvstr):
+    """Return the package key for a cpv string or None if it's invalid."""
+    try:
+        return CPV(cpvstr, versioned=True).key
+    except InvalidCPV:
+        return None
+
+
+def _license_tokens(license):
+    """Return all licenses referenced by a LICENSE string."""
+    return sorted(
+        {x for x in license.split() if x not in ("||", "(", ")") and x[-1] != "?"}
+    )
+
+
+class MetadataIndex:
+    """Per repo index mapping package metadata to the versions using it.
+
+    :ivar repo: :obj:`pkgcore.ebuild.repository.UnconfiguredTree` instance
+    :ivar path: on disk location of the index file
+    :ivar racy_window: metadata.xml files modified within this many
+        nanoseconds of being indexed are skipped since further changes
+        within the filesystem's timestamp granularity wouldn't alter their
+        stat data.
+    """
+
+    racy_window = 2 * 10**9
+
+    def __init__(self, repo, path=None):
+        self.repo = repo
+        if path is None:
+            filename = repo.repo_id.replace(os.sep, "_").lstrip(".")
+            path = pjoin(const.USER_CACHE_PATH, "metadata-index", filename)
+        self.path = path
+        cache = next((x for x in repo.cache if x is not None), None)
+        if cache is None:
+            self.chf_type = self.eclass_chf_types = None
+        else:
+            self.chf_type = cache.chf_type
+            self.eclass_chf_types = tuple(cache.eclass_chf_types)
+        self._reset()
+
+    def _reset(self):
+        self._entries = None
+        self._packages = None
+        self._pkg_cpvs = None
+        self._values = {}
+        self._dirty = False
+        # validation results for touched packages and versions
+        self._checked = {}
+        self._pkg_checked = {}
+        # generations entries were last modified at, bumped on every change
+        self._generation = 0
+        self._entry_gens = {}
+        self._pkg_gens = {}
+
+    def _ensure_loaded(self):
+        if self._entries is None:
+            self._entries, self._packages = self._load()
+
+    def _changed(self):
+        self._generation += 1
+        self._values = {}
+        self._dirty = True
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            header = (data["version"], data["root"], data["chf"], data["eclass_chfs"])
+            if header == (
+                INDEX_VERSION,
+                self.repo.location,
+                self.chf_type,
+                list(self.eclass_chf_types),
+            ):
+                return data["packages"], data["metadata_xml"]
+        except FileNotFoundError:
+            pass
+        except (EnvironmentError, ValueError, KeyError, TypeError) as e:
+            logger.debug("failed reading metadata index %r: %s", self.path, e)
+        return {}, {}
+
+    def _valid_entry(self, cat, pkg, ver, entry):
+        """Determine if an entry matches the current ebuild and its eclasses."""
+        factory = self.repo.package_class
+        path = pjoin(self.repo.base, cat, pkg, f"{pkg}-{ver}{self.repo.extension}")
+        ebuild_hash, st = factory._get_path_hash(path)
+        if getattr(ebuild_hash, self.chf_type, None) != entry[_CHKSUM]:
+            return False
+        factory._memoize_ebuild_hash(ebuild_hash, st)
+        if entry[_ECLASSES]:
+            chfs = self.eclass_chf_types
+            eclasses = ((eclass, zip(chfs, vals)) for eclass, vals in entry[_ECLASSES])
+            if self.repo.eclass_cache.rebuild_cache_entry(eclasses) is None:
+                return False
+        return True
+
+    def _index_entry(self, cat, pkg, ver):
+        """Create an entry for a package version from its cache entry.
+
+        :return: the entry or None if the package lacks valid cached metadata
+        """
+        factory = self.repo.package_class
+        try:
+            instance = factory(cat, pkg, ver)
+            data, (ebuild_hash, _st) = factory._get_cached_metadata(instance)
+            if data is None:
+                return None
+            eclasses = [
+                [eclass, [getattr(ec_data, chf) for chf in self.eclass_chf_types]]
+                for eclass, ec_data in data.get("_eclasses_", {}).items()
+            ]
+            license = _license_tokens(data.get("LICENSE", ""))
+            object.__setattr__(instance, "data", data)
+            return [
+                getattr(ebuild_hash, self.chf_type),
+                eclasses,
+                str(instance.eapi),
+                instance.description,
+                license,
+                list(instance.keywords),
+                sorted(instance.iuse_stripped),
+                list(instance.inherited),
+            ]
+        except (pkg_errors.PackageError, EnvironmentError) as e:
+            logger.debug("failed indexing %s/%s-%s: %s", cat, pkg, ver, e)
+            return None
+
+    def _update_package(self, cat, pkg):
+        """Update a package's metadata.xml data as needed.
+
+        :return: True if the package's data is current, otherwise False
+        """
+        cp = f"{cat}/{pkg}"
+        try:
+            key = list(
+                stat_key(os.stat(pjoin(self.repo.base, cat, pkg, "metadata.xml")))
+            )
+        except FileNotFoundError:
+            key = None
+        entry = self._packages.get(cp)
+        if entry is not None and entry[_STAT] == key:
+            return True
+        if self._packages.pop(cp, None) is not None:
+            self._dirty = True
+        if key is not None and time.time_ns() - key[-1] < self.racy_window:
+            return False
+        mxml = self.repo._get_metadata_xml(cat, pkg)
+        maintainers = [
+            [x.email, x.name, x.description, x.maint_type, x.proxied]
+            for x in mxml.maintainers
+        ]
+        self._packages[cp] = [key, mxml.longdescription, maintainers]
+        self._dirty = True
+        return True
+
+    def _check_package(self, cat, pkg):
+        """Validate a package's metadata.xml data, updating it as needed.
+
+        :return: generation the package's data was last modified at or None
+            if its data isn't current
+        """
+        cp = f"{cat}/{pkg}"
+        if (current := self._pkg_checked.get(cp)) is None:
+            entry = self._packages.get(cp)
+            current = self._pkg_checked[cp] = self._update_package(cat, pkg)
+            if self._packages.get(cp) is not entry:
+                self._changed()
+                self._pkg_gens[cp] = self._generation
+        return self._pkg_gens.get(cp, 0) if current else None
+
+    def _check_version(self, cat, pkg, ver):
+        """Validate a package version's entry, reindexing it as needed.
+
+        :return: generation the entry was last modified at or None if the
+            package version lacks a valid entry
+        """
+        cpv = f"{cat}/{pkg}-{ver}"
+        if (current := self._checked.get(cpv)) is None:
+            entry = self._entries.get(cpv)
+            if entry is None or not self._valid_entry(cat, pkg, ver, entry):
+                changed = self._entries.pop(cpv, None) is not None
+                if (entry := self._index_entry(cat, pkg, ver)) is not None:
+                    self._entries[cpv] = entry
+                    changed = True
+                if changed:
+                    self._changed()
+                    self._entry_gens[cpv] = self._generation
+            current = self._checked[cpv] = entry is not None
+        return self._entry_gens.get(cpv, 0) if current else None
+
+    def update(self):
+        """Validate all entries, reindexing outdated ones from the metadata cache.
+
+        Packages without valid metadata cache entries aren't regenerated and
+        are left unindexed. Entries for removed packages are dropped.
+        """
+        if self.chf_type is None:
+            return
+        self._ensure_loaded()
+        self._checked.clear()
+        self._pkg_checked.clear()
+        pkg_cpvs = {}
+        for (cat, pkg), versions in self.repo.versions.items():
+            self._check_package(cat, pkg)
+            pkg_cpvs[f"{cat}/{pkg}"] = [f"{cat}/{pkg}-{ver}" for ver in versions]
+            for ver in versions:
+                self._check_version(cat, pkg, ver)
+        self._pkg_cpvs = pkg_cpvs
+        self._prune(chain.from_iterable(pkg_cpvs.values()), pkg_cpvs)
+        self.flush()
+
+    def update_packages(self, cps):
+        """Validate the entries for the given packages, reindexing as needed.
+
+        Entries for removed package versions are dropped.
+
+        :param cps: iterable of (category, package) tuples
+        """
+        if self.chf_type is None:
+            return
+        self._ensure_loaded()
+        cps = {f"{cat}/{pkg}": (cat, pkg) for cat, pkg in cps}
+        prefixes = tuple(f"{cp}-" for cp in cps)
+        stale = {
+            x for x in self._entries if x.startswith(prefixes) and _cpv_key(x) in cps
+        }
+        stale_pkgs = set(cps).intersection(self._packages)
+        for cp, (cat, pkg) in cps.items():
+            self._pkg_checked.pop(cp, None)
+            if not (versions := self.repo.versions.get((cat, pkg), ())):
+                continue
+            stale_pkgs.discard(cp)
+            self._check_package(cat, pkg)
+            for ver in versions:
+                stale.discard(cpv := f"{cp}-{ver}")
+                self._checked.pop(cpv, None)
+                self._check_version(cat, pkg, ver)
+        self._prune_entries(stale, stale_pkgs)
+        self.flush()
+
+    def _prune(self, cpvs, pkgs):
+        """Drop all entries except for the given package versions and packages."""
+        self._prune_entries(
+            set(self._entries).difference(cpvs), set(self._packages).difference(pkgs)
+        )
+
+    def _prune_entries(self, cpvs, pkgs):
+        """Drop the entries for the given package versions and packages."""
+        for cpv in cpvs:
+            if self._entries.pop(cpv, None) is not None:
+                self._changed()
+            self._checked.pop(cpv, None)
+        for cp in pkgs:
+            if self._packages.pop(cp, None) is not None:
+                self._changed()
+            self._pkg_checked.pop(cp, None)
+
+    def flush(self):
+        """Write the index to disk if it was modified."""
+        if not self._dirty:
+            return
+        f = None
+        try:
+            ensure_dirs(os.path.dirname(self.path), mode=0o755)
+            f = AtomicWriteFile(self.path)
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "root": self.repo.location,
+                    "chf": self.chf_type,
+                    "eclass_chfs": self.eclass_chf_types,
+                    "packages": self._entries,
+                    "metadata_xml": self._packages,
+                },
+                f,
+            )
+            f.close()
+            self._dirty = False
+        except EnvironmentError as e:
+            logger.debug("failed writing metadata index %r: %s", self.path, e)
+        finally:
+            if f is not None:
+                f.discard()
+
+    def _package_versions(self):
+        """Return a mapping of all packages to their versions' cpv strings."""
+        if self._pkg_cpvs is None:
+            self._pkg_cpvs = {
+                f"{cat}/{pkg}": [f"{cat}/{pkg}-{ver}" for ver in versions]
+                for (cat, pkg), versions in self.repo.versions.items()
+            }
+        return self._pkg_cpvs
+
+    def _field_values(self, attr):
+        """Return a mapping of an attribute's indexed values to package versions."""
+        if (d := self._values.get(attr)) is not None:
+            return d
+        d = defaultdict(set)
+        if attr == "license":
+            for cpv, entry in self._entries.items():
+                for license in entry[_LICENSE]:
+                    d[license].add(cpv)
+        elif _fields[attr][0]:
+            field = _fields[attr][1]
+            pkg_cpvs = self._package_versions()
+            for cp, entry in self._packages.items():
+                d[_hashable(entry[field])].update(pkg_cpvs.get(cp, ()))
+        else:
+            field = _fields[attr][1]
+            for cpv, entry in self._entries.items():
+                d[_hashable(entry[field])].add(cpv)
+        self._values[attr] = d
+        return d
+
+    def _match(self, restrict):
+        """Return the indexed package versions possibly matching a restriction.
+
+        :return: set of cpv strings or None if the index can't be used
+        """
+        if isinstance(restrict, restriction.AlwaysBool):
+            return None if restrict.negate else frozenset()
+        elif isinstance(restrict, boolean.base):
+            if restrict.negate:
+                return None
+            results = [self._match(x) for x in restrict.restrictions]
+            if isinstance(restrict, boolean.AndRestriction):
+                results = [x for x in results if x is not None]
+                if not results:
+                    return None
+                return frozenset.intersection(*map(frozenset, results))
+            elif isinstance(restrict, boolean.OrRestriction):
+                if any(x is None for x in results):
+                    return None
+                return frozenset().union(*results)
+            return None
+        elif type(restrict) is not packages.PackageRestriction:
+            return None
+
+        attr = ".".join(restrict._attr_split)
+        if attr == "license":
+            # only exact matches are supported since licenses are reduced
+            # to the set of all referenced licenses
+            child = restrict.restriction
+            if restrict.negate or type(child) is not values.ContainmentMatch:
+                return None
+            elif child.negate:
+                return None
+            postings = self._field_values(attr)
+            matches = [postings.get(x, set()) for x in child.vals]
+            if not matches:
+                return None
+            elif child.all:
+                return frozenset.intersection(*map(frozenset, matches))
+            return frozenset().union(*matches)
+        elif attr not in _fields:
+            return None
+
+        convert = _fields[attr][2]
+        matches = set()
+        try:
+            for value, cpvs in self._field_values(attr).items():
+                if restrict.match(SimpleNamespace(**{attr: convert(value)})):
+                    matches.update(cpvs)
+        except Exception as e:
+            # fallback to matching packages for restrictions that can't
+            # handle the indexed values
+            logger.debug("failed matching %s against metadata index: %s", restrict, e)
+            return None
+        return matches
+
+    def _package_level(self, restrict):
+        """Determine if a restriction matches against package level data."""
+        if isinstance(restrict, boolean.base):
+            return any(self._package_level(x) for x in restrict.restrictions)
+        elif type(restrict) is packages.PackageRestriction:
+            attr = ".".join(restrict._attr_split)
+            return attr in _fields and _fields[attr][0]
+        return False
+
+    def candidates(self, restrict):
+        """Return the package versions that could match a given restriction.
+
+        Entries are validated lazily, only for the package versions checked
+        against the returned candidates. Package versions lacking current
+        index entries are always included.
+
+        :param restrict: package restriction
+        :return: :obj:`Candidates` instance or None if every package version
+            is a candidate
+        """
+        if self.chf_type is None:
+            return None
+        self._ensure_loaded()
+        # write out entries updated by previous queries
+        self.flush()
+        if (matches := self._match(restrict)) is None:
+            return None
+        return Candidates(self, matches, self._package_level(restrict))
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d.update(
+            _entries=None,
+            _packages=None,
+            _pkg_cpvs=None,
+            _values={},
+            _dirty=False,
+            _checked={},
+            _pkg_checked={},
+            _generation=0,
+            _entry_gens={},
+            _pkg_gens={},
+        )
+        return d
+
+
+class Candidates:
+    """Package versions possibly matching a restriction according to an index.
+
+    Membership checks validate the entries of the checked package versions,
+    with package versions lacking current entries always being candidates.
+    """
+
+    __slots__ = ("index", "matches", "packages", "generation")
+
+    def __init__(self, index, matches, packages=True):
+        self.index = index
+        self.matches = matches
+        # package level data is only validated if matches depend on it
+        self.packages = packages
+        # entries modified after the matches were determined are candidates
+        self.generation = index._generation
+
+    def contains(self, cat, pkg, ver):
+        """Determine if a package version is a candidate."""
+        pkg_gen = self.index._check_package(cat, pkg) if self.packages else 0
+        ver_gen = self.index._check_version(cat, pkg, ver)
+        if pkg_gen is None or ver_gen is None:
+            return True
+        elif max(pkg_gen, ver_gen) > self.generation:
+            return True
+        return f"{cat}/{pkg}-{ver}" in self.matches
+
+    def __contains__(self, cpvstr):
+        try:
+            pkg = CPV(cpvstr, versioned=True)
+        except InvalidCPV:
+            return False
+        return self.contains(pkg.category, pkg.package, pkg.fullver)
+
+    def __iter__(self):
+        for (cat, pkg), versions in self.index.repo.versions.items():
+            for ver in versions:
+                if self.contains(cat, pkg, ver):
+                    yield f"{cat}/{pkg}-{ver}"
+        self.index.flush()
@@ -631,27 +631,48 @@ class PortageConfig(DictMixin):
 
         return base
 
-    def _make_cache(self, cache_format, repo_path):
+    def _make_cache(self, cache_format, repo_path, cache_backend=None):
         """Configure repo cache."""
+        if cache_backend is None:
+            cache_backend = "flat"
+        elif cache_backend not in ("flat", "sqlite"):
+            logger.warning(
+                f"repos.conf: repo at {repo_path!r} has unsupported cache-backend "
+                f"{cache_backend!r} (defaulting to 'flat')"
+            )
+            cache_backend = "flat"
+        extra = {}
+
         # Use md5 cache if it exists or the option is selected, otherwise default
         # to the old flat hash format in /var/cache/edb/dep/*.
         if (
             os.path.exists(pjoin(repo_path, "metadata", "md5-cache"))
             or cache_format == "md5-dict"
         ):
-            kls = "pkgcore.cache.flat_hash.md5_cache"
-            cache_parent_dir = pjoin(repo_path, "metadata", "md5-cache")
+            if cache_backend == "sqlite":
+                # new databases are seeded from the repo's md5-cache
+                kls = "pkgcore.cache.sqlite.md5_cache"
+                cache_parent_dir = pjoin(repo_path, "metadata")
+                extra = {"seed": repo_path}
+            else:
+                kls = "pkgcore.cache.flat_hash.md5_cache"
+                cache_parent_dir = pjoin(repo_path, "metadata", "md5-cache")
         else:
-            kls = "pkgcore.cache.flat_hash.database"
             repo_path = pjoin("/var/cache/edb/dep", repo_path.lstrip("/"))
-            cache_parent_dir = repo_path
+            if cache_backend == "sqlite":
+                kls = "pkgcore.cache.sqlite.database"
+                repo_path += ".sqlite"
+                cache_parent_dir = os.path.dirname(repo_path)
+            else:
+                kls = "pkgcore.cache.flat_hash.database"
+                cache_parent_dir = repo_path
 
         while not os.path.exists(cache_parent_dir):
             cache_parent_dir = os.path.dirname(cache_parent_dir)
         readonly = not os.access(cache_parent_dir, os.W_OK | os.X_OK)
 
         return basics.AutoConfigSection(
-            {"class": kls, "location": repo_path, "readonly": readonly}
+            {"class": kls, "location": repo_path, "readonly": readonly, **extra}
         )
 
     def _register_repo_type(supported_repo_types):
@@ -698,7 +719,9 @@ class PortageConfig(DictMixin):
         # metadata cache
         if repo_obj.cache_format is not None:
             cache_name = "cache:" + repo_name
-            self[cache_name] = self._make_cache(repo_obj.cache_format, repo_path)
+            self[cache_name] = self._make_cache(
+                repo_obj.cache_format, repo_path, repo_opts.get("cache-backend")
+            )
             repo["cache"] = cache_name
 
         if repo_name == defaults["main-repo"]:
@@ -27,6 +27,7 @@ import errno
 import os
 import signal
 import threading
+import time
 import traceback
 from functools import partial, wraps
 from itertools import chain
@@ -40,7 +41,9 @@ from ..exceptions import PkgcoreException, PkgcoreUserException
 from ..log import logger
 from . import const as e_const
 
-_global_ebp_lock = threading.Lock()
+# reentrant since processors can be released by finalizers, e.g. regen helpers
+# collected while another processor is being requested
+_global_ebp_lock = threading.RLock()
 inactive_ebp_list = []
 active_ebp_list = []
 
@@ -82,6 +85,17 @@ def shutdown_all_processors():
 spawn.atexit_register(shutdown_all_processors)
 
 
+def _reset_after_fork():
+    """Forget processors inherited from the parent in forked children."""
+    global _global_ebp_lock
+    _global_ebp_lock = threading.RLock()
+    del active_ebp_list[:]
+    del inactive_ebp_list[:]
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 @_singled_threaded
 def request_ebuild_processor(userpriv=False, sandbox=None, fd_pipes=None):
     """Request a processor instance, creating a new one if needed.
@@ -329,6 +343,12 @@ class EbuildProcessor:
 
         self._preloaded_eclasses = {}
         self._eclass_caching = False
+        # inherited eclasses served from preloaded functions vs requested
+        self.eclass_preload_hits = 0
+        self.eclass_preload_misses = 0
+        # optional callback passed (pkg, elapsed, inherited, preloaded) for
+        # each ebuild whose metadata is generated
+        self.metadata_profiler = None
         self._outstanding_expects = []
         self._metadata_paths = None
         self.pid = None
@@ -828,16 +848,15 @@ class EbuildProcessor:
         data = self._generate_env_str(env)
         self.write(f"{command} {len(data)}\n{data}", append_newline=False)
 
-        updates = None
-        if self._eclass_caching:
-            updates = set()
+        updates = set()
         commands = extra_commands.copy()
         commands["request_inherit"] = partial(
             inherit_handler, eclass_cache, updates=updates
         )
         self.generic_handler(additional_commands=commands)
-        if updates:
+        if updates and self._eclass_caching:
             self.preload_eclasses(eclass_cache, limited_to=updates, async_req=True)
+        return updates
 
     def get_ebuild_environment(self, package_inst, eclass_cache):
         """Request a dump of the ebuild environ for a package.
@@ -900,16 +919,115 @@ class EbuildProcessor:
             "PKGCORE_METADATA_KEYS": tuple(package_inst.eapi.metadata_keys),
         }
 
-        self._run_depend_like_phase(
+        start = time.monotonic()
+        requested = self._run_depend_like_phase(
             "gen_metadata",
             package_inst,
             eclass_cache,
             env=env,
             extra_commands={"key": receive_key},
         )
-
+        self._record_metadata_stats(
+            package_inst, time.monotonic() - start, metadata_keys, requested
+        )
         return metadata_keys
 
+    def _record_metadata_stats(self, pkg, elapsed, metadata_keys, requested):
+        """Update eclass preload stats and profile data for a sourced ebuild."""
+        inherited = frozenset(metadata_keys.get("INHERITED", "").split())
+        preloaded = inherited - requested
+        self.eclass_preload_hits += len(preloaded)
+        self.eclass_preload_misses += len(inherited) - len(preloaded)
+        if self.metadata_profiler is not None:
+            self.metadata_profiler(pkg, elapsed, inherited, preloaded)
+
+    def get_keys_batch(self, pkgs, eclass_cache):
+        """Request the metadata be regenerated for multiple ebuilds at once.
+
+        All ebuild environments are sent in a single request with results
+        streamed back as each ebuild is sourced, avoiding a round trip per
+        ebuild. Failures for individual ebuilds don't affect the rest of the
+        batch.
+
+        :param pkgs: sequence of :obj:`pkgcore.ebuild.ebuild_src.package`
+            instances to regenerate
+        :param eclass_cache: :obj:`pkgcore.ebuild.eclass_cache` instance to use
+            for eclass access
+        :return: list of (package, result) tuples in the same order as the
+            given packages where result is a metadata dict when successful or
+            a :obj:`ProcessorError` instance when failed
+        """
+        pkgs = tuple(pkgs)
+        if not pkgs:
+            return []
+
+        # ebuild is not allowed to run any external programs during
+        # depend phases; use /dev/null since "" == "."
+        self._ensure_metadata_paths(("/dev/null",))
+
+        data = []
+        for pkg in pkgs:
+            env = {
+                "PKGCORE_EBUILD_PHASES": tuple(pkg.eapi.phases.values()),
+                "PKGCORE_METADATA_KEYS": tuple(pkg.eapi.metadata_keys),
+            }
+            env = self._generate_env_str(expected_ebuild_env(pkg, env, depends=True))
+            data.append(f"{len(env)}\n{env}")
+        self.write(
+            f"gen_metadata_batch {len(pkgs)}\n{''.join(data)}", append_newline=False
+        )
+
+        # ebuilds are sourced sequentially, so each one is timed from the
+        # result of the previous one
+        start = [time.monotonic()]
+        results = []
+        metadata_keys = []
+        # eclasses requested for the current ebuild and the entire batch
+        requested = set()
+        updates = set()
+
+        def receive_metadata(self, line):
+            metadata_keys.append(dict(x.split("=", 1) for x in line.split("\0") if x))
+
+        def receive_result(self, line):
+            status, *error = line.split("\0")
+            pkg = pkgs[len(results)]
+            if status != "succeeded":
+                results.append((pkg, EbdError("\n".join(error))))
+            elif not metadata_keys:
+                results.append((pkg, ProcessorError("no metadata keys received")))
+            else:
+                mydata = metadata_keys.pop()
+                elapsed = time.monotonic() - start[0]
+                self._record_metadata_stats(pkg, elapsed, mydata, requested)
+                results.append((pkg, mydata))
+            metadata_keys.clear()
+            requested.clear()
+            start[0] = time.monotonic()
+
+        def request_inherit(self, line=None):
+            if line is not None and eclass_cache.get_eclass(line.strip()) is None:
+                # fail the current ebuild instead of the entire batch
+                self.write("unknown")
+                return
+            inherit_handler(eclass_cache, self, line=line, updates=requested)
+            updates.update(requested)
+
+        self.generic_handler(
+            additional_commands={
+                "request_inherit": request_inherit,
+                "metadata": receive_metadata,
+                "batch_item": receive_result,
+            }
+        )
+        if len(results) != len(pkgs):
+            raise InternalError(
+                None, f"expected {len(pkgs)} batch results, got {len(results)}"
+            )
+        if updates and self._eclass_caching:
+            self.preload_eclasses(eclass_cache, limited_to=updates, async_req=True)
+        return results
+
     # this basically handles all hijacks from the daemon, whether
     # confcache or portageq.
     def generic_handler(self, additional_commands=None):
@@ -4,10 +4,13 @@ Ebuild repository, specific to gentoo ebuild trees.
 
 __all__ = ("UnconfiguredTree", "ConfiguredTree", "ProvidesRepo", "tree")
 
+import json
 import locale
 import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial, wraps
-from itertools import chain, filterfalse
+from itertools import chain, filterfalse, groupby
+from operator import itemgetter
 from random import shuffle
 from sys import intern
 from weakref import WeakValueDictionary
@@ -24,6 +27,8 @@ from snakeoil.sequences import iflatten_instance, stable_unique
 from snakeoil.strings import pluralism
 
 from .. import fetch
+from .. import operations as operations_mod
+from ..cache import errors as cache_errors
 from ..config.hint import ConfigHint, configurable
 from ..log import logger
 from ..operations import OperationError
@@ -32,11 +37,14 @@ from ..package import errors as pkg_errors
 from ..repository import configured, errors, prototype, util
 from ..repository.virtual import RestrictionRepo
 from ..restrictions import packages
+from ..util import chksum_memo, layout_index, multihash
 from ..util import packages as pkgutils
 from . import cpv, digest, ebd, ebuild_src
 from . import eclass_cache as eclass_cache_mod
 from . import errors as ebuild_errors
+from . import metadata_index as metadata_index_mod
 from . import processor, repo_objs, restricts
+from . import tree_state as tree_state_mod
 from .atom import atom
 from .eapi import get_eapi
 
@@ -141,13 +149,15 @@ class repo_operations(_repo_ops.operations):
 
                 raise
 
-            # calculate checksums for fetched distfiles
+            # calculate checksums for fetched distfiles, hashing files in parallel
             try:
-                for fetchable in fetchables.values():
-                    chksums = chksum.get_chksums(
-                        pjoin(distdir, fetchable.filename), *write_chksums
-                    )
-                    fetchable.chksums = dict(zip(write_chksums, chksums))
+                paths = [pjoin(distdir, x) for x in fetchables]
+                for fetchable, (path, chksums) in zip(
+                    fetchables.values(), multihash.hash_files(paths, write_chksums)
+                ):
+                    if isinstance(chksums, EnvironmentError):
+                        raise chksums
+                    fetchable.chksums = chksums
             except chksum.MissingChksumHandler as exc:
                 observer.error(f"failed generating chksum: {exc}")
                 ret.add(key)
@@ -178,6 +188,177 @@ class repo_operations(_repo_ops.operations):
 
         return ret
 
+    def _get_regen_state(self):
+        state = {}
+        for tree in self.repo.trees:
+            if (tree_state := tree_state_mod.tree_state(tree.location)) is None:
+                return None
+            state[tree.location] = tree_state
+        return json.dumps(state, sort_keys=True)
+
+    def _update_metadata_index(self, targets):
+        index = self.repo.metadata_index
+        if targets is None:
+            index.update()
+            return
+        pkgs, removed = targets
+        cps = {(pkg.category, pkg.package) for pkg in pkgs}
+        for cpvstr in removed:
+            try:
+                pkg = cpv.VersionedCPV(cpvstr)
+            except ebuild_errors.InvalidCPV:
+                continue
+            cps.add((pkg.category, pkg.package))
+        index.update_packages(cps)
+
+    def _get_regen_targets(self, state, since=None):
+        caches = [x for x in self._get_caches() if not x.readonly]
+        if not caches:
+            return None
+        current = json.loads(state)
+        recorded = {x.get_regen_state() for x in caches}
+        base = {}
+        if len(recorded) == 1 and (recorded := recorded.pop()) is not None:
+            try:
+                base = json.loads(recorded)
+            except ValueError:
+                pass
+            if not isinstance(base, dict) or base.keys() != current.keys():
+                # cache was generated for different trees
+                base = {}
+        if since is not None:
+            base[self.repo.location] = {"head": since, "dirty": []}
+        elif not base:
+            return None
+
+        try:
+            changes = tree_state_mod.collect_changes(self.repo, base, current)
+        except (KeyError, TypeError):
+            # malformed recorded state
+            return None
+        if changes is None:
+            return None
+
+        cpvs = {
+            f"{cat}/{pkg}-{ver}": (cat, pkg, ver) for cat, pkg, ver in changes.ebuilds
+        }
+        if changes.eclasses:
+            # pull eclass consumers from the existing cache entries
+            cache = caches[0]
+            for category in self.repo.categories:
+                for cpvstr, entry in cache.iter_category(category):
+                    eclasses = (x[0] for x in entry.get("_eclasses_", ()))
+                    if not changes.eclasses.isdisjoint(eclasses):
+                        cpvs.setdefault(cpvstr, None)
+
+        pkgs = []
+        removed = []
+        for cpvstr, key in sorted(cpvs.items()):
+            try:
+                if key is None:
+                    pkg = cpv.VersionedCPV(cpvstr)
+                    key = (pkg.category, pkg.package, pkg.fullver)
+                pkgs.append(self.repo[key])
+            except (KeyError, pkg_errors.PackageError):
+                removed.append(cpvstr)
+        return pkgs, removed
+
+    def _verify_cache_category(self, cache, category):
+        """Classify the cache entries for a category.
+
+        :return: tuple of entry count, stale, orphaned, and corrupted cpv lists
+        """
+        repo = self.repo
+        ebuilds = {}
+        for package in repo._get_packages(category) or ():
+            try:
+                versions = repo._get_versions((category, package))
+            except KeyError:
+                continue
+            for ver in versions:
+                ebuilds[f"{category}/{package}-{ver}"] = pjoin(
+                    repo.base, category, package, f"{package}-{ver}{repo.extension}"
+                )
+
+        stale, orphaned, corrupted = [], [], []
+        cpvs = sorted(cache.category_keys(category))
+        for cpvstr in cpvs:
+            if (path := ebuilds.get(cpvstr)) is None:
+                orphaned.append(cpvstr)
+                continue
+            try:
+                entry = cache[cpvstr]
+            except KeyError:
+                # removed during the scan
+                continue
+            except cache_errors.CacheCorruption:
+                corrupted.append(cpvstr)
+                continue
+            ebuild_hash, _st = repo.package_class._get_path_hash(path)
+            if not cache.validate_entry(entry, ebuild_hash, repo.eclass_cache):
+                stale.append(cpvstr)
+        return len(cpvs), stale, orphaned, corrupted
+
+    @operations_mod.is_standalone
+    def _cmd_api_verify_cache(self, observer=None, prune=False, threads=1):
+        """Verify cache entries against their ebuilds and eclasses.
+
+        Entries are classified as stale if they don't match the current ebuild
+        or eclass checksums, orphaned if their ebuild doesn't exist, or
+        corrupted if they can't be parsed.
+
+        :param prune: remove stale, orphaned, and corrupted entries
+        :param threads: number of categories scanned in parallel
+        :return: list of summary mappings, one per cache
+        """
+        observer = self._get_observer(observer)
+        caches = self._get_caches()
+        if prune and (readonly := [x for x in caches if x.readonly]):
+            locations = ", ".join(getattr(x, "location", repr(x)) for x in readonly)
+            raise OperationError(f"unable to prune readonly cache: {locations}")
+
+        # load eclass checksums before spinning up workers
+        self.repo.eclass_cache.eclasses
+
+        summaries = []
+        for cache in caches:
+            categories = sorted(cache.categories() | frozenset(self.repo.categories))
+            summary = {
+                "repo": self.repo.repo_id,
+                "cache": getattr(cache, "location", None),
+                "entries": 0,
+                "valid": 0,
+                "stale": [],
+                "orphaned": [],
+                "corrupted": [],
+                "pruned": 0,
+            }
+            with ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+                results = executor.map(
+                    partial(self._verify_cache_category, cache), categories
+                )
+                for entries, stale, orphaned, corrupted in results:
+                    summary["entries"] += entries
+                    summary["stale"].extend(stale)
+                    summary["orphaned"].extend(orphaned)
+                    summary["corrupted"].extend(corrupted)
+
+            bad = summary["stale"] + summary["orphaned"] + summary["corrupted"]
+            summary["valid"] = summary["entries"] - len(bad)
+            for key in ("stale", "orphaned", "corrupted"):
+                for cpvstr in summary[key]:
+                    observer.warn(f"{key} cache entry: {cpvstr}")
+            if prune:
+                for cpvstr in bad:
+                    try:
+                        del cache[cpvstr]
+                    except KeyError:
+                        continue
+                    summary["pruned"] += 1
+                cache.commit(force=True)
+            summaries.append(summary)
+        return summaries
+
 
 def _sort_eclasses(config, repo_config):
     repo_path = repo_config.location
@@ -275,6 +456,33 @@ class ProvidesRepo(util.SimpleTree):
         return False
 
 
+class _IndexedPkgFilter:
+    """Package filter skipping versions ruled out by a repo's metadata index."""
+
+    __slots__ = ("cpvs", "pkg_filter")
+
+    def __init__(self, cpvs, pkg_filter):
+        self.cpvs = cpvs
+        self.pkg_filter = pkg_filter
+
+    def _filter(self, pkgs):
+        cpvs = self.cpvs
+        pkgs = iter(pkgs)
+        while True:
+            try:
+                pkg = next(pkgs)
+            except pkg_errors.PackageError:
+                # ignore pkgs with invalid CPVs
+                continue
+            except StopIteration:
+                return
+            if cpvs.contains(pkg.category, pkg.package, pkg.fullver):
+                yield pkg
+
+    def __call__(self, pkgs):
+        return self.pkg_filter(self._filter(pkgs))
+
+
 class UnconfiguredTree(prototype.tree):
     """Raw implementation supporting standard ebuild tree.
 
@@ -393,6 +601,23 @@ class UnconfiguredTree(prototype.tree):
     def configure(self, *args):
         return ConfiguredTree(self, *args)
 
+    @klass.jit_attr
+    def ebuild_chksums(self):
+        """Persistent memo of ebuild checksums used for cache validation."""
+        return chksum_memo.get_memo(
+            "ebuild-chksums", self.repo_id, self.location, secure=True
+        )
+
+    @klass.jit_attr
+    def layout_index(self):
+        """Persistent index of category, package, and version directory listings."""
+        return layout_index.get_index(self.repo_id, self.location)
+
+    @klass.jit_attr
+    def metadata_index(self):
+        """Persistent inverted index of package metadata used to prefilter queries."""
+        return metadata_index_mod.MetadataIndex(self)
+
     @klass.jit_attr
     def known_arches(self):
         """Return all known arches for a repo (including masters)."""
@@ -502,17 +727,17 @@ class UnconfiguredTree(prototype.tree):
             # nonexistent USE_EXPAND group
             return lambda k: k
 
+    def _list_category_dirs(self, path):
+        return filterfalse(
+            self.false_categories.__contains__,
+            (x for x in listdir_dirs(path) if not x.startswith(".")),
+        )
+
     @klass.jit_attr
     def category_dirs(self):
         try:
             return frozenset(
-                map(
-                    intern,
-                    filterfalse(
-                        self.false_categories.__contains__,
-                        (x for x in listdir_dirs(self.base) if not x.startswith(".")),
-                    ),
-                )
+                map(intern, self.layout_index.listdir("", self._list_category_dirs))
             )
         except EnvironmentError as e:
             logger.error(f"failed listing categories: {e}")
@@ -532,9 +757,8 @@ class UnconfiguredTree(prototype.tree):
         return self.category_dirs
 
     def _get_packages(self, category):
-        cpath = pjoin(self.base, category.lstrip(os.path.sep))
         try:
-            return tuple(listdir_dirs(cpath))
+            return self.layout_index.listdir(category.lstrip(os.path.sep), listdir_dirs)
         except FileNotFoundError:
             if category in self.categories:
                 # ignore it, since it's PMS mandated that it be allowed.
@@ -550,17 +774,20 @@ class UnconfiguredTree(prototype.tree):
 
         Ebuilds with mismatched or invalid package names are ignored.
         """
-        cppath = pjoin(self.base, catpkg[0], catpkg[1])
         pkg = f"{catpkg[-1]}-"
         lp = len(pkg)
         extension = self.extension
         ext_len = -len(extension)
-        try:
-            return tuple(
+
+        def _list_versions(path):
+            return (
                 x[lp:ext_len]
-                for x in listdir_files(cppath)
+                for x in listdir_files(path)
                 if x[ext_len:] == extension and x[:lp] == pkg
             )
+
+        try:
+            return self.layout_index.listdir(f"{catpkg[0]}/{catpkg[1]}", _list_versions)
         except EnvironmentError as e:
             raise KeyError(
                 "failed fetching versions for package %s: %s"
@@ -607,11 +834,66 @@ class UnconfiguredTree(prototype.tree):
                     continue
                 yield pkg
 
-    def itermatch(self, *args, **kwargs):
+    def _internal_gen_candidates(
+        self, candidates, sorter, raw_pkg_cls, pkg_filter, versioned
+    ):
+        if not versioned or raw_pkg_cls is not self.package_class or not self.cache:
+            yield from super()._internal_gen_candidates(
+                candidates, sorter, raw_pkg_cls, pkg_filter, versioned
+            )
+            return
+
+        indexed = pkg_filter.cpvs if isinstance(pkg_filter, _IndexedPkgFilter) else None
+
+        # batch cache reads for all matching packages per category
+        for category, cps in groupby(sorter(candidates), itemgetter(0)):
+            cps = [(cp, self.versions.get(cp, ())) for cp in cps]
+            if indexed is not None:
+                cps = [
+                    (cp, [v for v in versions if indexed.contains(*cp, v)])
+                    for cp, versions in cps
+                ]
+            self.package_class.prefetch_metadata(
+                f"{category}/{package}-{ver}"
+                for (_, package), versions in cps
+                for ver in versions
+            )
+            for (_, package), versions in cps:
+                pkgs = (raw_pkg_cls(category, package, ver) for ver in versions)
+                yield from sorter(pkg_filter(pkgs))
+
+    def itermatch(self, restrict, **kwargs):
+        """Generator that yields packages match a restriction.
+
+        Along with the keywords supported by
+        :obj:`pkgcore.repository.prototype.tree.itermatch`:
+
+        :keyword error_callback: callable passed metadata exceptions for
+            packages skipped due to bad metadata
+        :keyword metadata_index: if True, packages that the repo's
+            :obj:`metadata_index` rules out are skipped before their metadata
+            is loaded, note that bad metadata isn't reported for skipped
+            packages
+        """
         raw = "raw_pkg_cls" in kwargs or not kwargs.get("versioned", True)
         error_callback = kwargs.pop("error_callback", None)
-        kwargs.setdefault("pkg_filter", partial(self._pkg_filter, raw, error_callback))
-        return super().itermatch(*args, **kwargs)
+        use_index = kwargs.pop("metadata_index", False)
+        pkg_filter = kwargs.setdefault(
+            "pkg_filter", partial(self._pkg_filter, raw, error_callback)
+        )
+        if use_index and not raw and pkg_filter is not None:
+            cpvs = self.metadata_index.candidates(restrict)
+            if cpvs is not None:
+                kwargs["pkg_filter"] = _IndexedPkgFilter(cpvs, pkg_filter)
+                return self._flush_metadata_index(super().itermatch(restrict, **kwargs))
+        return super().itermatch(restrict, **kwargs)
+
+    def _flush_metadata_index(self, pkgs):
+        """Write out metadata index entries updated while matching packages."""
+        try:
+            yield from pkgs
+        finally:
+            self.metadata_index.flush()
 
     def _get_ebuild_path(self, pkg):
         return pjoin(
@@ -704,6 +986,7 @@ class UnconfiguredTree(prototype.tree):
             self,
             force=bool(kwds.get("force", False)),
             eclass_caching=bool(kwds.get("eclass_caching", True)),
+            profile=kwds.get("profile"),
         )
 
     def __getstate__(self):
@@ -792,28 +1075,60 @@ def tree(
 
 
 class _RegenOpHelper:
-    def __init__(self, repo, force=False, eclass_caching=True):
+    def __init__(self, repo, force=False, eclass_caching=True, profile=None):
         self.force = force
+        self.profile = profile
         self.eclass_caching = eclass_caching
+        self.eclass_preload_hits = 0
+        self.eclass_preload_misses = 0
         self.ebp = self.request_ebp()
 
     def request_ebp(self):
         ebp = processor.request_ebuild_processor()
         if self.eclass_caching:
             ebp.allow_eclass_caching()
+        if self.profile is not None:
+            ebp.metadata_profiler = self.profile.add
         return ebp
 
     def __call__(self, pkg):
+        ebp = self.ebp
+        hits, misses = ebp.eclass_preload_hits, ebp.eclass_preload_misses
         try:
-            return pkg._fetch_metadata(ebp=self.ebp, force_regen=self.force)
+            return pkg._fetch_metadata(ebp=ebp, force_regen=self.force)
         except pkg_errors.MetadataException as e:
             # ebuild processor is dead, so force a replacement request
             self.ebp = self.request_ebp()
             raise
+        finally:
+            self.eclass_preload_hits += ebp.eclass_preload_hits - hits
+            self.eclass_preload_misses += ebp.eclass_preload_misses - misses
+
+    def regen_batch(self, pkgs):
+        """Regenerate metadata for multiple packages using a single processor request.
+
+        :return: list of (pkg, exception) tuples for packages that failed
+        """
+        ebp = self.ebp
+        hits, misses = ebp.eclass_preload_hits, ebp.eclass_preload_misses
+        try:
+            factory = pkgs[0]._parent
+            results = factory._get_metadata_batch(pkgs, ebp=ebp, force_regen=self.force)
+        except Exception:
+            # processor state is unknown, so force a replacement request
+            processor.drop_ebuild_processor(ebp)
+            ebp.shutdown_processor(force=True)
+            self.ebp = self.request_ebp()
+            raise
+        finally:
+            self.eclass_preload_hits += ebp.eclass_preload_hits - hits
+            self.eclass_preload_misses += ebp.eclass_preload_misses - misses
+        return [(pkg, x) for pkg, x in results if isinstance(x, Exception)]
 
     def __del__(self):
         if self.eclass_caching:
             self.ebp.disable_eclass_caching()
+        self.ebp.metadata_profiler = None
         processor.release_ebuild_processor(self.ebp)
 
 
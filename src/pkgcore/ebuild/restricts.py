@@ -16,6 +16,8 @@ __all__ = (
     "VersionMatch",
 )
 
+from operator import eq, ge, gt, le, lt
+
 from snakeoil.klass import generic_equality
 
 from ..restrictions import packages, restriction, values
@@ -50,6 +52,14 @@ class _VersionMatch(restriction.base, metaclass=generic_equality):
 
     _convert_str2op = {v: k for k, v in _convert_op2str.items()}
 
+    _convert_op2operator = {
+        (-1,): lt,
+        (-1, 0): le,
+        (0,): eq,
+        (0, 1): ge,
+        (1,): gt,
+    }
+
     def __init__(self, operator, ver, rev=None, negate=False, **kwd):
         """
         :param operator: version comparison to do,
@@ -93,6 +103,31 @@ class _VersionMatch(restriction.base, metaclass=generic_equality):
 
         return (cpv.ver_cmp(pkg.version, r2, self.ver, r1) in self.vals) != self.negate
 
+    def _compile(self):
+        if self.ver is None:
+            return super()._compile()
+        # compare against the pre-parsed version key of the restriction
+        # instead of reparsing both versions for every package
+        compare = self._convert_op2operator[self.vals]
+        negate, fallback = self.negate, self.match
+        target = cpv.ver_key(self.ver, self.rev)
+        droprev = self.droprev
+        if droprev:
+            target = target[0]
+
+        def match(pkg):
+            try:
+                key = pkg.version_key
+            except AttributeError:
+                return fallback(pkg)
+            if key is None:
+                return False
+            if droprev:
+                key = key[0]
+            return compare(key, target) != negate
+
+        return 3, match
+
     def __str__(self):
         s = self._convert_op2str[self.vals]
 
@@ -154,6 +189,9 @@ class VersionMatch(packages.PackageRestriction):
     def match(self, pkg, *args, **kwds):
         return self.restriction.match(pkg)
 
+    def _compile(self):
+        return restriction.compile_node(self.restriction)
+
 
 class SlotDep(packages.PackageRestriction):
     __slots__ = ()
@@ -0,0 +1,144 @@
+"""
+git based tree state tracking used for incremental metadata regeneration
+"""
+
+__all__ = (
+    "git_head",
+    "git_changes",
+    "tree_state",
+    "RegenChanges",
+    "collect_changes",
+)
+
+import os
+import subprocess
+
+from ..log import logger
+
+
+def _git(path, *args):
+    """Run a git command inside a repo returning its output or None on failure."""
+    try:
+        p = subprocess.run(
+            ["git", "-C", path, *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf8",
+        )
+    except (FileNotFoundError, UnicodeDecodeError) as e:
+        logger.debug("failed running git in %r: %s", path, e)
+        return None
+    if p.returncode != 0:
+        logger.debug("git %s failed in %r: %s", " ".join(args), path, p.stderr)
+        return None
+    return p.stdout
+
+
+def git_head(path):
+    """Return the commit a git repo's worktree is based on, or None if unknown."""
+    if not os.path.exists(os.path.join(path, ".git")):
+        return None
+    if (out := _git(path, "rev-parse", "--verify", "HEAD")) is None:
+        return None
+    return out.strip() or None
+
+
+def git_changes(path, since, until=None):
+    """Return the paths changed in a git repo since a given commit.
+
+    :param path: repo location
+    :param since: commit to diff against
+    :param until: commit to diff to, if None the worktree is used and
+        untracked files are included as well
+    :return: set of paths relative to the repo root or None on failure
+    """
+    args = ["diff", "--name-only", "--no-renames", "-z", since]
+    if until is not None:
+        args.append(until)
+    if (out := _git(path, *args, "--", ".")) is None:
+        return None
+    if until is None:
+        untracked = _git(path, "ls-files", "-z", "--others", "--exclude-standard")
+        if untracked is None:
+            return None
+        out += untracked
+    return {x for x in out.split("\0") if x}
+
+
+def tree_state(path):
+    """Return the state of a git repo's worktree.
+
+    :return: dict containing the current commit and the sorted list of
+        uncommitted changes, or None if the state can't be determined
+    """
+    if (head := git_head(path)) is None:
+        return None
+    if (dirty := git_changes(path, head)) is None:
+        return None
+    return {"head": head, "dirty": sorted(dirty)}
+
+
+class RegenChanges:
+    """Changes relevant for metadata regeneration between two tree states.
+
+    :ivar ebuilds: set of (category, package, version) tuples for
+        added, modified, or removed ebuilds
+    :ivar eclasses: set of added, modified, or removed eclass names
+    """
+
+    def __init__(self):
+        self.ebuilds = set()
+        self.eclasses = set()
+
+    def add_path(self, path, ebuilds=True):
+        """Classify a changed path.
+
+        :return: False if the change requires a full tree walk, True otherwise
+        """
+        chunks = path.split("/")
+        if len(chunks) == 2 and chunks[0] == "eclass":
+            if chunks[1].endswith(".eclass"):
+                self.eclasses.add(chunks[1][: -len(".eclass")])
+        elif chunks[0] == "metadata" and chunks[-1] == "layout.conf":
+            # masters or other repo settings affecting metadata changed
+            return False
+        elif ebuilds and len(chunks) == 3 and chunks[2].endswith(".ebuild"):
+            category, package, filename = chunks
+            if filename.startswith(package + "-"):
+                version = filename[len(package) + 1 : -len(".ebuild")]
+                self.ebuilds.add((category, package, version))
+        return True
+
+
+def collect_changes(repo, base_state, current_state):
+    """Determine the changes relevant for metadata regen across a repo's trees.
+
+    Eclass changes are tracked for the repo and all its masters while ebuild
+    changes are only tracked for the repo itself.
+
+    :param repo: :obj:`pkgcore.ebuild.repository.UnconfiguredTree` instance
+    :param base_state: mapping of tree locations to the :obj:`tree_state`
+        results the cache was generated from; trees missing from the mapping
+        are assumed unchanged
+    :param current_state: mapping of tree locations to their current
+        :obj:`tree_state` results
+    :return: :obj:`RegenChanges` instance or None if a full walk is required
+    """
+    changes = RegenChanges()
+    for tree in repo.trees:
+        location = tree.location
+        if (current := current_state.get(location)) is None:
+            return None
+        if (base := base_state.get(location)) is None:
+            continue
+        # files dirty during either run may differ from their committed state
+        paths = set(base["dirty"]).union(current["dirty"])
+        if base["head"] != current["head"]:
+            committed = git_changes(location, base["head"], current["head"])
+            if committed is None:
+                return None
+            paths.update(committed)
+        for path in paths:
+            if not changes.add_path(path, ebuilds=(tree is repo)):
+                return None
+    return changes
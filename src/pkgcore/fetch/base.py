@@ -2,16 +2,41 @@
 prototype fetcher class, all fetchers should derive from this
 """
 
-__all__ = ("fetcher",)
+__all__ = ("fetcher", "distfile_stamps")
 
 import os
 
-from snakeoil.chksum import MissingChksumHandler, get_chksums, get_handlers
+from snakeoil.chksum import MissingChksumHandler, get_handlers
 
+from .. import const
+from ..util import chksum_memo, multihash
 from . import errors
 
 
+def distfile_stamps(distdir):
+    """Return the shared database of verified chksums for a distdir.
+
+    Entries are keyed on each file's inode, size, and mtime so files are only
+    rehashed when they change. Since recorded chksums are trusted in place of
+    verifying files, the database is stored in the system cache directory and
+    ignored unless it's owned by the current user and not writable by others.
+    """
+    distdir = os.path.abspath(distdir)
+    return chksum_memo.get_memo(
+        "distfile-stamps",
+        distdir,
+        distdir,
+        cache_dir=const.SYSTEM_CACHE_PATH,
+        secure=True,
+    )
+
+
 class fetcher:
+    # verified chksum database used to skip rehashing unchanged files
+    stamps = None
+    # ignore recorded chksums, always hashing files during verification
+    force_verify = False
+
     def _verify(self, file_location, target, all_chksums=True, handlers=None):
         """Internal function for derivatives.
 
@@ -71,13 +96,25 @@ class fetcher:
                     raise errors.ChksumFailure(
                         file_location, chksum=x, expected=target.chksums[x], value=val
                     )
-        else:
-            desired_vals = [target.chksums[x] for x in chfs]
-            calced = get_chksums(file_location, *chfs)
-            for desired, got, chf in zip(desired_vals, calced, chfs):
-                if desired != got:
+        elif chfs:
+            # stat before hashing so modifications during hashing invalidate it
+            st = os.stat(file_location)
+            chksums = {}
+            if self.stamps is not None and not self.force_verify:
+                chksums = self.stamps.get(file_location, st)
+            if needed := [x for x in chfs if x not in chksums]:
+                # calculate all chksums in a single read of the file
+                computed = multihash.hash_file(file_location, needed)
+                if self.stamps is not None:
+                    self.stamps.update(file_location, st, computed)
+                chksums.update(computed)
+            for chf in chfs:
+                if target.chksums[chf] != (got := chksums[chf]):
                     raise errors.ChksumFailure(
-                        file_location, chksum=chf, expected=desired, value=got
+                        file_location,
+                        chksum=chf,
+                        expected=target.chksums[chf],
+                        value=got,
                     )
 
     def __call__(self, fetchable):
@@ -8,6 +8,7 @@ __all__ = (
 )
 
 import os
+from contextlib import nullcontext
 
 from snakeoil.osutils import pjoin
 from snakeoil.process.spawn import is_userpriv_capable, spawn_bash
@@ -44,6 +45,9 @@ class fetcher(base.fetcher):
         userpriv: bool = True,
         attempts: int = 10,
         readonly: bool = False,
+        limiter=None,
+        stamps=None,
+        force_verify: bool = False,
         **extra_env: str,
     ):
         """
@@ -57,6 +61,14 @@ class fetcher(base.fetcher):
         :param userpriv: depriv for fetching?
         :param attempts: max number of attempts before failing the fetch
         :param readonly: controls whether fetching is allowed
+        :param limiter: if not None, callable passed a URI returning a context
+            manager held while fetching from it, e.g. a
+            :obj:`pkgcore.fetch.pipeline.HostLimiter` instance
+        :param stamps: if not None, :obj:`pkgcore.util.chksum_memo.ChksumMemo`
+            instance recording verified chksums, see
+            :obj:`pkgcore.fetch.base.distfile_stamps`
+        :param force_verify: if True, ignore recorded chksums and always
+            hash files during verification
         """
         super().__init__()
         self.distdir = distdir
@@ -94,6 +106,9 @@ class fetcher(base.fetcher):
         self.attempts = attempts
         self.userpriv = userpriv
         self.readonly = readonly
+        self.limiter = limiter
+        self.stamps = stamps
+        self.force_verify = force_verify
         self.extra_env = extra_env
 
     def fetch(self, target: fetchable):
@@ -135,13 +150,15 @@ class fetcher(base.fetcher):
             # the loop handles this. In other words, don't trust the external
             # fetcher's exit code, trust our chksums instead.
             try:
-                spawn_bash(
-                    command % {"URI": next(uris), "FILE": target.filename}, **spawn_opts
-                )
+                uri = next(uris)
             except StopIteration:
                 raise errors.FetchFailed(
                     target.filename, "ran out of urls to fetch from"
                 )
+            with nullcontext() if self.limiter is None else self.limiter(uri):
+                spawn_bash(
+                    command % {"URI": uri, "FILE": target.filename}, **spawn_opts
+                )
         else:
             raise last_exc
 
@@ -0,0 +1,362 @@
+"""
+fetcher class that pulls files over HTTP(S) directly
+
+Connections are pooled per host, partially downloaded files are resumed via
+range requests, and all checksums are calculated while the file is being
+written avoiding rereading it for verification.
+"""
+
+__all__ = ("fetcher",)
+
+import http.client
+import os
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from urllib.parse import urljoin, urlsplit
+
+from snakeoil.chksum import MissingChksumHandler
+from snakeoil.osutils import pjoin
+from snakeoil.process.spawn import is_userpriv_capable
+
+from ..config.hint import ConfigHint
+from ..log import logger
+from ..os_data import portage_gid, portage_uid
+from ..util import multihash
+from . import base, errors, fetchable
+
+
+class _TransferError(errors.FetchFailed):
+    """Transfer failure, ``progress`` signals if any data was received."""
+
+    def __init__(self, filename, message, progress=False):
+        super().__init__(filename, message, resumable=True)
+        self.progress = progress
+
+
+class fetcher(base.fetcher):
+    pkgcore_config_type = ConfigHint(
+        types={
+            "userpriv": "bool",
+            "required_chksums": "list",
+            "distdir": "str",
+            "attempts": "int",
+            "timeout": "int",
+        },
+        allow_unknowns=True,
+    )
+
+    blocksize = 1 << 20
+    max_redirects = 5
+    user_agent = "pkgcore"
+
+    def __init__(
+        self,
+        distdir: str,
+        required_chksums=None,
+        userpriv: bool = True,
+        attempts: int = 10,
+        timeout: int = 60,
+        readonly: bool = False,
+        limiter=None,
+        stamps=None,
+        force_verify: bool = False,
+        http_proxy: str = "",
+        https_proxy: str = "",
+        progress=None,
+        **kwargs,
+    ):
+        """
+        :param distdir: directory to download files to
+        :param required_chksums: if None, all chksums must be verified,
+            else only chksums listed
+        :type required_chksums: None or sequence
+        :param userpriv: if True and running as root, downloaded files are
+            owned by :obj:`pkgcore.os_data.portage_uid` and
+            :obj:`pkgcore.os_data.portage_gid` matching files fetched by the
+            userpriv :obj:`pkgcore.fetch.custom.fetcher`
+        :param attempts: max number of attempts before failing the fetch
+        :param timeout: socket timeout in seconds
+        :param readonly: controls whether fetching is allowed
+        :param limiter: if not None, callable passed a URI returning a context
+            manager held while fetching from it, e.g. a
+            :obj:`pkgcore.fetch.pipeline.HostLimiter` instance
+        :param stamps: if not None, :obj:`pkgcore.util.chksum_memo.ChksumMemo`
+            instance recording verified chksums, see
+            :obj:`pkgcore.fetch.base.distfile_stamps`
+        :param force_verify: if True, ignore recorded chksums and always
+            hash files during verification
+        :param http_proxy: proxy URI used for http URIs
+        :param https_proxy: proxy URI used for https URIs
+        :param progress: if not None, callable passed the filename, number of
+            bytes received, and expected size (None if unknown) as data is
+            downloaded, e.g. :obj:`pkgcore.fetch.pipeline.FetchPipeline.progress`
+        """
+        super().__init__()
+        self.distdir = distdir
+        if required_chksums is not None:
+            required_chksums = [x.lower() for x in required_chksums]
+        else:
+            required_chksums = []
+        if len(required_chksums) == 1 and required_chksums[0] == "all":
+            self.required_chksums = None
+        else:
+            self.required_chksums = required_chksums
+        self.userpriv = userpriv
+        self.attempts = attempts
+        self.timeout = timeout
+        self.readonly = readonly
+        self.limiter = limiter
+        self.stamps = stamps
+        self.force_verify = force_verify
+        self.proxies = {"http": http_proxy, "https": https_proxy}
+        self.progress = progress
+        # idle connections mapped by (scheme, host)
+        self._pool = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        """Create a connection to a host, routing it through a proxy if set."""
+        if scheme == "https":
+            kls = http.client.HTTPSConnection
+        else:
+            kls = http.client.HTTPConnection
+        if proxy := self.proxies.get(scheme):
+            proxy = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            conn = kls(proxy.hostname, proxy.port, timeout=self.timeout)
+            if scheme == "https":
+                conn.set_tunnel(netloc)
+            return conn
+        return kls(netloc, timeout=self.timeout)
+
+    def _release(self, key, conn, response):
+        """Return a connection to the pool if it can be reused."""
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._pool[key].append(conn)
+
+    def _send(self, key, target, headers):
+        """Send a request using a pooled connection if available.
+
+        :return: tuple of the connection and response
+        """
+        with self._lock:
+            conn = self._pool[key].pop() if self._pool[key] else None
+        if conn is not None:
+            try:
+                conn.request("GET", target, headers=headers)
+                return conn, conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                # stale pooled connection, retry with a new one
+                conn.close()
+        conn = self._connect(*key)
+        try:
+            conn.request("GET", target, headers=headers)
+            return conn, conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise _TransferError(key[1], f"request failed: {e}")
+
+    def _request(self, uri, offset=0):
+        """Send a GET request, following redirects.
+
+        :return: tuple of the pool key, connection, and response
+        """
+        headers = {"User-Agent": self.user_agent, "Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        for _redirect in range(self.max_redirects + 1):
+            parts = urlsplit(uri)
+            if parts.scheme not in ("http", "https"):
+                raise errors.FetchFailed(uri, "unsupported URI scheme")
+            key = (parts.scheme, parts.netloc)
+            if parts.scheme == "http" and self.proxies["http"]:
+                # plain http proxies require absolute URIs
+                target = uri
+            else:
+                target = parts.path or "/"
+                if parts.query:
+                    target += f"?{parts.query}"
+            conn, response = self._send(key, target, headers)
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.getheader("Location")
+                response.read()
+                self._release(key, conn, response)
+                if not location:
+                    raise errors.FetchFailed(uri, "redirect lacks a location")
+                uri = urljoin(uri, location)
+                continue
+            return key, conn, response
+        raise errors.FetchFailed(uri, "too many redirects")
+
+    @staticmethod
+    def _range_start(response):
+        """Return the first byte of a partial response, None if unknown."""
+        # expected format: "bytes START-END/TOTAL"
+        unit, _, byte_range = (response.getheader("Content-Range") or "").partition(" ")
+        if unit.strip().lower() != "bytes":
+            return None
+        try:
+            return int(byte_range.split("-", 1)[0])
+        except ValueError:
+            return None
+
+    def _open(self, path, offset):
+        """Open a file for writing downloaded data, creating it if needed."""
+        flags = os.O_RDWR | os.O_CREAT | (0 if offset else os.O_TRUNC)
+        try:
+            # writable by the portage group like files fetched via FETCHCOMMAND
+            fd = os.open(path, flags, 0o664)
+        except OSError as e:
+            raise errors.UnmodifiableFile(path, e) from e
+        try:
+            if self.userpriv and is_userpriv_capable():
+                os.fchown(fd, portage_uid, portage_gid)
+                os.fchmod(fd, 0o664)
+        except OSError as e:
+            os.close(fd)
+            raise errors.UnmodifiableFile(path, e) from e
+        return os.fdopen(fd, "r+b")
+
+    def _hashers(self, target):
+        """Return chksum updaters for all chksums of a target."""
+        try:
+            return multihash.new_hashers(target.chksums)
+        except MissingChksumHandler as e:
+            raise errors.MissingChksumHandler(f"missing required checksum handler: {e}")
+
+    def _download(self, uri, path, target, offset):
+        """Download a file, resuming from the given offset if possible.
+
+        :return: mapping of chksum types to the values calculated for the file
+        """
+        hashers = self._hashers(target)
+        key, conn, response = self._request(uri, offset)
+        if (response.status == 416 and offset) or (
+            response.status == 206 and self._range_start(response) != offset
+        ):
+            # requested range unsatisfiable, the file is likely complete, or
+            # the server returned a different range, restart from scratch
+            response.read()
+            self._release(key, conn, response)
+            offset = 0
+            key, conn, response = self._request(uri)
+        if response.status == 200:
+            offset = 0
+        elif response.status != 206 or not offset:
+            response.read()
+            self._release(key, conn, response)
+            raise errors.FetchFailed(uri, f"HTTP error {response.status}")
+
+        total = target.chksums.get("size")
+        if total is None and response.length is not None:
+            total = offset + response.length
+        progress = False
+        try:
+            f = self._open(path, offset)
+        except errors.UnmodifiableFile:
+            conn.close()
+            raise
+        try:
+            with f:
+                # feed the previously downloaded data to the hashers
+                while f.tell() < offset:
+                    if not (chunk := f.read(min(self.blocksize, offset - f.tell()))):
+                        break
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                f.truncate(offset)
+                f.seek(offset)
+                while chunk := response.read(self.blocksize):
+                    f.write(chunk)
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                    progress = True
+                    if self.progress is not None:
+                        self.progress(target.filename, f.tell(), total)
+                if response.length:
+                    raise http.client.IncompleteRead(b"", response.length)
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            if isinstance(e, OSError) and e.filename == path:
+                raise errors.UnmodifiableFile(path, e) from e
+            raise _TransferError(uri, f"transfer failed: {e}", progress=progress)
+        self._release(key, conn, response)
+        return {chf: int(hasher.hexdigest(), 16) for chf, hasher in hashers.items()}
+
+    def _check(self, path, target, chksums):
+        """Compare calculated chksums against the expected values."""
+        if (size := chksums.get("size")) is not None:
+            if size < target.chksums["size"]:
+                raise errors.FetchFailed(path, "file is too small", resumable=True)
+        elif not chksums and not os.stat(path).st_size:
+            raise errors.FetchFailed(path, "file is empty", resumable=False)
+        for chf, val in chksums.items():
+            if val != target.chksums[chf]:
+                raise errors.ChksumFailure(
+                    path, chksum=chf, expected=target.chksums[chf], value=val
+                )
+
+    def fetch(self, target: fetchable):
+        """Fetch a file.
+
+        :return: None if fetching failed,
+            else on disk location of the copied file
+        """
+        if not isinstance(target, fetchable):
+            raise TypeError(f"target must be fetchable instance/derivative: {target}")
+
+        path = pjoin(self.distdir, target.filename)
+        try:
+            self._verify(path, target)
+            return path
+        except errors.MissingDistfile as exc:
+            last_exc = exc
+        except errors.ChksumFailure:
+            raise
+        except errors.FetchFailed as exc:
+            last_exc = exc
+            if not exc.resumable:
+                try:
+                    os.unlink(path)
+                except OSError as e:
+                    raise errors.UnmodifiableFile(path, e) from e
+        if self.readonly:
+            raise last_exc
+
+        uris = iter(target.uri)
+        uri = None
+        for _attempt in range(self.attempts):
+            try:
+                offset = os.stat(path).st_size
+            except FileNotFoundError:
+                offset = 0
+            # retry interrupted transfers from the same URI
+            if not (isinstance(last_exc, _TransferError) and last_exc.progress):
+                try:
+                    uri = next(uris)
+                except StopIteration:
+                    raise errors.FetchFailed(
+                        target.filename, "ran out of urls to fetch from"
+                    )
+            try:
+                with nullcontext() if self.limiter is None else self.limiter(uri):
+                    chksums = self._download(uri, path, target, offset)
+                self._check(path, target, chksums)
+                if self.stamps is not None:
+                    self.stamps.update(path, os.stat(path), chksums)
+                return path
+            except errors.ChksumFailure:
+                raise
+            except errors.FetchFailed as exc:
+                logger.debug("failed fetching %s: %s", uri, exc)
+                last_exc = exc
+        raise last_exc
+
+    def get_path(self, fetchable):
+        path = pjoin(self.distdir, fetchable.filename)
+        if self._verify(path, fetchable) is None:
+            return path
+        return None
@@ -0,0 +1,163 @@
+"""
+background fetching of distfiles
+
+Fetchables are queued for a bounded pool of worker threads allowing distfiles
+to be downloaded while other work is being performed with consumers only
+blocking on the files they require.
+"""
+
+__all__ = ("HostLimiter", "FetchPipeline")
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from ..log import logger
+from ..operations import observer as observer_mod
+
+
+class HostLimiter:
+    """Limit the number of concurrent connections per host.
+
+    Calling an instance with a URI returns a context manager that blocks
+    while the maximum number of connections to the URI's host are active.
+    """
+
+    def __init__(self, max_connections=2):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._semaphores = defaultdict(
+            lambda: threading.BoundedSemaphore(self.max_connections)
+        )
+
+    def __call__(self, uri):
+        host = urlsplit(uri).netloc.rsplit("@", 1)[-1].lower()
+        with self._lock:
+            return self._semaphores[host]
+
+
+class FetchPipeline:
+    """Fetch files in the background using a pool of worker threads.
+
+    Files are fetched in submission order, with each file being fetched once
+    even if it's submitted multiple times.
+
+    Transfer progress is only reported for fetchers passed :obj:`progress`,
+    otherwise just the start and end of each fetch are reported.
+
+    :ivar jobs: maximum number of files to fetch concurrently
+    :ivar observer: observer progress for each file is reported to
+    :ivar interval: minimum number of seconds between progress reports for
+        a file
+    """
+
+    def __init__(self, jobs=4, observer=None, interval=5):
+        self.jobs = jobs
+        self.observer = observer if observer is not None else observer_mod.null_output()
+        self.interval = interval
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._done = 0
+        # last progress report time per file
+        self._reported = {}
+
+    def _report(self, func, msg, *args):
+        with self._lock:
+            func(msg, *args)
+
+    def progress(self, filename, received, total):
+        """Report the number of bytes received for a file being fetched.
+
+        Reports are throttled to one per :obj:`interval` seconds per file.
+
+        :param total: expected size of the file, None if unknown
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._reported.get(filename, now) < self.interval:
+                return
+            self._reported[filename] = now
+            if total:
+                self.observer.info(
+                    "fetching %s: %i/%i KiB (%i%%)",
+                    filename,
+                    received >> 10,
+                    total >> 10,
+                    min(100, received * 100 // total),
+                )
+            else:
+                self.observer.info("fetching %s: %i KiB", filename, received >> 10)
+
+    def _fetch(self, fetch, fetchable):
+        self._report(self.observer.info, "fetching %s", fetchable.filename)
+        with self._lock:
+            self._reported[fetchable.filename] = time.monotonic()
+        try:
+            result = fetch(fetchable)
+        except Exception as e:
+            logger.debug("failed fetching %s: %s", fetchable.filename, e)
+            result = False
+        with self._lock:
+            self._reported.pop(fetchable.filename, None)
+            self._done += 1
+            status = (self._done, len(self._futures))
+        if result is False:
+            self._report(
+                self.observer.error,
+                "failed fetching %s (%i/%i)",
+                fetchable.filename,
+                *status,
+            )
+            return False
+        self._report(
+            self.observer.info, "fetched %s (%i/%i)", fetchable.filename, *status
+        )
+        return True
+
+    def submit(self, fetchables, fetch):
+        """Queue files for fetching.
+
+        :param fetchables: iterable of :obj:`pkgcore.fetch.fetchable` instances
+        :param fetch: callable passed a fetchable that fetches it, returning
+            False or raising an exception on failure
+        """
+        for fetchable in fetchables:
+            # workers count queued files, so register them before they finish
+            with self._lock:
+                if fetchable.filename not in self._futures:
+                    self._futures[fetchable.filename] = self._executor.submit(
+                        self._fetch, fetch, fetchable
+                    )
+
+    def wait(self, fetchables):
+        """Block until the given files are fetched.
+
+        Files that weren't submitted are ignored.
+
+        :return: list of fetchables that failed fetching
+        """
+        failures = []
+        for fetchable in fetchables:
+            future = self._futures.get(fetchable.filename)
+            if future is None:
+                continue
+            try:
+                if future.result():
+                    continue
+            except CancelledError:
+                pass
+            failures.append(fetchable)
+        return failures
+
+    def shutdown(self):
+        """Cancel queued fetches and wait for running fetches to finish."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
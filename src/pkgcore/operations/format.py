@@ -22,12 +22,23 @@ from snakeoil.osutils import pjoin
 
 from .. import operations as _operations_mod
 from ..exceptions import PkgcoreUserException
+from ..fetch import base as fetch_base_mod
 from ..fetch import custom as fetch_custom
 from ..fetch import errors as fetch_errors
+from ..fetch import http as fetch_http
 
 
 class fetch_base:
-    def __init__(self, domain, pkg, fetchables, distdir=None):
+    def __init__(
+        self,
+        domain,
+        pkg,
+        fetchables,
+        distdir=None,
+        limiter=None,
+        force_verify=False,
+        progress=None,
+    ):
         self.verified_files = {}
         self._basenames = set()
         self.domain = domain
@@ -36,18 +47,37 @@ class fetch_base:
         self.distdir = distdir if distdir is not None else domain.distdir
 
         # create fetcher
-        fetchcmd = domain.settings["FETCHCOMMAND"]
-        resumecmd = domain.settings.get("RESUMECOMMAND", fetchcmd)
         attempts = int(domain.settings.get("FETCH_ATTEMPTS", 10))
-        self.fetcher = fetch_custom.fetcher(
-            self.distdir,
-            fetchcmd,
-            resumecmd,
-            attempts=attempts,
-            PATH=os.environ["PATH"],
-            http_proxy=domain.get_settings_envvar("http_proxy", ""),
-            https_proxy=domain.get_settings_envvar("https_proxy", ""),
-        )
+        proxies = {
+            "http_proxy": domain.get_settings_envvar("http_proxy", ""),
+            "https_proxy": domain.get_settings_envvar("https_proxy", ""),
+        }
+        stamps = fetch_base_mod.distfile_stamps(self.distdir)
+        if "native-fetch" in getattr(domain, "features", ()):
+            self.fetcher = fetch_http.fetcher(
+                self.distdir,
+                attempts=attempts,
+                limiter=limiter,
+                stamps=stamps,
+                force_verify=force_verify,
+                progress=progress,
+                **proxies,
+            )
+        else:
+            # external fetch commands don't report transfer progress
+            fetchcmd = domain.settings["FETCHCOMMAND"]
+            resumecmd = domain.settings.get("RESUMECOMMAND", fetchcmd)
+            self.fetcher = fetch_custom.fetcher(
+                self.distdir,
+                fetchcmd,
+                resumecmd,
+                attempts=attempts,
+                limiter=limiter,
+                stamps=stamps,
+                force_verify=force_verify,
+                PATH=os.environ["PATH"],
+                **proxies,
+            )
 
     def fetch_all(self, observer):
         # TODO: add parallel fetch support
@@ -130,13 +160,29 @@ class operations(_operations_mod.base):
         return self._cmd_implementation_configure(self._get_observer(observer))
 
     @_operations_mod.is_standalone
-    def _cmd_api_fetch(self, fetchables=None, observer=klass.sentinel, distdir=None):
+    def _cmd_api_fetch(
+        self,
+        fetchables=None,
+        observer=klass.sentinel,
+        distdir=None,
+        limiter=None,
+        force_verify=False,
+        progress=None,
+    ):
         observer = observer if observer is not klass.sentinel else self.observer
         if fetchables is None:
             fetchables = self.pkg.fetchables
         elif not isinstance(fetchables, (tuple, list)):
             fetchables = [fetchables]
-        fetcher = self._fetch_kls(self.domain, self.pkg, fetchables, distdir)
+        fetcher = self._fetch_kls(
+            self.domain,
+            self.pkg,
+            fetchables,
+            distdir,
+            limiter=limiter,
+            force_verify=force_verify,
+            progress=progress,
+        )
         verified, failures = fetcher.fetch_all(self._get_observer(observer))
 
         if failures:
@@ -1,9 +1,19 @@
+import multiprocessing
+import threading
+from collections import Counter, defaultdict
+from multiprocessing.util import Finalize
+
 from snakeoil.compatibility import IGNORED_EXCEPTIONS
 
 from ..package.errors import MetadataException
+from ..util import chksum_memo
 from ..util.thread_pool import map_async
 
 
+class RegenError(Exception):
+    """Error caught while regenerating metadata in a worker process."""
+
+
 def regen_iter(iterable, regen_func, observer):
     for pkg in iterable:
         try:
@@ -20,7 +30,250 @@ def regen_iter(iterable, regen_func, observer):
             yield pkg, e
 
 
-def regen_repository(repo, pkgs, observer, threads=1, pkg_attr="keywords", **kwargs):
+class RegenProfile:
+    """Per-package timing data collected during metadata regeneration.
+
+    Instances are registered as the ebuild processor metadata profiler,
+    recording the wall time each ebuild took to source, the eclasses it
+    inherited, and which of those were already preloaded by the processor.
+    """
+
+    def __init__(self):
+        # (cpv, elapsed, inherited eclasses, preloaded eclasses) tuples
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, pkg, elapsed, inherited, preloaded):
+        record = (
+            pkg.cpvstr,
+            elapsed,
+            tuple(sorted(inherited)),
+            tuple(sorted(preloaded)),
+        )
+        with self._lock:
+            self.records.append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getstate__(self):
+        return {"records": self.records}
+
+    def __setstate__(self, state):
+        self.records = state["records"]
+        self._lock = threading.Lock()
+
+    def slowest(self, top=10):
+        """Return the records for the slowest packages, slowest first."""
+        return sorted(self.records, key=lambda x: x[1], reverse=True)[:top]
+
+    def eclass_stats(self):
+        """Return regen stats aggregated per eclass.
+
+        The time for each package is attributed to every eclass it inherits,
+        so totals across eclasses overlap.
+
+        :return: mapping of eclass name to a dict containing the number of
+            inheriting packages, their total regen time, and the number of
+            times the eclass was sourced vs served from preloaded functions
+        """
+        stats = defaultdict(
+            lambda: {"packages": 0, "time": 0.0, "sourced": 0, "preloaded": 0}
+        )
+        for _cpv, elapsed, inherited, preloaded in self.records:
+            preloaded = frozenset(preloaded)
+            for eclass in inherited:
+                data = stats[eclass]
+                data["packages"] += 1
+                data["time"] += elapsed
+                data["preloaded" if eclass in preloaded else "sourced"] += 1
+        return dict(stats)
+
+    def report(self):
+        """Return the JSON serializable profile."""
+        return {
+            "packages": len(self.records),
+            "time": sum(x[1] for x in self.records),
+            "records": [
+                {
+                    "package": cpv,
+                    "time": elapsed,
+                    "inherited": list(inherited),
+                    "preloaded": list(preloaded),
+                }
+                for cpv, elapsed, inherited, preloaded in self.records
+            ],
+            "eclasses": self.eclass_stats(),
+        }
+
+
+# state shared with forked worker processes
+_worker_state = None
+
+
+def _init_worker():
+    repo, _pkgs, kwargs, helper = _worker_state
+    helper.append(repo._regen_operation_helper(**kwargs))
+    # commit entries as they're written so concurrent writers to single file
+    # caches don't hold locks for the entire run
+    caches = getattr(repo, "cache", ())
+    if hasattr(caches, "commit"):
+        caches = (caches,)
+    for cache in caches:
+        if not cache.readonly and not cache.autocommits:
+            cache.set_sync_rate(cache.default_sync_rate)
+    Finalize(None, _finish_worker, exitpriority=10)
+
+
+def _finish_worker():
+    repo, _pkgs, _kwargs, helper = _worker_state
+    # release the worker's ebuild processor
+    del helper[:]
+    repo.operations.run_if_supported("flush_cache")
+    chksum_memo.flush_memos()
+
+
+def _regen_worker(index):
+    _repo, pkgs, kwargs, helper = _worker_state
+    helper = helper[0]
+    hits, misses = _preload_stats((helper,))
+    profile = kwargs.get("profile")
+    profiled = len(profile) if profile is not None else 0
+    # exceptions are stringified since they're not guaranteed to be picklable
+    errors = [
+        (index, RegenError(str(e))) for _, e in regen_iter((pkgs[index],), helper, None)
+    ]
+    new_hits, new_misses = _preload_stats((helper,))
+    # profile data is collected in the worker's copy and passed back
+    records = profile.records[profiled:] if profile is not None else []
+    return errors, new_hits - hits, new_misses - misses, records
+
+
+def _preload_stats(helpers):
+    """Return the eclass preload hits and misses summed across regen helpers."""
+    hits = sum(getattr(x, "eclass_preload_hits", 0) for x in helpers)
+    misses = sum(getattr(x, "eclass_preload_misses", 0) for x in helpers)
+    return hits, misses
+
+
+def _report_preload_stats(observer, hits, misses):
+    if observer is None or not (total := hits + misses):
+        return
+    observer.info(
+        f"eclass preload reuse: {hits}/{total} inherits "
+        f"({hits / total:.1%} hit rate)"
+    )
+
+
+def eclass_affinity_order(repo, pkgs):
+    """Order pkgs so those inheriting similar eclasses are adjacent.
+
+    Inherit sets are pulled from the repo's existing cache entries, even
+    stale ones, since they're generally still accurate. Eclasses are ordered
+    from least to most inherited for each package so packages sharing less
+    common eclasses are grouped together. Packages without cache entries are
+    placed last, in their original order.
+    """
+    caches = getattr(repo, "cache", ())
+    if hasattr(caches, "commit"):
+        caches = (caches,)
+    if not caches:
+        return list(pkgs)
+
+    pkgs = list(pkgs)
+    entries = caches[0].get_many(pkg.cpvstr for pkg in pkgs)
+    inherits = {
+        cpv: tuple(x[0] for x in entry.get("_eclasses_", ()))
+        for cpv, entry in entries.items()
+    }
+    popularity = Counter(eclass for x in inherits.values() for eclass in x)
+
+    def _key(item):
+        index, pkg = item
+        if (eclasses := inherits.get(pkg.cpvstr)) is None:
+            return (1, (), index)
+        return (0, tuple(sorted(eclasses, key=lambda x: (popularity[x], x))), index)
+
+    return [pkg for _, pkg in sorted(enumerate(pkgs), key=_key)]
+
+
+def _chunks(pkgs, size):
+    for i in range(0, len(pkgs), size):
+        yield pkgs[i : i + size]
+
+
+def _chunksize(pkgs, workers):
+    # small enough to keep workers load balanced, large enough for runs of
+    # similar pkgs to hit the same processor
+    return max(1, min(32, len(pkgs) // (workers * 8)))
+
+
+def regen_chunks_iter(chunks, regen_func, observer):
+    regen_batch = getattr(regen_func, "regen_batch", None)
+    for chunk in chunks:
+        if regen_batch is not None and len(chunk) > 1:
+            try:
+                failures = regen_batch(chunk)
+            except IGNORED_EXCEPTIONS as e:
+                if isinstance(e, KeyboardInterrupt):
+                    return
+                raise
+            except Exception:
+                # fallback to regenerating the chunk's pkgs individually
+                pass
+            else:
+                for pkg, e in failures:
+                    # metadata failures are handled by scanning for metadata
+                    # masked pkgs after regen has completed
+                    if not isinstance(e, MetadataException):
+                        yield pkg, e
+                continue
+        yield from regen_iter(chunk, regen_func, observer)
+
+
+def regen_processes(repo, pkgs, processes, observer=None, **kwargs):
+    """Regenerate metadata using a pool of worker processes.
+
+    Each worker owns its own ebuild processor and writes the metadata it
+    generates directly to the repo's cache, avoiding contention on the GIL
+    for the python side of metadata generation.
+
+    Errors are yielded as (pkg, exception) tuples as they occur.
+    """
+    global _worker_state
+    pkgs = list(pkgs)
+    if not pkgs:
+        return
+    # workers inherit the repo and pkgs via fork instead of pickling them
+    _worker_state = (repo, pkgs, kwargs, [])
+    ctx = multiprocessing.get_context("fork")
+    processes = min(processes, len(pkgs))
+    pool = ctx.Pool(processes, initializer=_init_worker)
+    profile = kwargs.get("profile")
+    hits = misses = 0
+    try:
+        for errors, task_hits, task_misses, records in pool.imap_unordered(
+            _regen_worker, range(len(pkgs)), chunksize=_chunksize(pkgs, processes)
+        ):
+            hits += task_hits
+            misses += task_misses
+            if profile is not None:
+                profile.records.extend(records)
+            for index, e in errors:
+                yield pkgs[index], e
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _worker_state = None
+    _report_preload_stats(observer, hits, misses)
+
+
+def regen_repository(
+    repo, pkgs, observer, threads=1, processes=1, pkg_attr="keywords", **kwargs
+):
     helpers = []
 
     def _get_repo_helper():
@@ -34,7 +287,22 @@ def regen_repository(repo, pkgs, observer, threads=1, pkg_attr="keywords", **kwa
     def get_args():
         return (_get_repo_helper(), observer)
 
-    errors = map_async(pkgs, regen_iter, threads=threads, per_thread_args=get_args)
+    if hasattr(repo, "_regen_operation_helper"):
+        # route pkgs with similar inherits to the same processors to maximize
+        # reuse of preloaded eclasses
+        pkgs = eclass_affinity_order(repo, pkgs)
+        if processes is not None and processes > 1:
+            yield from regen_processes(
+                repo, pkgs, processes, observer=observer, **kwargs
+            )
+            return
+
+    pkgs = list(pkgs)
+    chunks = list(_chunks(pkgs, _chunksize(pkgs, max(threads, 1))))
+    errors = map_async(
+        chunks, regen_chunks_iter, threads=threads, per_thread_args=get_args
+    )
 
     # yield any errors that occurred during metadata generation
     yield from errors
+    _report_preload_stats(observer, *_preload_stats(helpers))
@@ -167,6 +167,9 @@ class sync_operations(operations_mod.base):
 
 
 class operations(sync_operations):
+    # maximum number of cache updates queued during regen
+    regen_write_queue_size = 1024
+
     def _disabled_if_frozen(self, command):
         if self.repo.frozen:
             logger.debug(
@@ -226,21 +229,60 @@ class operations(sync_operations):
             for p in cache_pkgs - pkgs:
                 del cache[p]
 
+    def _get_regen_state(self):
+        """Return an opaque string describing the current repo state.
+
+        Used to support incremental regens; None disables them.
+        """
+        return None
+
+    def _get_regen_targets(self, state, since=None):
+        """Determine the pkgs requiring regen since the cache's recorded state.
+
+        :param state: current repo state from :obj:`_get_regen_state`
+        :param since: optional override for the state the cache was generated from
+        :return: None if a full regen is required, otherwise a tuple of the
+            pkgs to regenerate and the cpv strings of removed pkgs
+        """
+        return None
+
+    def _update_metadata_index(self, targets):
+        """Refresh the repo's metadata index after regenerating its cache.
+
+        :param targets: None after full regens, otherwise the tuple of
+            regenerated pkgs and removed cpv strings from
+            :obj:`_get_regen_targets`
+        """
+
     @operations_mod.is_standalone
-    def _cmd_api_regen_cache(self, observer=None, threads=1, **kwargs):
+    def _cmd_api_regen_cache(
+        self, observer=None, threads=1, since=None, metadata_index=False, **kwargs
+    ):
         cache = getattr(self.repo, "cache", None)
         if not cache and not kwargs.get("force", False):
             return
         sync_rate = getattr(cache, "sync_rate", None)
+        # queue cache updates so regen workers aren't held up by the filesystem
+        write_caches = [x for x in self._get_caches() if not x.readonly]
         try:
             if sync_rate is not None:
                 cache.set_sync_rate(1000000)
+            for x in write_caches:
+                x.set_write_behind(self.regen_write_queue_size)
             errors = 0
 
-            # Force usage of unfiltered repo to include pkgs with metadata issues.
-            # Matches are collapsed directly to a list to avoid threading issues such
-            # as EBADF since the repo iterator isn't thread-safe.
-            pkgs = list(self.repo.itermatch(packages.AlwaysTrue, pkg_filter=None))
+            state = self._get_regen_state()
+            targets = None
+            if state is not None and not kwargs.get("force", False):
+                targets = self._get_regen_targets(state, since=since)
+
+            if targets is None:
+                # Force usage of unfiltered repo to include pkgs with metadata issues.
+                # Matches are collapsed directly to a list to avoid threading issues such
+                # as EBADF since the repo iterator isn't thread-safe.
+                pkgs = list(self.repo.itermatch(packages.AlwaysTrue, pkg_filter=None))
+            else:
+                pkgs, removed = targets
 
             observer = self._get_observer(observer)
             for pkg, e in regen.regen_repository(
@@ -248,24 +290,63 @@ class operations(sync_operations):
             ):
                 observer.error(f"caught exception {e} while processing {pkg.cpvstr}")
                 errors += 1
-
-            # report pkgs with bad metadata -- relies on iterating over the
-            # unfiltered repo to populate the masked repo
-            pkgs = frozenset(pkg.cpvstr for pkg in self.repo)
-            for pkg in sorted(self.repo._bad_masked):
+            regen_errors = errors
+
+            if targets is None:
+                # report pkgs with bad metadata -- relies on iterating over the
+                # unfiltered repo to populate the masked repo
+                cpvs = frozenset(pkg.cpvstr for pkg in self.repo)
+                bad_pkgs = sorted(self.repo._bad_masked)
+            else:
+                # only check the regenerated pkgs for bad metadata
+                cpvs = frozenset(pkg.cpvstr for pkg in pkgs)
+                for pkg in pkgs:
+                    for _ in self.repo.itermatch(pkg.versioned_atom):
+                        pass
+                bad_pkgs = sorted(
+                    pkg for pkg in self.repo._bad_masked if pkg.cpvstr in cpvs
+                )
+            for pkg in bad_pkgs:
                 observer.error(
                     f"{pkg.cpvstr}: {pkg.data.msg(verbosity=observer.verbosity)}"
                 )
                 errors += 1
 
             # remove old/invalid cache entries
-            self._cmd_implementation_clean_cache(pkgs)
+            if targets is None:
+                self._cmd_implementation_clean_cache(cpvs)
+            else:
+                for cache in self._get_caches():
+                    if cache.readonly:
+                        continue
+                    for cpv in removed:
+                        if cpv in cache:
+                            del cache[cpv]
+
+            # write out queued cache updates before recording the repo state
+            # so entries that failed to be written aren't skipped by future
+            # incremental runs
+            self.repo.operations.run_if_supported("flush_cache")
+            for x in write_caches:
+                x.set_write_behind(0)
+
+            if metadata_index:
+                self._update_metadata_index(targets)
+
+            # record the repo state for future incremental runs if all pkgs
+            # were processed
+            if not regen_errors:
+                for cache in self._get_caches():
+                    if not cache.readonly:
+                        cache.set_regen_state(state)
 
             return errors
         finally:
             if sync_rate is not None:
                 cache.set_sync_rate(sync_rate)
             self.repo.operations.run_if_supported("flush_cache")
+            for x in write_caches:
+                x.set_write_behind(0)
 
     def _get_caches(self):
         caches = getattr(self.repo, "cache", ())
@@ -1,12 +1,15 @@
 __all__ = ("nodeps_repo", "caching_repo")
 
-from snakeoil.iterables import caching_iter, iter_sort
+from heapq import merge
+
+from snakeoil.iterables import caching_iter
 from snakeoil.klass import DirProxy, GetAttrProxy
 
 from ..ebuild.conditionals import DepSet
 from ..operations.repo import operations_proxy
 from ..package.mutated import MutatedPkg
 from ..restrictions import packages
+from .multiplex import _merge_params
 
 
 class nodeps_repo:
@@ -131,7 +134,14 @@ class multiplex_sorting_repo:
 
     def itermatch(self, restrict):
         repo_iters = [repo.itermatch(restrict) for repo in self.__repos__]
-        return iter_sort(self.__sorter__, *repo_iters)
+        key, reverse = _merge_params(self.__sorter__)
+
+        # sorters order sequences keyed on their first item, e.g. the
+        # resolver's highest_iter_sort
+        def item_key(pkg):
+            return (pkg,) if key is None else key((pkg,))
+
+        return merge(*repo_iters, key=item_key, reverse=reverse)
 
     def match(self, restrict):
         return list(self.itermatch(restrict))
@@ -5,20 +5,42 @@ repository that combines multiple repos together
 __all__ = ("tree", "operations")
 
 import os
-from functools import partial
+from functools import cmp_to_key, partial
+from heapq import merge
 from itertools import chain
-from operator import itemgetter
 
 from snakeoil import klass
-from snakeoil.compatibility import sorted_cmp
-from snakeoil.currying import post_curry
-from snakeoil.iterables import iter_sort
 
 from ..config.hint import ConfigHint
 from ..operations import repo as repo_interface
 from . import errors, prototype
 
 
+def _merge_params(sorter):
+    """Return the heap merge (key, reverse) arguments equivalent to a sorter.
+
+    Sorters using :func:`sorted` directly, optionally via a partial setting its
+    key or reverse arguments, are merged by key. Sorter functions can also
+    define ``merge_key``, a callable passed the keyword arguments of a partial
+    wrapping the sorter that returns the merge key, and ``merge_reverse``
+    (e.g. :func:`pkgcore.resolver.plan.highest_iter_sort`). Other sorters are
+    only known to order the lists they're passed, so elements are compared by
+    sorting each pair.
+    """
+    func, keywords = sorter, {}
+    if isinstance(sorter, partial) and not sorter.args:
+        func, keywords = sorter.func, sorter.keywords
+    if func is sorted and keywords.keys() <= {"key", "reverse"}:
+        return keywords.get("key"), bool(keywords.get("reverse"))
+    if (merge_key := getattr(func, "merge_key", None)) is not None:
+        return merge_key(**keywords), func.merge_reverse
+
+    def _cmp(x, y):
+        return 1 if sorter([x, y])[0] is y else -1
+
+    return cmp_to_key(_cmp), False
+
+
 class operations(repo_interface.operations_proxy):
     ops_stop_after_first_supported = frozenset(["install", "uninstall", "replace"])
 
@@ -161,23 +183,22 @@ class tree(prototype.tree):
         raise ValueError(f"no repo contains: {path!r}")
 
     def itermatch(self, restrict, **kwds):
-        sorter = kwds.get("sorter", iter)
-        if sorter is iter:
+        sorter = kwds.get("sorter")
+        if sorter is None or sorter is iter:
             return (
                 match
                 for repo in self.trees
                 for match in repo.itermatch(restrict, **kwds)
             )
 
-        # ugly, and a bit slow, but works.
-        def f(x, y):
-            l = sorter([x, y])
-            if l[0] == y:
-                return 1
-            return -1
-
-        f = post_curry(sorted_cmp, f, key=itemgetter(0))
-        return iter_sort(f, *[repo.itermatch(restrict, **kwds) for repo in self.trees])
+        # each repo's matches are already sorted, so stream them via a k-way
+        # merge with ties resolved in repo order
+        key, reverse = _merge_params(sorter)
+        return merge(
+            *(repo.itermatch(restrict, **kwds) for repo in self.trees),
+            key=key,
+            reverse=reverse,
+        )
 
     itermatch.__doc__ = prototype.tree.itermatch.__doc__.replace(
         "@param", "@keyword"
@@ -276,7 +276,8 @@ class tree:
             candidates = self._identify_candidates(restrict, sorter)
 
         if force is None:
-            match = restrict.match
+            # specialize the restriction once instead of walking it per pkg
+            match = restrict.compile()
         elif force:
             match = restrict.force_True
         else:
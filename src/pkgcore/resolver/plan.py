@@ -58,6 +58,28 @@ def highest_iter_sort(l, pkg_grabber=pkg_grabber):
     return l
 
 
+def _livefs_merge_key(livefs_rank):
+    """Return a merge key factory ranking equal packages by livefs status.
+
+    Used by :obj:`pkgcore.repository.multiplex` to merge sorted package
+    streams by key instead of calling the sorter for every comparison.
+    """
+
+    def merge_key(pkg_grabber=pkg_grabber):
+        def key(item):
+            pkg = pkg_grabber(item)
+            return pkg, livefs_rank[bool(pkg.repo.livefs)]
+
+        return key
+
+    return merge_key
+
+
+# equal packages from livefs repos sort above nonlivefs ones
+highest_iter_sort.merge_key = _livefs_merge_key((0, 1))
+highest_iter_sort.merge_reverse = True
+
+
 def downgrade_iter_sort(restrict, l, pkg_grabber=pkg_grabber):
     """Sort a list of packages from highest to lowest and prefer nonlivefs.
 
@@ -110,6 +132,11 @@ def lowest_iter_sort(l, pkg_grabber=pkg_grabber):
     return l
 
 
+# equal packages from livefs repos sort below nonlivefs ones
+lowest_iter_sort.merge_key = _livefs_merge_key((1, 0))
+lowest_iter_sort.merge_reverse = False
+
+
 class MutableContainmentRestriction(values.base):
     __slots__ = ("_blacklist", "match")
 
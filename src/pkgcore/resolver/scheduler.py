@@ -0,0 +1,178 @@
+"""
+parallel scheduling of resolved merge plans
+
+Ops from a resolved plan are arranged into a dependency graph allowing
+independent packages to be built concurrently while merges to the livefs are
+serialized in the calling thread.
+"""
+
+__all__ = ("build_graph", "BuildScheduler")
+
+import os
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from snakeoil.sequences import iflatten_instance
+
+from ..ebuild.atom import atom
+
+# dependency types that must be merged before a package is built
+dep_attrs = ("bdepend", "depend", "idepend", "rdepend")
+
+
+def build_graph(ops):
+    """Determine the ops each op of a merge plan depends on.
+
+    Dependencies are only resolved against ops earlier in the plan so plan
+    ordering breaks any cycles. Removals act as barriers, they depend on all
+    previous ops and all following ops depend on them.
+
+    :param ops: sequence of resolver ops in plan order
+    :return: list of sets of op indices, one per op
+    """
+    providers = defaultdict(list)
+    barrier = None
+    graph = []
+    for i, op in enumerate(ops):
+        if op.desc == "remove":
+            deps = set(range(barrier + 1 if barrier is not None else 0, i))
+            if barrier is not None:
+                deps.add(barrier)
+            barrier = i
+        else:
+            deps = set() if barrier is None else {barrier}
+            for attr in dep_attrs:
+                for dep in iflatten_instance(getattr(op.pkg, attr, ()), atom):
+                    if dep.blocks:
+                        continue
+                    deps.update(
+                        j for j, pkg in providers.get(dep.key, ()) if dep.match(pkg)
+                    )
+            providers[op.pkg.key].append((i, op.pkg))
+        graph.append(deps)
+    return graph
+
+
+class BuildScheduler:
+    """Build ops concurrently as their dependencies are merged.
+
+    :ivar ops: sequence of resolver ops in plan order
+    :ivar graph: op dependencies as returned by :func:`build_graph`
+    :ivar jobs: maximum number of concurrent builds
+    :ivar load_average: if not None, new builds aren't started while other
+        builds are running and the system load average is at or above this
+        value
+    :ivar ignore_failures: if True, only the dependents of failed ops are
+        skipped, otherwise no new builds are started after a failure
+    :ivar failed: ops that failed building or merging
+    :ivar skipped: ops skipped due to failures
+    """
+
+    # seconds to wait before rechecking the load average
+    poll_interval = 1
+
+    def __init__(
+        self,
+        ops,
+        jobs=1,
+        load_average=None,
+        ignore_failures=False,
+        getloadavg=os.getloadavg,
+    ):
+        self.ops = tuple(ops)
+        self.graph = build_graph(self.ops)
+        self.jobs = max(jobs, 1)
+        self.load_average = load_average
+        self.ignore_failures = ignore_failures
+        self._getloadavg = getloadavg
+        self.failed = []
+        self.skipped = []
+
+    def _overloaded(self, running):
+        if self.load_average is None or not running:
+            return False
+        try:
+            return self._getloadavg()[0] >= self.load_average
+        except OSError:
+            return False
+
+    def run(self, build, merge, start=None):
+        """Build and merge all ops.
+
+        :param build: callable passed an op that is run in a worker thread,
+            returning the result to pass to merge or False on failure
+        :param merge: callable passed an op and its build result that is run
+            in the calling thread, returning False on failure
+        :param start: optional callable passed an op that is run in the
+            calling thread right before its build is started
+        :return: True if all ops were built and merged, otherwise False
+        """
+        remaining = [set(deps) for deps in self.graph]
+        dependents = defaultdict(list)
+        for i, deps in enumerate(self.graph):
+            for j in deps:
+                dependents[j].append(i)
+        ready = deque(i for i, deps in enumerate(remaining) if not deps)
+        pending = set(range(len(self.ops))).difference(ready)
+        running = {}
+        stop = False
+
+        def fail(i):
+            self.failed.append(self.ops[i])
+            # skip all ops depending on the failed op
+            queue = deque(dependents[i])
+            while queue:
+                j = queue.popleft()
+                if j in pending:
+                    pending.discard(j)
+                    self.skipped.append(self.ops[j])
+                    queue.extend(dependents[j])
+
+        def merged(i):
+            for j in dependents[i]:
+                remaining[j].discard(i)
+                if not remaining[j] and j in pending:
+                    pending.discard(j)
+                    ready.append(j)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            try:
+                while ready or running:
+                    while (
+                        ready
+                        and not stop
+                        and len(running) < self.jobs
+                        and not self._overloaded(running)
+                    ):
+                        i = ready.popleft()
+                        if start is not None:
+                            start(self.ops[i])
+                        running[executor.submit(build, self.ops[i])] = i
+                    if stop and not running:
+                        break
+                    if not running:
+                        continue
+
+                    timeout = self.poll_interval if ready and not stop else None
+                    done, _ = wait(
+                        running, timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+                    # merge finished builds serially in plan order
+                    for future in sorted(done, key=running.get):
+                        i = running.pop(future)
+                        result = future.result()
+                        if result is not False:
+                            result = merge(self.ops[i], result)
+                        if result is False:
+                            fail(i)
+                            stop = not self.ignore_failures
+                        else:
+                            merged(i)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+        if stop:
+            self.skipped.extend(self.ops[i] for i in sorted(pending.union(ready)))
+        return not (self.failed or self.skipped)
@@ -8,6 +8,7 @@ operations.
 __all__ = ("AndRestriction", "OrRestriction")
 
 from itertools import islice
+from operator import itemgetter
 
 from snakeoil.klass import cached_hash, generic_equality
 
@@ -190,6 +191,86 @@ class base(restriction.base, metaclass=generic_equality):
                 parent_seq.append(self.__class__(*l))
 
 
+def _flatten(restrict, kls):
+    """Yield the children of a restriction, expanding nested restrictions.
+
+    Non-negated children compiled the same way as the parent are replaced by
+    their own children since they can be evaluated as part of the parent.
+    """
+    for r in restrict.restrictions:
+        if (
+            isinstance(r, kls)
+            and not r.negate
+            and r.__class__._compile is kls._compile
+            and restriction._compiles_match(r.__class__)
+        ):
+            yield from _flatten(r, kls)
+        else:
+            yield r
+
+
+# generated functions are limited to this many checks, larger restrictions
+# loop over their children instead
+_max_generated_checks = 64
+
+
+def _compile_boolean(restrict, kls, short_circuit):
+    """Compile an AND or OR restriction into a single function.
+
+    Nested restrictions are flattened, constant children are collapsed, and
+    the remaining children are ordered so cheaper checks run first.
+
+    :param kls: restriction class whose nested instances are flattened
+    :param short_circuit: child result that determines the overall result,
+        False for AND and True for OR
+    """
+    result = short_circuit != restrict.negate
+    nodes = []
+    for r in _flatten(restrict, kls):
+        cost, func = restriction.compile_node(r)
+        if func is True or func is False:
+            if func == short_circuit:
+                return 0, result
+            continue
+        nodes.append((cost, func))
+    if not nodes:
+        return 0, not result
+
+    nodes.sort(key=itemgetter(0))
+    cost = sum(x[0] for x in nodes)
+    funcs = tuple(x[1] for x in nodes)
+
+    if len(funcs) > _max_generated_checks:
+        if short_circuit:
+
+            def match(val):
+                for func in funcs:
+                    if func(val):
+                        return result
+                return not result
+
+        else:
+
+            def match(val):
+                for func in funcs:
+                    if not func(val):
+                        return result
+                return not result
+
+        return cost, match
+
+    # generate a function directly calling each child, avoiding the loop
+    check = "if f%i(val):" if short_circuit else "if not f%i(val):"
+    args = ", ".join(f"f{i}" for i in range(len(funcs)))
+    lines = [f"def make({args}):", "    def match(val):"]
+    for i in range(len(funcs)):
+        lines.append(f"        {check % i} return {result}")
+    lines.extend((f"        return {not result}", "    return match"))
+    scope = {}
+    exec("\n".join(lines), scope)
+    return cost, scope["make"](*funcs)
+
+
 # this beast, handles N^2 permutations.  convert to stack based.
 def iterative_quad_toggling(
     pkg,
@@ -284,6 +365,9 @@ class AndRestriction(base):
                 return self.negate
         return not self.negate
 
+    def _compile(self):
+        return _compile_boolean(self, AndRestriction, False)
+
     def force_True(self, pkg, *vals):
         pvals = [pkg]
         pvals.extend(vals)
@@ -459,6 +543,9 @@ class OrRestriction(base):
                 return not self.negate
         return self.negate
 
+    def _compile(self):
+        return _compile_boolean(self, OrRestriction, True)
+
     def cnf_solutions(self, full_solution_expansion=False):
         """Returns a list in CNF (conjunctive normalized form) of this instance.
 
@@ -71,6 +71,32 @@ class PackageRestriction(restriction.base, metaclass=generic_equality):
             return self.negate
         return self.restriction.match(attr) != self.negate
 
+    def _compile(self):
+        cost, child = restriction.compile_node(self.restriction)
+        negate = self.negate
+        if child is False:
+            # missing attributes match as negate as well
+            return 0, negate
+        pull_attr = self._pull_attr_func
+        attr_split = self._attr_split
+        handle_exception = self._handle_exception
+        cost += len(attr_split)
+
+        def match(pkg):
+            try:
+                attr = pull_attr(pkg)
+            except IGNORED_EXCEPTIONS:
+                raise
+            except Exception as e:
+                if handle_exception(pkg, e, attr_split):
+                    raise
+                return negate
+            if child is True:
+                return not negate
+            return child(attr) != negate
+
+        return cost, match
+
     def _handle_exception(self, pkg, exc, attr_split):
         if isinstance(exc, AttributeError):
             if not self.ignore_missing:
@@ -150,6 +176,9 @@ class PackageRestrictionMulti(PackageRestriction):
     __inst_caching__ = True
     attr = None
 
+    # attributes are pulled via multiple getters, use the match method as is
+    _compile = restriction.base._compile
+
     def force_False(self, pkg):
         attrs = self._pull_attr(pkg)
         if attrs is klass.sentinel:
@@ -2,7 +2,7 @@
 base restriction class
 """
 
-from functools import partial
+from functools import lru_cache, partial
 
 from snakeoil import caching, klass
 from snakeoil.currying import pretty_docs
@@ -32,6 +32,28 @@ class base(klass.SlotsPicklingMixin, metaclass=caching.WeakInstMeta):
     def force_True(self, *arg, **kwargs):
         return self.match(*arg, **kwargs)
 
+    def compile(self):
+        """Return a callable equivalent to :obj:`match` for a single argument.
+
+        The restriction tree is flattened and specialized into closures once
+        so repeated matching avoids walking the tree and its attribute lookups
+        per call. Subclasses overriding :obj:`match` without providing a
+        matching :obj:`_compile` fall back to their :obj:`match` method.
+        """
+        result = compile_node(self)[1]
+        if result is True or result is False:
+            return partial(_always, result)
+        return result
+
+    def _compile(self):
+        """Return a (cost, matcher) pair for this restriction.
+
+        The matcher is either a callable taking the value to match or a
+        boolean if the result is constant. Cost is a relative estimate used
+        to order cheaper checks first within boolean restrictions.
+        """
+        return default_cost, self.match
+
     def __len__(self):
         return 1
 
@@ -62,6 +84,9 @@ class AlwaysBool(base):
     def force_False(self, *a, **kw):
         return not self.negate
 
+    def _compile(self):
+        return 0, self.negate
+
     def __iter__(self):
         return iter(())
 
@@ -98,6 +123,12 @@ class Negate(base):
     def match(self, *a, **kw):
         return not self._restrict.match(*a, **kw)
 
+    def _compile(self):
+        cost, func = compile_node(self._restrict)
+        if func is True or func is False:
+            return 0, not func
+        return cost, lambda val: not func(val)
+
     def __str__(self):
         return "not (%s)" % self._restrict
 
@@ -121,6 +152,9 @@ class FakeType(base):
     def match(self, *a, **kw):
         return self._restrict.match(*a, **kw)
 
+    def _compile(self):
+        return compile_node(self._restrict)
+
     def __str__(self):
         return f"Faked type({self.type}): {self._restrict}"
 
@@ -156,6 +190,37 @@ class AnyMatch(base):
         return f"<{self.__class__.__name__} restriction={self.restriction!r} @{id(self):#8x}>"
 
 
+# relative cost of restrictions that can't be specialized
+default_cost = 10
+
+
+def _always(result, *args, **kwargs):
+    return result
+
+
+@lru_cache(maxsize=None)
+def _compiles_match(kls):
+    # A _compile implementation is only valid for the match method it was
+    # written alongside; if a subclass overrides match alone, use it as is.
+    for x in kls.__mro__:
+        if "_compile" in x.__dict__:
+            return True
+        elif "match" in x.__dict__:
+            return False
+    return False
+
+
+def compile_node(restrict):
+    """Return the (cost, matcher) pair for a restriction.
+
+    See :obj:`base._compile` for the returned values, restrictions that don't
+    support compilation are matched via their :obj:`match` method.
+    """
+    if _compiles_match(restrict.__class__):
+        return restrict._compile()
+    return default_cost, restrict.match
+
+
 def curry_node_type(cls, node_type, extradoc=None):
     """Helper function for creating restrictions of a certain type.
 
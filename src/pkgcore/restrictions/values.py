@@ -115,6 +115,16 @@ class StrRegex(base, metaclass=hashed_base):
                 value = str(value)
         return (self._matchfunc(value) is not None) != self.negate
 
+    def _compile(self):
+        matchfunc, negate = self._matchfunc, self.negate
+
+        def match(value):
+            if not isinstance(value, str):
+                value = "" if value is None else str(value)
+            return (matchfunc(value) is not None) != negate
+
+        return 4, match
+
     def __repr__(self):
         result = [self.__class__.__name__, repr(self.regex)]
         if self.negate:
@@ -167,6 +177,16 @@ class StrExactMatch(base, metaclass=generic_equality):
         else:
             return (self.exact == value.lower()) != self.negate
 
+    def _compile(self):
+        exact = self.exact
+        if self.case_sensitive:
+            if self.negate:
+                return 1, lambda value: exact != str(value)
+            return 1, lambda value: exact == str(value)
+        if self.negate:
+            return 1, lambda value: exact != str(value).lower()
+        return 1, lambda value: exact == str(value).lower()
+
     def intersect(self, other):
         s1, s2 = self.exact, other.exact
         if other.case_sensitive and not self.case_sensitive:
@@ -230,6 +250,16 @@ class StrGlobMatch(base, metaclass=hashed_base):
             f = value.endswith
         return f(self.glob) ^ self.negate
 
+    def _compile(self):
+        glob, negate = self.glob, self.negate
+        if self.flags == re.I:
+            convert = lambda value: str(value).lower()
+        else:
+            convert = str
+        if self.prefix:
+            return 2, lambda value: convert(value).startswith(glob) ^ negate
+        return 2, lambda value: convert(value).endswith(glob) ^ negate
+
     def __repr__(self):
         if self.negate:
             string = "<%s %r case_sensitive=%r negated @%#8x>"
@@ -275,6 +305,12 @@ class EqualityMatch(base, metaclass=generic_equality):
     def match(self, actual_val):
         return (self.data == actual_val) != self.negate
 
+    def _compile(self):
+        data = self.data
+        if self.negate:
+            return 1, lambda actual_val: not data == actual_val
+        return 1, lambda actual_val: data == actual_val
+
     def __repr__(self):
         return f"<{self.__class__.__name__} {self.data!r} negate={self.negate!r} @{id(self):#8x}>"
 
@@ -340,6 +376,26 @@ class ContainmentMatch(base, metaclass=hashed_base):
                 if k in val:
                     return not self.negate
 
+    def _compile(self):
+        vals, negate, fallback = self.vals, self.negate, self.match
+        if self.all:
+            check, result = vals.issubset, negate
+        else:
+            check, result = vals.isdisjoint, not negate
+
+        def match(val):
+            if isinstance(val, str):
+                for fval in vals:
+                    if fval in val:
+                        return not negate
+                return negate
+            try:
+                return check(val) != result
+            except TypeError:
+                return fallback(val)
+
+        return 2, match
+
     def force_False(self, pkg, attr, val, _values_override=None):
         # "More than one statement on a single line"
         # pylint: disable-msg=C0321
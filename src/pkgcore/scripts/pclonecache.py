@@ -1,7 +1,16 @@
 """repository cache clone utility"""
 
+import argparse
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from multiprocessing import cpu_count
 
+from snakeoil.cli import arghparse
+
+from ..cache import errors
 from ..util import commandline
 
 argparser = commandline.ArgumentParser(
@@ -22,6 +31,52 @@ argparser.add_argument(
     writable=True,
     help="target cache to update.  Must be writable.",
 )
+argparser.add_argument(
+    "-t",
+    "--threads",
+    type=arghparse.positive_int,
+    default=cpu_count(),
+    help="number of threads used to copy entries",
+    docs="""
+        Number of threads used to read, compare, and write entries,
+        defaults to the number of available processors.
+    """,
+)
+argparser.add_argument(
+    "--delete",
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help="delete target entries missing from the source (enabled by default)",
+)
+
+# number of entries queued for the worker pool at once
+_chunk_size = 1024
+
+
+def _clone_entry(source, target, cpv):
+    """Copy an entry to the target cache if it differs.
+
+    :return: status string for the entry
+    """
+    try:
+        values = source.get_raw(cpv)
+    except (KeyError, errors.CacheCorruption):
+        return "skipped"
+    try:
+        if target.get_raw(cpv) == values:
+            return "unchanged"
+    except (KeyError, errors.CacheCorruption):
+        pass
+    target.set_raw(cpv, values)
+    return "updated"
+
+
+@argparser.bind_final_check
+def _validate_args(parser, namespace):
+    try:
+        namespace.target.check_compatible(namespace.source)
+    except errors.CacheError as e:
+        parser.error(str(e))
 
 
 @argparser.bind_main_func
@@ -34,25 +89,40 @@ def main(options, out, err):
     source, target = options.source, options.target
     if not target.autocommits:
         target.sync_rate = 1000
-    if options.verbosity > 0:
-        out.write("grabbing target's existing keys")
+
+    stats = Counter()
     valid = set()
     start = time.time()
-    if options.verbosity > 0:
-        for k, v in source.items():
-            out.write(f"updating {k}")
-            target[k] = v
-            valid.add(k)
-    else:
-        for k, v in source.items():
-            target[k] = v
-            valid.add(k)
-
-    for x in target.keys():
-        if x not in valid:
-            if options.verbosity > 0:
-                out.write(f"deleting {x}")
-            del target[x]
-
-    if options.verbosity > 0:
-        out.write("took %i seconds" % int(time.time() - start))
+    clone = partial(_clone_entry, source, target)
+    # source keys are pulled in chunks so entries are streamed between caches
+    # instead of being loaded all at once
+    keys = iter(source.keys())
+    with ThreadPoolExecutor(max_workers=options.threads) as executor:
+        while chunk := list(islice(keys, _chunk_size)):
+            for cpv, status in zip(chunk, executor.map(clone, chunk)):
+                stats[status] += 1
+                if status == "skipped":
+                    err.write(f"skipping invalid source entry: {cpv}")
+                    continue
+                valid.add(cpv)
+                if status == "updated" and options.verbosity > 0:
+                    out.write(f"updating {cpv}")
+
+    if options.delete:
+        for cpv in list(target.keys()):
+            if cpv not in valid:
+                if options.verbosity > 0:
+                    out.write(f"deleting {cpv}")
+                del target[cpv]
+                stats["deleted"] += 1
+    target.commit()
+
+    if options.verbosity >= 0:
+        elapsed = time.time() - start
+        total = sum(stats[x] for x in ("updated", "unchanged", "skipped"))
+        out.write(
+            f"processed {total} entries in {elapsed:.2f} seconds "
+            f"({total / max(elapsed, 0.001):.0f} entries/s): "
+            f"{stats['updated']} updated, {stats['unchanged']} unchanged, "
+            f"{stats['deleted']} deleted, {stats['skipped']} skipped"
+        )
@@ -1,31 +1,37 @@
 """system/repository maintenance utility"""
 
 import argparse
+import json
 import logging
 import os
 import textwrap
 import time
+from collections import defaultdict
 from multiprocessing import cpu_count
 
+from snakeoil.chksum import get_handlers
 from snakeoil.cli import arghparse
 from snakeoil.contexts import patch
 from snakeoil.fileutils import AtomicWriteFile
-from snakeoil.osutils import pjoin
+from snakeoil.osutils import listdir_files, pjoin
 from snakeoil.sequences import iter_stable_unique
 
+from ..cache import sqlite
 from ..cache.flat_hash import md5_cache
 from ..ebuild import repository as ebuild_repo
 from ..ebuild import triggers
 from ..ebuild.cpv import CPV
 from ..ebuild.eclass import EclassDoc
 from ..exceptions import PkgcoreUserException
+from ..fetch import base as fetch_base
 from ..fs import contents, livefs
 from ..merge import triggers as merge_triggers
 from ..operations import OperationError
 from ..operations import observer as observer_mod
+from ..operations import regen as regen_mod
 from ..package import mutated
-from ..package.errors import MetadataException
-from ..util import commandline
+from ..package.errors import MetadataException, ParseChksumError
+from ..util import commandline, multihash
 
 pkgcore_opts = commandline.ArgumentParser(domain=False, script=(__file__, __name__))
 argparser = commandline.ArgumentParser(
@@ -337,6 +343,19 @@ regen_opts.add_argument(
         available processors.
     """,
 )
+regen_opts.add_argument(
+    "-p",
+    "--processes",
+    type=arghparse.positive_int,
+    default=1,
+    help="number of worker processes to use",
+    docs="""
+        Number of worker processes to use for regeneration. Each worker owns
+        its own ebuild processor and writes the metadata it generates directly
+        to the cache, avoiding python-side contention between threads. When
+        enabled, this overrides --threads.
+    """,
+)
 regen_opts.add_argument(
     "--force",
     action="store_true",
@@ -349,6 +368,55 @@ regen_opts.add_argument(
     type=arghparse.create_dir,
     help="use separate directory to store repository caches",
 )
+regen_opts.add_argument(
+    "--cache-backend",
+    choices=("flat", "sqlite"),
+    default="flat",
+    help="cache backend to use with --dir",
+    docs="""
+        Cache backend used for repository caches stored in a separate
+        directory via --dir. The ``flat`` backend stores one file per package
+        version (md5-cache layout) while the ``sqlite`` backend packs all
+        entries into a single indexed file. When a new sqlite cache is created,
+        it's seeded from the repo's existing md5-cache if one exists so a full
+        regeneration isn't required.
+    """,
+)
+regen_opts.add_argument(
+    "--since",
+    metavar="COMMIT",
+    help="only regenerate packages changed since a given git commit",
+    docs="""
+        Only regenerate cache entries for ebuilds changed since the given git
+        commit and for packages inheriting eclasses changed since then.
+
+        By default, caches record the git state of the repo (and its masters)
+        they were generated from, allowing later runs to only regenerate
+        changed packages automatically. This option overrides the recorded
+        state for the repo itself. A full regeneration is performed if the
+        repo isn't a git repo, the recorded state is missing or doesn't match,
+        or ``metadata/layout.conf`` changed.
+    """,
+)
+regen_opts.add_argument(
+    "--profile-out",
+    metavar="FILE",
+    help="write per-package regen timings to a JSON file",
+    docs="""
+        Record the wall time spent sourcing each regenerated ebuild along with
+        the eclasses it inherited and which of those were already preloaded
+        by its ebuild processor. The resulting report is written to the given
+        file as JSON keyed by repo, including per-eclass aggregates, and a
+        summary of the slowest packages and eclasses is output.
+    """,
+)
+regen_opts.add_argument(
+    "--profile-top",
+    metavar="N",
+    type=arghparse.positive_int,
+    default=10,
+    help="number of entries shown in profile summaries (default: %(default)s)",
+)
 regen_opts.add_argument(
     "--rsync",
     action="store_true",
@@ -369,17 +437,48 @@ regen_opts.add_argument(
 )
 
 
+def _profile_summary(repo, profile, out, top=10):
+    """Output the slowest packages and eclasses for a regen profile."""
+    if not profile.records:
+        return
+    total = sum(x[1] for x in profile.records)
+    out.write(f"{repo}: profiled {len(profile)} packages in {total:.2f} seconds")
+    out.write("slowest packages:")
+    for cpv, elapsed, inherited, preloaded in profile.slowest(top):
+        sourced = len(inherited) - len(preloaded)
+        out.write(
+            f"  {elapsed:8.3f}s  {cpv} "
+            f"({len(inherited)} eclasses, {sourced} not preloaded)"
+        )
+    eclasses = sorted(
+        profile.eclass_stats().items(), key=lambda x: x[1]["time"], reverse=True
+    )
+    if eclasses:
+        out.write("costliest eclasses:")
+        for eclass, data in eclasses[:top]:
+            out.write(
+                f"  {data['time']:8.3f}s  {eclass} ({data['packages']} packages, "
+                f"{data['sourced']} sourced, {data['preloaded']} preloaded)"
+            )
+
+
 @regen.bind_main_func
 def regen_main(options, out, err):
     """Regenerate a repository cache."""
     ret = []
+    profiles = {}
 
     observer = observer_mod.formatter_output(out)
     for repo in iter_stable_unique(options.repos):
         if options.cache_dir is not None:
             # recreate new repo object with cache dir override
-            cache = (md5_cache(pjoin(options.cache_dir.rstrip(os.sep), repo.repo_id)),)
-            repo = ebuild_repo.tree(options.config, repo.config, cache=cache)
+            location = pjoin(options.cache_dir.rstrip(os.sep), repo.repo_id)
+            if options.cache_backend == "sqlite":
+                # new databases are seeded from the repo's md5-cache
+                cache = sqlite.md5_cache(location, seed=repo.location)
+            else:
+                cache = md5_cache(location)
+            repo = ebuild_repo.tree(options.config, repo.config, cache=(cache,))
         if not repo.operations.supports("regen_cache"):
             out.write(f"repo {repo} doesn't support cache regeneration")
             continue
@@ -387,13 +486,21 @@ def regen_main(options, out, err):
             out.write(f"skipping repo {repo}: cache disabled")
             continue
 
+        profile = None
+        if options.profile_out is not None:
+            profile = profiles[repo.repo_id] = regen_mod.RegenProfile()
+
         start_time = time.time()
         ret.append(
             repo.operations.regen_cache(
                 threads=options.threads,
+                processes=options.processes,
                 observer=observer,
                 force=options.force,
+                since=options.since,
                 eclass_caching=(not options.disable_eclass_caching),
+                profile=profile,
+                metadata_index=True,
             )
         )
         end_time = time.time()
@@ -402,6 +509,8 @@ def regen_main(options, out, err):
             out.write(
                 "finished %d nodes in %.2f seconds" % (len(repo), end_time - start_time)
             )
+        if profile is not None:
+            _profile_summary(repo.repo_id, profile, out, top=options.profile_top)
 
         if options.rsync:
             timestamp = pjoin(repo.location, "metadata", "timestamp.chk")
@@ -419,9 +528,234 @@ def regen_main(options, out, err):
         if options.pkg_desc_index:
             ret.append(update_pkg_desc_index(repo, observer))
 
+    if options.profile_out is not None:
+        report = {repo_id: x.report() for repo_id, x in profiles.items()}
+        try:
+            with open(options.profile_out, "w") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            err.write(f"failed writing profile {options.profile_out!r}: {e.strerror}")
+            ret.append(os.EX_IOERR)
+
     return int(any(ret))
 
 
+cache = subparsers.add_parser(
+    "cache",
+    parents=shared_options_domain,
+    description="verify repository caches",
+    docs="""
+        Verify repository cache entries against their ebuilds and eclasses,
+        reporting stale entries that don't match the current checksums,
+        orphaned entries for ebuilds that no longer exist, and corrupted
+        entries that can't be parsed. Returns a nonzero exit status if any
+        unresolved issues were found.
+    """,
+)
+cache.add_argument(
+    "repos",
+    metavar="repo",
+    nargs="*",
+    action=commandline.StoreRepoObject,
+    repo_type="source-raw",
+    allow_external_repos=True,
+    help="repo(s) to verify caches for",
+)
+cache_opts = cache.add_argument_group("subcommand options")
+cache_opts.add_argument(
+    "--prune",
+    action="store_true",
+    default=False,
+    help="remove stale, orphaned, and corrupted entries",
+)
+cache_opts.add_argument(
+    "-t",
+    "--threads",
+    type=arghparse.positive_int,
+    default=arghparse.DelayedValue(_get_default_jobs, 100),
+    help="number of categories to scan in parallel",
+)
+cache_opts.add_argument(
+    "--dir",
+    dest="cache_dir",
+    type=arghparse.existent_dir,
+    help="verify repository caches stored in a separate directory",
+)
+cache_opts.add_argument(
+    "--cache-backend",
+    choices=("flat", "sqlite"),
+    default="flat",
+    help="cache backend to use with --dir",
+)
+cache_opts.add_argument(
+    "--format",
+    choices=("text", "json"),
+    default="text",
+    help="output format",
+    docs="""
+        Output format for the verification summary. The ``json`` format
+        outputs a list of mappings, one per cache, containing the repo id,
+        cache location, entry counts, and the stale, orphaned, and corrupted
+        entries found.
+    """,
+)
+
+
+@cache.bind_main_func
+def cache_main(options, out, err):
+    """Verify repository caches."""
+    ret = 0
+    summaries = []
+
+    if options.format == "json":
+        observer = observer_mod.null_output()
+    else:
+        observer = observer_mod.formatter_output(out)
+    for repo in iter_stable_unique(options.repos):
+        if options.cache_dir is not None:
+            location = pjoin(options.cache_dir.rstrip(os.sep), repo.repo_id)
+            if options.cache_backend == "sqlite":
+                repo_cache = sqlite.md5_cache(location)
+            else:
+                repo_cache = md5_cache(location)
+            repo = ebuild_repo.tree(options.config, repo.config, cache=(repo_cache,))
+        if not repo.operations.supports("verify_cache"):
+            err.write(f"repo {repo} doesn't support cache verification")
+            continue
+
+        try:
+            results = repo.operations.verify_cache(
+                observer=observer, prune=options.prune, threads=options.threads
+            )
+        except OperationError as e:
+            cache.error(str(e))
+
+        for summary in results:
+            problems = sum(len(summary[x]) for x in ("stale", "orphaned", "corrupted"))
+            if problems > summary["pruned"]:
+                ret = 1
+            summaries.append(summary)
+            if options.format == "text":
+                msg = (
+                    f"{summary['repo']}: {summary['cache']}: "
+                    f"{summary['entries']} entries, {summary['valid']} valid, "
+                    f"{len(summary['stale'])} stale, "
+                    f"{len(summary['orphaned'])} orphaned, "
+                    f"{len(summary['corrupted'])} corrupted"
+                )
+                if options.prune:
+                    msg += f", {summary['pruned']} pruned"
+                out.write(msg)
+
+    if options.format == "json":
+        out.write(json.dumps(summaries, indent=2, sort_keys=True))
+    return ret
+
+
+distfiles = subparsers.add_parser(
+    "distfiles",
+    parents=shared_options_domain,
+    description="rebuild the verified distfile database",
+    docs="""
+        Rehash all files in the distdir listed in the Manifest files of the
+        given repos, replacing the database of verified checksums used to skip
+        rehashing unchanged distfiles during fetching. Files with checksums
+        that don't match their Manifest entries are reported and left out of
+        the database. Returns a nonzero exit status if any mismatches were
+        found.
+    """,
+)
+distfiles.add_argument(
+    "repos",
+    metavar="repo",
+    nargs="*",
+    action=commandline.StoreRepoObject,
+    repo_type="source-raw",
+    allow_external_repos=True,
+    help="repo(s) to use Manifest checksums from",
+)
+distfiles_opts = distfiles.add_argument_group("subcommand options")
+distfiles_opts.add_argument(
+    "-t",
+    "--threads",
+    type=arghparse.positive_int,
+    default=arghparse.DelayedValue(_get_default_jobs, 100),
+    help="number of files to hash in parallel",
+)
+
+
+@distfiles.bind_main_func
+def distfiles_main(options, out, err):
+    """Rebuild the verified distfile database."""
+    distdir = options.domain.distdir
+    try:
+        files = set(listdir_files(distdir))
+    except FileNotFoundError:
+        files = set()
+
+    # collect the expected chksums of all known distfiles
+    expected = {}
+    seen = set()
+    for repo in iter_stable_unique(options.repos):
+        for pkg in repo:
+            if (manifest := getattr(pkg, "manifest", None)) is None:
+                continue
+            if (key := (repo.repo_id, pkg.key)) in seen:
+                continue
+            seen.add(key)
+            try:
+                manifest_distfiles = manifest.distfiles
+            except (MetadataException, ParseChksumError) as e:
+                err.write(f"{pkg.key}::{repo.repo_id}: {e}")
+                continue
+            for filename, chksums in manifest_distfiles.items():
+                if filename in files:
+                    expected.setdefault(filename, chksums)
+
+    # group files by chksum types to hash each group in a single pass
+    handlers = get_handlers()
+    groups = defaultdict(list)
+    stats = {}
+    for filename, chksums in expected.items():
+        path = pjoin(distdir, filename)
+        try:
+            stats[path] = os.stat(path)
+        except EnvironmentError as e:
+            err.write(f"{filename}: {e}")
+            continue
+        # check sizes first for clearer mismatch reports
+        chfs = set(chksums).intersection(handlers)
+        chfs = tuple(sorted(chfs, key=lambda x: (x != "size", x)))
+        if chfs:
+            groups[chfs].append(path)
+
+    stamps = fetch_base.distfile_stamps(distdir)
+    stamps.clear()
+    verified = failed = 0
+    for chfs, paths in groups.items():
+        for path, result in multihash.hash_files(paths, chfs, options.threads):
+            filename = os.path.basename(path)
+            if isinstance(result, EnvironmentError):
+                err.write(f"{filename}: {result}")
+                failed += 1
+                continue
+            for chf, val in result.items():
+                if val != expected[filename][chf]:
+                    err.write(f"{filename}: {chf} checksum mismatch")
+                    failed += 1
+                    break
+            else:
+                stamps.update(path, stats[path], result)
+                verified += 1
+    stamps.flush()
+
+    out.write(
+        f"{distdir}: {verified} verified, {failed} failed, "
+        f"{len(files) - len(expected)} unknown"
+    )
+    return int(bool(failed))
+
+
 env_update = subparsers.add_parser(
     "env-update", description="update env.d and ldconfig", parents=shared_options_domain
 )
@@ -6,11 +6,13 @@ source or binary packages.
 """
 
 import sys
+import threading
+from contextlib import nullcontext
 from functools import partial
 from textwrap import dedent
 from time import time
 
-from snakeoil.cli.exceptions import ExitException
+from snakeoil.cli import arghparse
 from snakeoil.sequences import iflatten_instance, stable_unique
 from snakeoil.strings import pluralism
 
@@ -18,10 +20,13 @@ from ..config.basics import ConfigSectionFromStringDict
 from ..ebuild import resolver, restricts
 from ..ebuild.atom import atom
 from ..ebuild.misc import run_sanity_checks
+from ..fetch import fetchable
+from ..fetch.pipeline import FetchPipeline, HostLimiter
 from ..merge import errors as merge_errors
 from ..operations import format, observer
 from ..repository.util import get_raw_repos
 from ..repository.virtual import RestrictionRepo
+from ..resolver import scheduler
 from ..resolver.util import reduce_to_failures
 from ..restrictions import packages
 from ..restrictions.boolean import OrRestriction
@@ -317,6 +322,72 @@ resolution_options.add_argument(
     docs="""
         Skip failures during the following phases: sanity checks
         (pkg_pretend), fetching, dep resolution, and (un)merging.
+
+        When running multiple jobs, only packages depending on failed
+        packages are skipped.
+    """,
+)
+resolution_options.add_argument(
+    "-j",
+    "--jobs",
+    type=arghparse.positive_int,
+    default=1,
+    help="number of packages to build concurrently",
+    docs="""
+        Build up to the given number of packages in parallel, each using its
+        own ebuild processor. Packages are only built once all the packages
+        from the resolved plan they depend on have been merged while merges to
+        the livefs are always performed one at a time.
+    """,
+)
+resolution_options.add_argument(
+    "-l",
+    "--load-average",
+    type=float,
+    metavar="LOAD",
+    help="don't start new builds when the load average is too high",
+    docs="""
+        Don't start building further packages while other packages are being
+        built and the system load average is at least the given value.
+    """,
+)
+resolution_options.add_argument(
+    "--fetch-jobs",
+    type=arghparse.positive_int,
+    metavar="JOBS",
+    help="number of distfiles to fetch concurrently in the background",
+    docs="""
+        Start fetching the distfiles for all packages in the resolved plan in
+        the background once the plan is accepted, downloading up to the given
+        number of files at once. Builds only wait for their own distfiles to be
+        fetched.
+
+        Download progress is periodically reported when the native-fetch
+        feature is enabled; external FETCHCOMMAND fetchers only report when
+        each file starts and finishes.
+
+        By default, distfiles are fetched right before each package is built.
+    """,
+)
+resolution_options.add_argument(
+    "--fetch-host-connections",
+    type=arghparse.positive_int,
+    default=2,
+    metavar="CONNECTIONS",
+    help="maximum number of concurrent background fetches per host",
+    docs="""
+        Limit the number of concurrent connections to each mirror or upstream
+        host when using --fetch-jobs.
+    """,
+)
+resolution_options.add_argument(
+    "--force-verify",
+    action="store_true",
+    help="fully verify distfiles, ignoring recorded checksums",
+    docs="""
+        Rehash all distfiles when verifying them instead of trusting the
+        checksums recorded for files that haven't changed since they were last
+        verified.
     """,
 )
 resolution_options.add_argument(
@@ -1121,134 +1192,200 @@ def main(options, out, err):
         return
 
     change_count = len(changes)
+    positions = {id(op): i for i, op in enumerate(changes)}
+    parallel = not options.fetchonly and (
+        options.jobs > 1 or options.load_average is not None
+    )
+    # concurrent fetches of the same distfiles would clobber each other
+    fetch_lock = threading.Lock() if parallel else nullcontext()
 
-    # left in place for ease of debugging.
-    cleanup = []
-    try:
-        for count, op in enumerate(changes):
-            for func in cleanup:
-                func()
+    def build(op, cleanup):
+        """Fetch and build a package, returning the package to merge.
 
-            cleanup = []
+        :return: the package to merge, None if nothing is left to do for the
+            package, or False on failure
+        """
+        cleanup.append(op.pkg.release_cached_data)
 
-            out.write(
-                f"\nProcessing {count + 1} of {change_count}: "
-                f"{op.pkg.cpvstr}::{op.pkg.repo}"
+        if not options.fetchonly and options.debug:
+            out.write("Forcing a clean of workdir")
+
+        pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
+        out.write(
+            f"\n{len(op.pkg.distfiles)} file{pluralism(op.pkg.distfiles)} required-"
+        )
+        if pipeline is not None:
+            pipeline.wait(pkg_fetchables(op.pkg))
+        with fetch_lock:
+            fetched = pkg_ops.run_if_supported(
+                "fetch", or_return=True, force_verify=options.force_verify
             )
-            out.title(f"{count + 1}/{change_count}: {op.pkg.cpvstr}")
-            if op.desc != "remove":
-                cleanup.append(op.pkg.release_cached_data)
+        if not fetched:
+            out.error(f"fetching failed for {op.pkg.cpvstr}")
+            return False
+        if options.fetchonly:
+            return None
 
-                if not options.fetchonly and options.debug:
-                    out.write("Forcing a clean of workdir")
+        buildop = pkg_ops.run_if_supported("build", or_return=None)
+        pkg = op.pkg
+        if buildop is not None:
+            out.write(f"building {op.pkg.cpvstr}")
+            result = False
+            try:
+                result = buildop.finalize()
+            except format.BuildError as e:
+                out.error(f"caught exception building {op.pkg.cpvstr}: {e}")
+            else:
+                if result is False:
+                    out.error(f"failed building {op.pkg.cpvstr}")
+            if result is False:
+                return False
+            pkg = result
+            cleanup.append(pkg.release_cached_data)
+            pkg_ops = domain.get_pkg_operations(pkg, observer=build_obs)
+            cleanup.append(buildop.cleanup)
+
+        cleanup.append(partial(pkg_ops.run_if_supported, "cleanup"))
+        # pkg_ops isn't reset after localizing, so it could have the wrong set
+        # of ops and must not be used further.
+        return pkg_ops.run_if_supported("localize", or_return=pkg)
+
+    def merge(op, pkg, cleanup):
+        """Merge a package to the livefs, updating the world file as required.
+
+        :return: True on success, otherwise False
+        """
+        if op.desc != "remove":
+            out.write()
+            if op.desc == "replace":
+                if op.old_pkg == pkg:
+                    out.write(f">>> Reinstalling {pkg.cpvstr}")
+                else:
+                    out.write(f">>> Replacing {op.old_pkg.cpvstr} with {pkg.cpvstr}")
+                i = domain.replace_pkg(op.old_pkg, pkg, repo_obs)
+                cleanup.append(op.old_pkg.release_cached_data)
+            else:
+                out.write(f">>> Installing {pkg.cpvstr}")
+                i = domain.install_pkg(pkg, repo_obs)
+        else:
+            out.write(f">>> Removing {op.pkg.cpvstr}")
+            i = domain.uninstall_pkg(op.pkg, repo_obs)
+        try:
+            i.finish()
+        except merge_errors.BlockModification as e:
+            out.error(f"Failed to merge {op.pkg}: {e}")
+            return False
+
+        if world_set is not None:
+            if op.desc == "remove":
+                out.write(f">>> Removing {op.pkg.cpvstr} from world file")
+                removal_pkg = slotatom_if_slotted(
+                    source_repos.combined, op.pkg.versioned_atom
+                )
+                update_worldset(world_set, removal_pkg, remove=True)
+            elif not options.oneshot and any(x.match(op.pkg) for x in atoms):
+                if not (options.upgrade or options.downgrade):
+                    out.write(f">>> Adding {op.pkg.cpvstr} to world file")
+                    add_pkg = slotatom_if_slotted(
+                        source_repos.combined, op.pkg.versioned_atom
+                    )
+                    update_worldset(world_set, add_pkg)
+        return True
 
-                pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
-                out.write(
-                    f"\n{len(op.pkg.distfiles)} file{pluralism(op.pkg.distfiles)} required-"
+    def announce(op):
+        count = positions[id(op)]
+        out.write(
+            f"\nProcessing {count + 1} of {change_count}: "
+            f"{op.pkg.cpvstr}::{op.pkg.repo}"
+        )
+        out.title(f"{count + 1}/{change_count}: {op.pkg.cpvstr}")
+
+    def pkg_fetchables(pkg):
+        # fetch restricted distfiles are left for pkg_nofetch to handle
+        if "fetch" in getattr(pkg, "restrict", ()):
+            return ()
+        return tuple(iflatten_instance(getattr(pkg, "fetchables", ()), fetchable))
+
+    pipeline = None
+    if options.fetch_jobs is not None:
+        limiter = HostLimiter(options.fetch_host_connections)
+        pipeline = FetchPipeline(options.fetch_jobs, observer=build_obs)
+        for op in changes:
+            if op.desc == "remove":
+                continue
+            pkg_ops = domain.get_pkg_operations(op.pkg)
+            if pkg_ops.supports("fetch"):
+                fetch_func = partial(
+                    pkg_ops.fetch,
+                    observer=observer.null_output(),
+                    limiter=limiter,
+                    force_verify=options.force_verify,
+                    progress=pipeline.progress,
                 )
-                if not pkg_ops.run_if_supported("fetch", or_return=True):
-                    out.error(f"fetching failed for {op.pkg.cpvstr}")
+                pipeline.submit(pkg_fetchables(op.pkg), fetch_func)
+
+    with pipeline if pipeline is not None else nullcontext():
+        if not parallel:
+            # left in place for ease of debugging.
+            cleanup = []
+            for op in changes:
+                for func in cleanup:
+                    func()
+                cleanup = []
+
+                announce(op)
+                pkg = None
+                if op.desc != "remove":
+                    pkg = build(op, cleanup)
+                    if pkg is None:
+                        continue
+                if pkg is False or not merge(op, pkg, cleanup):
                     if not options.ignore_failures:
                         return 1
-                    continue
-                if options.fetchonly:
-                    continue
-
-                buildop = pkg_ops.run_if_supported("build", or_return=None)
-                pkg = op.pkg
-                if buildop is not None:
-                    out.write(f"building {op.pkg.cpvstr}")
-                    result = False
-                    exc = None
-                    try:
-                        result = buildop.finalize()
-                    except format.BuildError as e:
-                        out.error(f"caught exception building {op.pkg.cpvstr}: {e}")
-                        exc = e
-                    else:
-                        if result is False:
-                            out.error(f"failed building {op.pkg.cpvstr}")
-                    if result is False:
-                        if not options.ignore_failures:
-                            raise ExitException(1) from exc
-                        continue
-                    pkg = result
-                    cleanup.append(pkg.release_cached_data)
-                    pkg_ops = domain.get_pkg_operations(pkg, observer=build_obs)
-                    cleanup.append(buildop.cleanup)
-
-                cleanup.append(partial(pkg_ops.run_if_supported, "cleanup"))
-                pkg = pkg_ops.run_if_supported("localize", or_return=pkg)
-                # wipe this to ensure we don't inadvertantly use it further down;
-                # we aren't resetting it after localizing, so could have the wrong
-                # set of ops.
-                del pkg_ops
 
-                out.write()
-                if op.desc == "replace":
-                    if op.old_pkg == pkg:
-                        out.write(f">>> Reinstalling {pkg.cpvstr}")
-                    else:
-                        out.write(
-                            f">>> Replacing {op.old_pkg.cpvstr} with {pkg.cpvstr}"
-                        )
-                    i = domain.replace_pkg(op.old_pkg, pkg, repo_obs)
-                    cleanup.append(op.old_pkg.release_cached_data)
-                else:
-                    out.write(f">>> Installing {pkg.cpvstr}")
-                    i = domain.install_pkg(pkg, repo_obs)
+            # the final run from the loop above doesn't invoke cleanups;
+            # we could ignore it, but better to run it to ensure nothing is
+            # inadvertantly held on the way out of this function.
+            # makes heappy analysis easier if we're careful about it.
+            for func in cleanup:
+                func()
 
-                # force this explicitly- can hold onto a helluva lot more
-                # then we would like.
-            else:
-                out.write(f">>> Removing {op.pkg.cpvstr}")
-                i = domain.uninstall_pkg(op.pkg, repo_obs)
-            try:
-                ret = i.finish()
-            except merge_errors.BlockModification as e:
-                out.error(f"Failed to merge {op.pkg}: {e}")
-                if not options.ignore_failures:
-                    return 1
-                continue
+            # and wipe the reference to the functions to allow things to fall out of
+            # memory.
+            cleanup = []
+            return 0
 
-            # while this does get handled through each loop, wipe it now; we don't need
-            # that data, thus we punt it now to keep memory down.
-            # for safety sake, we let the next pass trigger a release also-
-            # mainly to protect against any code following triggering reloads
-            # basically, be protective
+        cleanups = {}
 
-            if world_set is not None:
-                if op.desc == "remove":
-                    out.write(f">>> Removing {op.pkg.cpvstr} from world file")
-                    removal_pkg = slotatom_if_slotted(
-                        source_repos.combined, op.pkg.versioned_atom
-                    )
-                    update_worldset(world_set, removal_pkg, remove=True)
-                elif not options.oneshot and any(x.match(op.pkg) for x in atoms):
-                    if not (options.upgrade or options.downgrade):
-                        out.write(f">>> Adding {op.pkg.cpvstr} to world file")
-                        add_pkg = slotatom_if_slotted(
-                            source_repos.combined, op.pkg.versioned_atom
-                        )
-                        update_worldset(world_set, add_pkg)
-
-    #    again... left in place for ease of debugging.
-    #    except KeyboardInterrupt:
-    #        import pdb;pdb.set_trace()
-    #    else:
-    #        import pdb;pdb.set_trace()
-    finally:
-        pass
-
-    # the final run from the loop above doesn't invoke cleanups;
-    # we could ignore it, but better to run it to ensure nothing is
-    # inadvertantly held on the way out of this function.
-    # makes heappy analysis easier if we're careful about it.
-    for func in cleanup:
-        func()
-
-    # and wipe the reference to the functions to allow things to fall out of
-    # memory.
-    cleanup = []
-
-    return 0
+        def build_job(op):
+            if op.desc == "remove":
+                return None
+            cleanup = cleanups[id(op)] = []
+            pkg = build(op, cleanup)
+            if pkg is False:
+                for func in cleanup:
+                    func()
+            return pkg
+
+        def merge_job(op, pkg):
+            cleanup = cleanups.setdefault(id(op), [])
+            try:
+                return merge(op, pkg, cleanup)
+            finally:
+                # force this explicitly- can hold onto a helluva lot more
+                # then we would like.
+                for func in cleanups.pop(id(op)):
+                    func()
+
+        sched = scheduler.BuildScheduler(
+            changes,
+            jobs=options.jobs,
+            load_average=options.load_average,
+            ignore_failures=options.ignore_failures,
+        )
+        if not sched.run(build_job, merge_job, start=announce):
+            for op in sched.skipped:
+                out.warn(f"skipped {op.pkg.cpvstr} due to failures")
+            if not options.ignore_failures:
+                return 1
+        return 0
@@ -24,6 +24,7 @@ from snakeoil.osutils import sizeof_fmt
 from snakeoil.sequences import iter_stable_unique
 
 from ..ebuild import atom, conditionals
+from ..ebuild.repository import UnconfiguredTree
 from ..fs import fs as fs_module
 from ..repository import multiplex
 from ..repository.util import get_raw_repos, get_virtual_repos
@@ -1180,9 +1181,13 @@ def main(options, out, err):
     if options.query is None:
         return 0
     for repo in options.repos:
+        kwds = {}
+        # skip loading metadata for packages ruled out by ebuild repo indexes
+        if all(isinstance(x, UnconfiguredTree) for x in get_raw_repos(repo)):
+            kwds["metadata_index"] = True
         try:
             for pkgs in pkgutils.groupby_pkg(
-                repo.itermatch(options.query, sorter=sorted)
+                repo.itermatch(options.query, sorter=sorted, **kwds)
             ):
                 pkgs = list(pkgs)
                 if options.noversion:
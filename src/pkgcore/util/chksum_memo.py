@@ -0,0 +1,283 @@
+"""
+persistent memoization of file checksums keyed on stat data
+
+Files are identified by their path (relative to a root directory) and
+validated via (st_dev, st_ino, st_size, st_mtime_ns), allowing unchanged files
+to skip rehashing across processes at the cost of a single stat call. Secure
+memos additionally track st_ctime_ns since unlike mtime it can't be reset from
+userspace after modifying a file.
+"""
+
+__all__ = ("ChksumMemo", "get_memo")
+
+import atexit
+import os
+import stat
+import threading
+from collections import OrderedDict
+
+from snakeoil.chksum import get_handler
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs, pjoin
+
+from .. import const
+from ..log import logger
+
+MEMO_HEADER = "# pkgcore chksum memo v1"
+
+
+def stat_key(st):
+    """Return the tuple used to validate memoized entries for a stat result."""
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def trusted_file(st):
+    """Check if a file is owned by the current user and only writable by it."""
+    return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class ChksumMemo:
+    """Bounded, persistent mapping of file stat signatures to checksums.
+
+    :ivar path: on disk location of the memo file
+    :ivar root: directory all tracked paths are relative to; if the memo was
+        written for a different root (e.g. the repo was moved) all
+        entries are discarded on load.
+    :ivar max_entries: maximum number of entries to retain, least recently
+        used entries are dropped first.
+    :ivar secure: only load memo files owned by the current effective user
+        that aren't group or world writable and validate entries against
+        inode change times, for memos trusted in place of verifying checksums.
+    """
+
+    default_max_entries = 100000
+
+    def __init__(self, path, root, max_entries=None, secure=False):
+        self.path = path
+        self.secure = secure
+        self.root = root.rstrip(os.sep)
+        if max_entries is None:
+            max_entries = self.default_max_entries
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+        # changes since loading, merged with the on disk memo when flushing
+        self._updated = set()
+        self._discarded = set()
+        self._cleared = False
+
+    def _stat_key(self, st):
+        if self.secure:
+            return stat_key(st) + (st.st_ctime_ns,)
+        return stat_key(st)
+
+    def _relpath(self, path):
+        prefix = self.root + os.sep
+        if path.startswith(prefix) and not any(x in path for x in "\t\n"):
+            return path[len(prefix) :]
+        return None
+
+    def _load(self):
+        entries = OrderedDict()
+        try:
+            with open(self.path) as f:
+                if self.secure and not trusted_file(os.fstat(f.fileno())):
+                    logger.warning("ignoring untrusted chksum memo: %r", self.path)
+                    return entries
+                header = f.readline().rstrip("\n").split("\t")
+                if header != [MEMO_HEADER, self.root]:
+                    # unknown format or the root location changed
+                    return entries
+                for line in f:
+                    try:
+                        relpath, *stat_data, chksums = line.rstrip("\n").split("\t")
+                        d = {}
+                        for item in chksums.split():
+                            chf, val = item.split("=", 1)
+                            d[chf] = get_handler(chf).str2long(val)
+                        entries[relpath] = (tuple(map(int, stat_data)), d)
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+        except (EnvironmentError, UnicodeDecodeError) as e:
+            logger.debug("failed reading chksum memo %r: %s", self.path, e)
+        return entries
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def get(self, path, st):
+        """Return the memoized checksums for a file.
+
+        :param path: absolute path to the file
+        :param st: stat result for the file
+        :return: mapping of checksum type to value, empty if the file is
+            unknown or its stat data changed
+        """
+        if (relpath := self._relpath(path)) is None:
+            return {}
+        entries = self.entries
+        with self._lock:
+            entry = entries.get(relpath)
+            if entry is None or entry[0] != self._stat_key(st):
+                return {}
+            entries.move_to_end(relpath)
+            return dict(entry[1])
+
+    def update(self, path, st, chksums):
+        """Memoize checksums for a file.
+
+        Existing checksums for the file are kept as long as its stat data
+        hasn't changed.
+
+        :param path: absolute path to the file
+        :param st: stat result for the file taken before its checksums were
+            computed
+        :param chksums: mapping of checksum type to value
+        """
+        if not chksums or (relpath := self._relpath(path)) is None:
+            return
+        key = self._stat_key(st)
+        entries = self.entries
+        with self._lock:
+            entry = entries.get(relpath)
+            if entry is not None and entry[0] == key:
+                d = entry[1]
+                if all(d.get(k) == v for k, v in chksums.items()):
+                    entries.move_to_end(relpath)
+                    return
+                d.update(chksums)
+            else:
+                d = dict(chksums)
+            entries[relpath] = (key, d)
+            entries.move_to_end(relpath)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._updated.add(relpath)
+            self._discarded.discard(relpath)
+            self._dirty = True
+
+    def discard(self, path):
+        """Drop any memoized data for a file."""
+        if (relpath := self._relpath(path)) is None:
+            return
+        with self._lock:
+            if self.entries.pop(relpath, None) is not None:
+                self._updated.discard(relpath)
+                self._discarded.add(relpath)
+                self._dirty = True
+
+    def clear(self):
+        """Drop all memoized data."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self._updated.clear()
+            self._discarded.clear()
+            self._cleared = True
+            self._dirty = True
+
+    def _merge(self):
+        """Merge changes into the current on disk memo.
+
+        Other processes (e.g. forked regen workers) may have written the memo
+        since it was loaded, so only entries changed here override it.
+        """
+        if self._cleared:
+            return self._entries
+        entries = self._load()
+        for relpath in self._discarded:
+            entries.pop(relpath, None)
+        for relpath in self._updated:
+            if (entry := self._entries.get(relpath)) is not None:
+                entries[relpath] = entry
+                entries.move_to_end(relpath)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return entries
+
+    def flush(self):
+        """Write the memo to disk if it was modified."""
+        with self._lock:
+            if not self._dirty:
+                return
+            f = None
+            try:
+                ensure_dirs(os.path.dirname(self.path), mode=0o755)
+                self._entries = self._merge()
+                f = AtomicWriteFile(self.path, perms=0o644)
+                f.write(f"{MEMO_HEADER}\t{self.root}\n")
+                for relpath, (stat_data, chksums) in self._entries.items():
+                    chksums = " ".join(
+                        f"{chf}={get_handler(chf).long2str(val)}"
+                        for chf, val in sorted(chksums.items())
+                    )
+                    stat_data = "\t".join(map(str, stat_data))
+                    f.write(f"{relpath}\t{stat_data}\t{chksums}\n")
+                f.close()
+                self._dirty = False
+                self._updated.clear()
+                self._discarded.clear()
+                self._cleared = False
+            except EnvironmentError as e:
+                logger.debug("failed writing chksum memo %r: %s", self.path, e)
+            finally:
+                if f is not None:
+                    f.discard()
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d["_lock"]
+        d["_entries"] = None
+        d["_dirty"] = False
+        d["_updated"] = set()
+        d["_discarded"] = set()
+        d["_cleared"] = False
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__ = state.copy()
+        self._lock = threading.Lock()
+
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+
+def get_memo(kind, name, root, cache_dir=None, secure=False):
+    """Return the shared memo for a given name, creating it if necessary.
+
+    Memos are stored under the user cache directory by default and written
+    out at exit.
+
+    :param kind: memo type, used as the subdirectory for the memo file
+    :param name: unique name for the memo, e.g. a repo id
+    :param root: directory all memoized paths are relative to
+    :param cache_dir: if not None, directory to store the memo under instead
+        of the user cache directory
+    :param secure: see :obj:`ChksumMemo`
+    """
+    if cache_dir is None:
+        cache_dir = const.USER_CACHE_PATH
+    key = (kind, name, root, cache_dir)
+    with _memos_lock:
+        memo = _memos.get(key)
+        if memo is None:
+            filename = name.replace(os.sep, "_").lstrip(".")
+            path = pjoin(cache_dir, kind, filename)
+            memo = _memos[key] = ChksumMemo(path, root, secure=secure)
+        return memo
+
+
+@atexit.register
+def flush_memos():
+    """Write out all modified memos."""
+    with _memos_lock:
+        for memo in _memos.values():
+            memo.flush()
@@ -0,0 +1,185 @@
+"""
+persistent index of repository directory listings keyed on stat data
+
+Listings for a repo's root, category, and package directories are stored
+relative to the repo root and validated via the directory's stat data
+(see :func:`pkgcore.util.chksum_memo.stat_key`), allowing repeated runs to
+replace a directory read per category and package with a single stat call.
+Since directory mtimes change whenever entries are added, removed, or
+renamed, modified directories are always reread.
+"""
+
+__all__ = ("LayoutIndex", "get_index")
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs, pjoin
+
+from .. import const
+from ..log import logger
+from .chksum_memo import stat_key
+
+INDEX_HEADER = "# pkgcore layout index v1"
+
+
+class LayoutIndex:
+    """Bounded, persistent mapping of directories to their listings.
+
+    :ivar path: on disk location of the index file
+    :ivar root: directory all indexed paths are relative to; if the index was
+        written for a different root (e.g. the repo was moved) all entries
+        are discarded on load.
+    :ivar max_entries: maximum number of entries to retain, least recently
+        used entries are dropped first.
+    :ivar racy_window: directories modified within this many nanoseconds of
+        being listed aren't indexed since further changes within the
+        filesystem's timestamp granularity wouldn't alter their mtime.
+    """
+
+    default_max_entries = 200000
+    racy_window = 2 * 10**9
+
+    def __init__(self, path, root, max_entries=None):
+        self.path = path
+        self.root = root.rstrip(os.sep)
+        if max_entries is None:
+            max_entries = self.default_max_entries
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        entries = OrderedDict()
+        try:
+            with open(self.path) as f:
+                header = f.readline().rstrip("\n").split("\t")
+                if header != [INDEX_HEADER, self.root]:
+                    # unknown format or the root location changed
+                    return entries
+                for line in f:
+                    try:
+                        relpath, *stat_data, names = line.rstrip("\n").split("\t", 5)
+                        stat_data = tuple(map(int, stat_data))
+                        if len(stat_data) != 4:
+                            continue
+                        names = tuple(names.split("\t")) if names else ()
+                        entries[relpath] = (stat_data, names)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        except (EnvironmentError, UnicodeDecodeError) as e:
+            logger.debug("failed reading layout index %r: %s", self.path, e)
+        return entries
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def listdir(self, relpath, func):
+        """Return the indexed listing for a directory, updating it as needed.
+
+        :param relpath: directory path relative to the index root, an empty
+            string refers to the root itself
+        :param func: callable passed the absolute directory path returning
+            the directory's listing, invoked when the index entry is missing
+            or stale
+        :return: tuple of names
+        :raises EnvironmentError: if the directory can't be accessed
+        """
+        path = pjoin(self.root, relpath) if relpath else self.root
+        key = stat_key(os.stat(path))
+        entries = self.entries
+        with self._lock:
+            entry = entries.get(relpath)
+            if entry is not None and entry[0] == key:
+                entries.move_to_end(relpath)
+                return entry[1]
+
+        names = tuple(func(path))
+        if (
+            time.time_ns() - key[-1] < self.racy_window
+            or any(x in relpath for x in "\t\n")
+            or any(not x or "\t" in x or "\n" in x for x in names)
+        ):
+            return names
+        with self._lock:
+            entries[relpath] = (key, names)
+            entries.move_to_end(relpath)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._dirty = True
+        return names
+
+    def flush(self):
+        """Write the index to disk if it was modified."""
+        with self._lock:
+            if not self._dirty:
+                return
+            f = None
+            try:
+                ensure_dirs(os.path.dirname(self.path), mode=0o755)
+                f = AtomicWriteFile(self.path)
+                f.write(f"{INDEX_HEADER}\t{self.root}\n")
+                for relpath, (stat_data, names) in self._entries.items():
+                    stat_data = "\t".join(map(str, stat_data))
+                    names = "\t".join(names)
+                    f.write(f"{relpath}\t{stat_data}\t{names}\n")
+                f.close()
+                self._dirty = False
+            except EnvironmentError as e:
+                logger.debug("failed writing layout index %r: %s", self.path, e)
+            finally:
+                if f is not None:
+                    f.discard()
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d["_lock"]
+        d["_entries"] = None
+        d["_dirty"] = False
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__ = state.copy()
+        self._lock = threading.Lock()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name, root):
+    """Return the shared layout index for a given name, creating it if necessary.
+
+    Indexes are stored under the user cache directory and written out at exit.
+
+    :param name: unique name for the index, e.g. a repo id
+    :param root: directory all indexed paths are relative to
+    """
+    key = (name, root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            filename = name.replace(os.sep, "_").lstrip(".")
+            path = pjoin(const.USER_CACHE_PATH, "repo-layout", filename)
+            index = _indexes[key] = LayoutIndex(path, root)
+        return index
+
+
+@atexit.register
+def flush_indexes():
+    """Write out all modified indexes."""
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.flush()
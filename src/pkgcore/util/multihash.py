@@ -0,0 +1,92 @@
+"""
+single pass calculation of multiple checksums
+
+Files are read once in large blocks with every requested hash being updated
+from the same buffer, rather than once per checksum type. Since hashlib
+releases the GIL while hashing large buffers, multiple files can be hashed
+concurrently via threads.
+"""
+
+__all__ = ("new_hashers", "hash_file", "hash_files")
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from snakeoil.chksum import MissingChksumHandler, get_handlers
+
+# read size used when hashing files
+blocksize = 4 << 20
+
+
+def new_hashers(chfs):
+    """Create updatable hash objects for the given checksum types.
+
+    :param chfs: iterable of checksum type names
+    :return: mapping of checksum types to objects supporting ``update()`` and
+        ``hexdigest()``
+    :raise MissingChksumHandler: if a checksum type is unsupported
+    """
+    chfs = tuple(chfs)
+    handlers = get_handlers(chfs)
+    missing = set(chfs).difference(handlers)
+    if missing:
+        raise MissingChksumHandler(f"no handler for {', '.join(sorted(missing))}")
+    return {chf: handler.new()() for chf, handler in handlers.items()}
+
+
+def hash_file(path, chfs):
+    """Calculate multiple checksums for a file while reading it once.
+
+    :param path: file path
+    :param chfs: sequence of checksum type names
+    :return: mapping of checksum types to their values
+    """
+    chfs = tuple(chfs)
+    hashers = new_hashers(x for x in chfs if x != "size")
+    updates = [x.update for x in hashers.values()]
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    size = 0
+    with open(path, "rb", buffering=0) as f:
+        if updates:
+            while n := f.readinto(buf):
+                size += n
+                for update in updates:
+                    update(view[:n])
+        else:
+            size = os.fstat(f.fileno()).st_size
+    chksums = {chf: int(hasher.hexdigest(), 16) for chf, hasher in hashers.items()}
+    chksums["size"] = size
+    return {chf: chksums[chf] for chf in chfs}
+
+
+def _hash_file(path, chfs):
+    try:
+        return path, hash_file(path, chfs)
+    except EnvironmentError as e:
+        return path, e
+
+
+def hash_files(paths, chfs, threads=None):
+    """Calculate multiple checksums for multiple files concurrently.
+
+    :param paths: iterable of file paths
+    :param chfs: sequence of checksum type names
+    :param threads: number of files to hash in parallel, defaults to the
+        number of CPUs
+    :return: iterator of (path, result) tuples in the order given where the
+        result is either a mapping of checksum types to their values or the
+        :obj:`EnvironmentError` raised while reading the file
+    """
+    chfs = tuple(chfs)
+    # check for missing handlers up front instead of per file
+    new_hashers(chfs)
+    paths = list(paths)
+    if threads is None:
+        threads = os.cpu_count() or 1
+    threads = min(threads, len(paths))
+    if threads <= 1:
+        yield from (_hash_file(path, chfs) for path in paths)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        yield from executor.map(_hash_file, paths, [chfs] * len(paths))
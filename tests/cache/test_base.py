@@ -127,6 +127,25 @@ class TestBase:
             cache["spork"]["_eclasses_"]
         )
 
+    def test_get_many(self):
+        cache = self.get_db()
+        cache["cat/spork-1"] = {"foo": "bar"}
+        cache["cat/spork-2"] = {"foo": "bar2"}
+        cache["dog/foon-1"] = {"_eclasses_": {"spork": _chf_obj}}
+        d = cache.get_many(["cat/spork-1", "cat/spork-2", "cat/missing-1"])
+        assert sorted(d) == ["cat/spork-1", "cat/spork-2"]
+        assert d["cat/spork-1"]["foo"] == "bar"
+        assert not cache.get_many([])
+
+        assert sorted(k for k, _ in cache.iter_category("cat")) == [
+            "cat/spork-1",
+            "cat/spork-2",
+        ]
+        ((cpv, entry),) = cache.iter_category("dog")
+        assert cpv == "dog/foon-1"
+        assert entry["_eclasses_"] == [("spork", (("mtime", 100),))]
+        assert not list(cache.iter_category("ca"))
+
     def test_readonly(self):
         cache = self.get_db()
         cache["spork"] = {"foo": "bar"}
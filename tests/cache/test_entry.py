@@ -0,0 +1,68 @@
+import pickle
+
+import pytest
+
+from pkgcore.cache import entry
+
+
+class TestEntry:
+    @pytest.fixture
+    def layout(self):
+        return entry.get_layout(("EAPI", "SLOT", "SRC_URI", "_eclasses_"))
+
+    def test_mapping(self, layout):
+        d = layout({"SLOT": "0", "EAPI": "8"})
+        assert isinstance(d, entry.Entry)
+        assert d == {"EAPI": "8", "SLOT": "0"}
+        assert len(d) == 2
+        assert list(d) == ["EAPI", "SLOT"]
+        assert "SLOT" in d and "SRC_URI" not in d
+        assert d.get("SRC_URI") is None
+        with pytest.raises(KeyError):
+            d["SRC_URI"]
+
+        d["SRC_URI"] = "https://example.com/foo.tar.gz"
+        del d["EAPI"]
+        assert d == {"SLOT": "0", "SRC_URI": "https://example.com/foo.tar.gz"}
+        with pytest.raises(KeyError):
+            del d["EAPI"]
+        assert d.pop("SLOT") == "0"
+        assert len(d) == 1
+
+        # keys outside the layout are supported
+        d["_chf_"] = "chf"
+        assert d["_chf_"] == "chf"
+        assert len(d) == 2
+        assert list(d) == ["SRC_URI", "_chf_"]
+        del d["_chf_"]
+        with pytest.raises(KeyError):
+            del d["_chf_"]
+
+        copy = d.copy()
+        copy["SLOT"] = "1"
+        assert "SLOT" not in d
+
+    def test_interning(self, layout):
+        # build strings at runtime so they aren't interned as constants
+        slot = "".join(["sub", "slot"])
+        uri = "".join(["https://", "example.com"])
+        d1 = layout([("SLOT", slot), ("SRC_URI", uri)])
+        d2 = layout(
+            [
+                ("SLOT", "".join(["sub", "slot"])),
+                ("SRC_URI", "".join(["https://", "example.com"])),
+            ]
+        )
+        assert d1["SLOT"] is d2["SLOT"]
+        # values for rarely shared keys are left alone
+        assert d1["SRC_URI"] is not d2["SRC_URI"]
+
+    def test_layouts(self, layout):
+        assert entry.get_layout(["_eclasses_", "SRC_URI", "SLOT", "EAPI"]) is layout
+        assert entry.get_layout(["SLOT"]) is not layout
+
+    def test_pickle(self, layout):
+        d = layout({"SLOT": "0", "_chf_": 1})
+        d2 = pickle.loads(pickle.dumps(d))
+        assert d2 == d
+        assert d2._layout is layout
@@ -1,6 +1,9 @@
+import os
+import pickle
+
 import pytest
 
-from pkgcore.cache import errors, flat_hash
+from pkgcore.cache import entry, errors, flat_hash
 from snakeoil.chksum import LazilyHashedPath
 
 from . import test_base
@@ -96,3 +99,96 @@ class TestFlatHash:
         for key, raw_data in self.test_data:
             d = dict(raw_data)
             db[key] = d
+
+    @pytest.mark.parametrize("db", (False,), indirect=True)
+    def test_get_many(self, db):
+        key, raw_data = generic_data
+        cpvs = [f"sys-libs/libtrash-{x}" for x in range(db.min_parallel_reads * 2)]
+        for cpv in cpvs:
+            db[cpv] = dict(raw_data)
+        db["sys-apps/portage-1"] = dict(raw_data)
+        # corrupted entries are skipped
+        with open(f"{db.location}/sys-libs/libtrash-0", "w") as f:
+            f.write("garbage")
+
+        d = db.get_many(cpvs + ["sys-libs/missing-1"])
+        assert sorted(d) == sorted(cpvs[1:])
+        assert d[cpvs[1]]["SLOT"] == "0"
+        assert len(d[cpvs[1]]["_eclasses_"]) == 4
+        assert sorted(dict(db.iter_category("sys-libs"))) == sorted(cpvs[1:])
+        assert list(dict(db.iter_category("sys-apps"))) == ["sys-apps/portage-1"]
+        assert not list(db.iter_category("nonexistent"))
+
+    @pytest.mark.parametrize("db", (False,), indirect=True)
+    def test_shared_values(self, db):
+        key, raw_data = generic_data
+        cpvs = [f"sys-libs/libtrash-{x}" for x in range(2)]
+        for cpv in cpvs:
+            db[cpv] = dict(raw_data)
+        entries = [flat_hash.database.__getitem__(db, cpv) for cpv in cpvs]
+        assert isinstance(entries[0], entry.Entry)
+        assert entries[0]["KEYWORDS"] is entries[1]["KEYWORDS"]
+        # reconstructed eclass data is shared as well
+        eclasses = [x["_eclasses_"] for x in entries]
+        assert eclasses[0] == eclasses[1]
+        assert eclasses[0] is not eclasses[1]
+        assert all(x is y for x, y in zip(*eclasses))
+
+    @pytest.mark.parametrize("db", (False,), indirect=True)
+    def test_regen_state(self, db):
+        assert db.get_regen_state() is None
+        key, raw_data = generic_data
+        db[key] = dict(raw_data)
+        db.set_regen_state("state")
+        assert db.get_regen_state() == "state"
+        # state files aren't treated as cache entries
+        assert list(db.keys()) == [key]
+        db.set_regen_state(None)
+        assert db.get_regen_state() is None
+
+    @pytest.mark.parametrize("db", (False,), indirect=True)
+    def test_write_behind(self, db):
+        key, raw_data = generic_data
+        db[key] = dict(raw_data)
+        db.set_write_behind(2)
+        cpvs = [f"sys-libs/libtrash-{x}" for x in range(10)]
+        for cpv in cpvs:
+            db[cpv] = dict(raw_data)
+        del db[key]
+        # queued updates are visible before they're written
+        assert key not in db
+        with pytest.raises(KeyError):
+            db[key]
+        assert db[cpvs[0]]["SLOT"] == "0"
+        assert len(db[cpvs[0]]["_eclasses_"]) == 4
+        db.commit()
+        assert sorted(db.keys()) == sorted(cpvs)
+        assert not [x for x in os.listdir(f"{db.location}/sys-libs") if x[0] == "."]
+        fresh = type(db)(db.location, auxdbkeys=self.cache_keys)
+        assert fresh[cpvs[-1]] == db[cpvs[-1]]
+
+        # disabling write-behind flushes queued updates
+        db[key] = dict(raw_data)
+        db.set_write_behind(0)
+        assert key in fresh
+
+    @pytest.mark.parametrize("db", (False,), indirect=True)
+    def test_write_behind_pickle(self, db):
+        key, raw_data = generic_data
+        db.set_write_behind(10)
+        db[key] = dict(raw_data)
+        db2 = pickle.loads(pickle.dumps(db))
+        db.commit()
+        assert db2[key] == db[key]
+
+    @pytest.mark.parametrize("db", (False,), indirect=True)
+    def test_write_behind_errors(self, db):
+        key, raw_data = generic_data
+        db.set_write_behind(10)
+        with open(f"{db.location}/sys-libs", "w") as f:
+            f.write("blocks category dir")
+        db[key] = dict(raw_data)
+        with pytest.raises(errors.CacheCorruption):
+            db.commit()
+        # errors are only raised once
+        db.commit()
@@ -0,0 +1,107 @@
+import json
+import pickle
+
+import pytest
+
+from pkgcore.cache import flat_hash, lru
+from snakeoil.chksum import LazilyHashedPath
+
+from .test_flat_hash import generic_data
+
+
+@pytest.fixture
+def backend(tmp_path):
+    cache = flat_hash.md5_cache(str(tmp_path))
+    key, raw_data = generic_data
+    for x in range(5):
+        d = dict(raw_data)
+        d.pop("_mtime_")
+        del d["_eclasses_"]
+        d["_chf_"] = LazilyHashedPath(str(tmp_path / f"pkg-{x}.ebuild"), md5=x)
+        cache[f"cat/pkg-{x}"] = d
+    yield cache
+    lru._stores.clear()
+
+
+class TestLRU:
+    def test_getitem(self, backend):
+        cache = lru.database(backend)
+        entry = cache["cat/pkg-0"]
+        assert entry == backend["cat/pkg-0"]
+        assert cache["cat/pkg-0"] == entry
+        # callers get their own copies
+        entry["SLOT"] = "1"
+        assert cache["cat/pkg-0"]["SLOT"] == "0"
+        with pytest.raises(KeyError):
+            cache["cat/missing-1"]
+        assert cache.stats["hits"] == 2
+        assert cache.stats["misses"] == 2
+        assert "cat/pkg-0" in cache
+        assert sorted(cache) == sorted(backend)
+
+    def test_get_many(self, backend):
+        cache = lru.database(backend)
+        cache["cat/pkg-0"]
+        d = cache.get_many(f"cat/pkg-{x}" for x in range(6))
+        assert sorted(d) == [f"cat/pkg-{x}" for x in range(5)]
+        assert cache.stats["hits"] == 1
+        assert dict(cache.iter_category("cat")) == d
+        assert cache.stats["entries"] == 5
+
+    def test_budgets(self, backend):
+        cache = lru.database(backend, max_entries=2)
+        for x in (0, 1, 0, 2):
+            cache[f"cat/pkg-{x}"]
+        # least recently used entries are evicted first
+        assert list(cache._store.entries) == ["cat/pkg-0", "cat/pkg-2"]
+        assert cache.stats["evictions"] == 1
+
+        size = cache.stats["bytes"] // 2
+        cache = lru.database(backend, max_entries=0, max_bytes=size * 3)
+        cache.get_many(f"cat/pkg-{x}" for x in range(5))
+        assert cache.stats["entries"] == 3
+        assert cache.stats["bytes"] <= size * 3
+
+        # budget changes apply to existing entries
+        cache = lru.database(backend, max_entries=1)
+        assert cache.stats["entries"] == 1
+
+        # oversized entries are never stored
+        cache = lru.database(backend, max_bytes=1)
+        cache["cat/pkg-0"]
+        assert cache.stats["entries"] == 0
+
+    def test_invalidation(self, backend, tmp_path):
+        cache = lru.database(backend)
+        entry = cache["cat/pkg-1"]
+        ebuild_hash = LazilyHashedPath(str(tmp_path / "pkg-1.ebuild"), md5=1)
+        assert cache.validate_entry(entry, ebuild_hash, None)
+        assert cache.stats["entries"] == 1
+        ebuild_hash = LazilyHashedPath(str(tmp_path / "pkg-1.ebuild"), md5=2)
+        assert not cache.validate_entry(cache["cat/pkg-1"], ebuild_hash, None)
+        assert cache.stats["entries"] == 0
+        assert cache.stats["invalidations"] == 1
+
+        # writes invalidate memory entries
+        cache["cat/pkg-2"]
+        del cache["cat/pkg-2"]
+        assert "cat/pkg-2" not in cache
+        with pytest.raises(KeyError):
+            cache["cat/pkg-2"]
+
+    def test_shared_store(self, backend, tmp_path):
+        lru.database(backend)["cat/pkg-0"]
+        cache = lru.database(flat_hash.md5_cache(str(tmp_path)))
+        cache["cat/pkg-0"]
+        assert cache.stats["hits"] == 1
+        cache = pickle.loads(pickle.dumps(cache))
+        assert cache.stats["entries"] == 1
+
+    def test_dump_stats(self, backend, tmp_path):
+        cache = lru.database(backend)
+        cache["cat/pkg-0"]
+        path = tmp_path / "stats.json"
+        cache.dump_stats(str(path))
+        stats = json.loads(path.read_text())
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
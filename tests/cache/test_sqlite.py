@@ -0,0 +1,178 @@
+import pickle
+
+import pytest
+
+from pkgcore.cache import errors, flat_hash, sqlite
+from snakeoil.chksum import LazilyHashedPath
+
+from . import test_base
+from .test_flat_hash import generic_data
+
+
+class db(sqlite.database):
+    def __setitem__(self, cpv, data):
+        data["_chf_"] = test_base._chf_obj
+        return sqlite.database.__setitem__(self, cpv, data)
+
+    def __getitem__(self, cpv):
+        d = dict(sqlite.database.__getitem__(self, cpv).items())
+        d.pop(f"_{self.chf_type}_", None)
+        return d
+
+
+class TestSqlite:
+    cache_keys = (
+        "DEPENDS",
+        "RDEPEND",
+        "EAPI",
+        "HOMEPAGE",
+        "KEYWORDS",
+        "LICENSE",
+        "PDEPEND",
+        "RESTRICT",
+        "SLOT",
+        "SRC_URI",
+        "_eclasses_",
+        "_mtime_",
+    )
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        return db(str(tmp_path / "cache.sqlite"), auxdbkeys=self.cache_keys)
+
+    def test_readwrite(self, db):
+        key, raw_data = generic_data
+        db[key] = dict(raw_data)
+        db.commit()
+        assert key in db
+        assert list(db.keys()) == [key]
+        d = db[key]
+        assert d["KEYWORDS"] == "~amd64 ~ppc ~x86"
+        assert {x[0] for x in d["_eclasses_"]} == {
+            "toolchain-funcs",
+            "multilib",
+            "eutils",
+            "portability",
+        }
+
+        # entries persist across instances
+        db2 = sqlite.database(db.location, auxdbkeys=self.cache_keys, readonly=True)
+        assert list(db2.keys()) == [key]
+        assert db2[key]["SLOT"] == "0"
+
+    def test_delitem(self, db):
+        key, raw_data = generic_data
+        db[key] = dict(raw_data)
+        del db[key]
+        assert key not in db
+        with pytest.raises(KeyError):
+            db[key]
+        with pytest.raises(KeyError):
+            del db[key]
+
+    def test_get_many(self, db):
+        key, raw_data = generic_data
+        db[key] = dict(raw_data)
+        db["sys-libs/libtrash-3"] = dict(raw_data)
+        db["sys-libsx/foo-1"] = dict(raw_data)
+        d = db.get_many([key, "sys-libs/missing-1"])
+        assert list(d) == [key]
+        assert len(d[key]["_eclasses_"]) == 4
+        assert sorted(dict(db.iter_category("sys-libs"))) == [
+            key,
+            "sys-libs/libtrash-3",
+        ]
+        assert not list(db.iter_category("sys"))
+
+    def test_readonly(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        cache = db(path, auxdbkeys=self.cache_keys, readonly=True)
+        key, raw_data = generic_data
+        with pytest.raises(errors.ReadOnly):
+            cache[key] = dict(raw_data)
+        # nonexistent databases act as empty caches
+        assert not list(cache.keys())
+        assert key not in cache
+
+    def test_pickle(self, db):
+        key, raw_data = generic_data
+        db[key] = dict(raw_data)
+        db.commit()
+        db2 = pickle.loads(pickle.dumps(db))
+        assert list(db2.keys()) == [key]
+
+    def test_validate_entry(self, tmp_path):
+        cache = sqlite.md5_cache(str(tmp_path))
+        assert cache.location == str(tmp_path / "metadata" / "md5-cache.sqlite")
+        ebuild = tmp_path / "foo-1.ebuild"
+        ebuild.write_text("EAPI=8\n")
+        ebuild_hash = LazilyHashedPath(str(ebuild))
+        cache["cat/foo-1"] = {"EAPI": "8", "SLOT": "0", "_chf_": ebuild_hash}
+        entry = cache["cat/foo-1"]
+        assert cache.validate_entry(entry, ebuild_hash, None)
+        ebuild.write_text("EAPI=7\n")
+        assert not cache.validate_entry(entry, LazilyHashedPath(str(ebuild)), None)
+
+    def test_import_cache(self, tmp_path):
+        ebuild = tmp_path / "foo-1.ebuild"
+        ebuild.write_text("EAPI=8\n")
+        eclass = tmp_path / "eclass" / "foo.eclass"
+        eclass.parent.mkdir()
+        eclass.write_text("# foo\n")
+        data = {
+            "EAPI": "8",
+            "INHERIT": "foo",
+            "SLOT": "0",
+            "_eclasses_": {"foo": LazilyHashedPath(str(eclass))},
+            "_chf_": LazilyHashedPath(str(ebuild)),
+        }
+
+        source = flat_hash.md5_cache(str(tmp_path / "repo"))
+        source["cat/foo-1"] = dict(data)
+        source["cat/bar-1"] = dict(data)
+        target = sqlite.md5_cache(str(tmp_path / "target"))
+        assert target.import_cache(source) == 2
+        assert sorted(target.keys()) == ["cat/bar-1", "cat/foo-1"]
+        src_entry = source["cat/foo-1"]
+        entry = target["cat/foo-1"]
+        assert entry == src_entry
+
+        # incompatible checksum types are rejected
+        with pytest.raises(errors.CacheError):
+            target.import_cache(flat_hash.database(str(tmp_path / "mtime")))
+
+    def test_seed(self, tmp_path, caplog):
+        ebuild = tmp_path / "foo-1.ebuild"
+        ebuild.write_text("EAPI=8\n")
+        data = {"EAPI": "8", "SLOT": "0", "_chf_": LazilyHashedPath(str(ebuild))}
+        repo = tmp_path / "repo"
+        flat_hash.md5_cache(str(repo))["cat/foo-1"] = data
+
+        # missing databases that can't be created aren't seeded
+        readonly = sqlite.md5_cache(str(repo), seed=str(repo), readonly=True)
+        assert list(readonly.keys()) == []
+        assert "pmaint regen" in caplog.text
+
+        # new databases import the repo's md5-cache on first use
+        target = sqlite.md5_cache(str(repo), seed=str(repo))
+        assert list(target.keys()) == ["cat/foo-1"]
+        assert target["cat/foo-1"]["SLOT"] == "0"
+
+        # existing databases are left alone
+        flat_hash.md5_cache(str(repo))["cat/bar-1"] = data
+        target = sqlite.md5_cache(str(repo), seed=str(repo))
+        assert list(target.keys()) == ["cat/foo-1"]
+
+        # unseeded databases start empty
+        assert list(sqlite.md5_cache(str(tmp_path / "empty")).keys()) == []
+
+    def test_regen_state(self, db):
+        assert db.get_regen_state() is None
+        db.set_regen_state("state")
+        assert db.get_regen_state() == "state"
+        db2 = sqlite.database(db.location, auxdbkeys=self.cache_keys, readonly=True)
+        assert db2.get_regen_state() == "state"
+        with pytest.raises(errors.ReadOnly):
+            db2.set_regen_state(None)
+        db.set_regen_state(None)
+        assert db.get_regen_state() is None
@@ -23,3 +23,15 @@ def mark_network(config, func):
 
 def pytest_configure(config):
     pytest.mark_network = partial(mark_network, config)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolate_user_cache(tmp_path_factory):
+    """Avoid writing persistent caches to the user or system cache directories."""
+    from pkgcore import const
+
+    orig = const.USER_CACHE_PATH, const.SYSTEM_CACHE_PATH
+    const.USER_CACHE_PATH = str(tmp_path_factory.mktemp("user-cache"))
+    const.SYSTEM_CACHE_PATH = str(tmp_path_factory.mktemp("system-cache"))
+    yield
+    const.USER_CACHE_PATH, const.SYSTEM_CACHE_PATH = orig
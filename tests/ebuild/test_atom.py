@@ -166,6 +166,32 @@ class TestAtom(TestRestriction):
                 self.assertMatch(a, eq_cpv)
                 self.assertMatch(a, le_cpv)
 
+    def test_compile(self):
+        astr = "app-arch/tarsync"
+        pkgs = [
+            FakePkg(f"{astr}-{ver}", slot=slot, use=use, repo=repo)
+            for ver in ("0", "1", "1-r1", "1.0", "1.1_rc1", "1.1-r2", "1.10", "2b")
+            for slot, use, repo in (
+                ("0", (), "gentoo"),
+                ("1", ("foo",), "overlay"),
+            )
+        ]
+        pkgs.append(CPV.versioned("app-arch/other-1"))
+        pkgs.append(CPV.unversioned(astr))
+        for ver in ("1", "1-r1", "1.1-r2", "1.1_rc1"):
+            for op in ("<", "<=", "=", ">=", ">"):
+                for suffix in ("", ":1", ":0::gentoo", "[foo]", "[-foo]"):
+                    for negate_vers in (False, True):
+                        a = self.kls(f"{op}{astr}-{ver}{suffix}", negate_vers)
+                        func = a.compile()
+                        for pkg in pkgs:
+                            assert func(pkg) == a.match(pkg), f"{a} mismatch for {pkg}"
+        for atom_str in (f"~{astr}-1", f"={astr}-1*", astr, f"{astr}:1"):
+            a = self.kls(atom_str)
+            func = a.compile()
+            for pkg in pkgs:
+                assert func(pkg) == a.match(pkg), f"{a} mismatch for {pkg}"
+
     def test_norev(self):
         astr = "app-arch/tarsync"
         a = self.kls(f"~{astr}-1")
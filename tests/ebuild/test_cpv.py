@@ -1,4 +1,5 @@
-from random import shuffle
+from itertools import product
+from random import Random, shuffle
 
 import pytest
 from pkgcore.ebuild import cpv
@@ -309,6 +310,52 @@ class TestCPV:
             "da/ba-6.0-r0", versioned=True
         )
 
+    def test_version_key(self):
+        vkls = cpv.VersionedCPV
+        assert vkls("da/ba-1.0").version_key == vkls("da/ba-1.00-r0").version_key
+        assert cpv.UnversionedCPV("da/ba").version_key is None
+
+        # keys order versions the same as ver_cmp()
+        rng = Random(0)
+        versions = [
+            "1",
+            "1.0",
+            "1.00",
+            "1.01",
+            "1.010",
+            "1.1",
+            "1.1a",
+            "1.1z",
+            "01",
+            "0",
+            "00",
+            "6.054",
+            "6.2",
+            "12.2.5",
+            "12.2b",
+        ]
+        for _ in range(300):
+            ver = ".".join(
+                rng.choice(("0", "1", "2", "10", "01", "001", "010"))
+                for _ in range(rng.randint(1, 3))
+            )
+            ver += rng.choice(("", "", "a", "b"))
+            for _ in range(rng.randint(0, 2)):
+                ver += "_" + rng.choice(("alpha", "beta", "pre", "rc", "p"))
+                ver += rng.choice(("", "0", "1", "2", "10"))
+            versions.append(ver)
+        pkgs = [
+            vkls(f"da/ba-{ver}{rev}")
+            for ver in versions
+            for rev in ("", "-r1", "-r01", "-r2")
+        ]
+        for x, y in product(rng.sample(pkgs, 200), repeat=2):
+            expected = cpv.ver_cmp(x.version, x.revision, y.version, y.revision)
+            assert x._ver_cmp(y) == expected, (x.cpvstr, y.cpvstr)
+            assert (x < y) == (expected < 0)
+            assert (x == y) == (expected == 0)
+        assert sorted(pkgs, key=lambda x: x.version_key) == sorted(pkgs)
+
     def test_no_init(self):
         """Test if the cpv is in a somewhat sane state if __init__ fails.
 
@@ -3,7 +3,8 @@ import os
 import pytest
 
 from pkgcore.ebuild import eclass_cache
-from snakeoil import data_source
+from pkgcore.util import chksum_memo
+from snakeoil import chksum, data_source
 from snakeoil.chksum import LazilyHashedPath
 from snakeoil.osutils import pjoin
 
@@ -86,3 +87,27 @@ class TestStackedCaches(TestEclassCache):
         self.ec_locs = {"eclass1": str(loc1), "eclass2": str(loc2)}
         # make a shadowed file to verify it's not seen
         (loc2 / "eclass1.eclass").touch()
+
+
+class TestMemoizedChksums:
+    def test_memo(self, tmp_path, monkeypatch):
+        (path := tmp_path / "eclass1.eclass").write_text("FOO=1\n")
+        md5 = eclass_cache.cache(str(tmp_path)).eclasses["eclass1"].md5
+        memo = chksum_memo.get_memo("eclass-chksums", str(tmp_path), str(tmp_path))
+        assert memo.get(str(path), os.stat(path)) == {"md5": md5}
+
+        # unchanged eclasses pull their checksums from the memo
+        def get_chksums(*args):
+            raise AssertionError("eclass was rehashed")
+
+        with monkeypatch.context() as m:
+            m.setattr(chksum, "get_chksums", get_chksums)
+            ec = eclass_cache.cache(str(tmp_path))
+            assert ec.rebuild_cache_entry([("eclass1", [("md5", md5)])])
+
+        # modified eclasses are rehashed
+        path.write_text("FOO=22\n")
+        ec = eclass_cache.cache(str(tmp_path))
+        assert not ec.rebuild_cache_entry([("eclass1", [("md5", md5)])])
+        md5 = ec.eclasses["eclass1"].md5
+        assert memo.get(str(path), os.stat(path)) == {"md5": md5}
@@ -0,0 +1,285 @@
+import json
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from pkgcore.cache import flat_hash
+from pkgcore.ebuild import metadata_index, repository
+from pkgcore.ebuild.atom import atom
+from pkgcore.restrictions import packages, values
+from pkgcore.util import parserestrict
+
+
+def maintainer_restrict(email):
+    return packages.PackageRestriction(
+        "maintainers",
+        values.AnyMatch(
+            values.GetAttrRestriction("email", values.StrExactMatch(email))
+        ),
+    )
+
+
+class TestMetadataIndex:
+    @pytest.fixture
+    def tree(self, repo, tmp_path, monkeypatch):
+        monkeypatch.setattr(metadata_index.MetadataIndex, "racy_window", 0)
+        (Path(repo.location) / "eclass" / "foo.eclass").write_text("FOO=1\n")
+        repo.create_ebuild("cat/a-1", eapi="7", keywords=["amd64"], iuse=["+ssl"])
+        repo.create_ebuild(
+            "cat/a-2-r1", eapi="8", keywords=["~amd64"], data="inherit foo"
+        )
+        repo.create_ebuild(
+            "cat/b-1", license="", description="fancy", data='LICENSE="|| ( MIT BSD )"'
+        )
+        repo.create_ebuild("other/c-1", eapi="8")
+        (Path(repo.location) / "cat" / "a" / "metadata.xml").write_text(
+            "<pkgmetadata><maintainer type='person'><email>a@gentoo.org</email>"
+            "</maintainer><longdescription>long text</longdescription></pkgmetadata>"
+        )
+        cache = flat_hash.md5_cache(str(tmp_path / "cache"))
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        assert not tree.operations.regen_cache(threads=1)
+        return tree
+
+    def mk_index(self, tree, tmp_path, update=False):
+        tree = repository.UnconfiguredTree(
+            tree.location, repo_config=tree.config, cache=tree.cache
+        )
+        index = metadata_index.MetadataIndex(tree, path=str(tmp_path / "index"))
+        if update:
+            index.update()
+            index = metadata_index.MetadataIndex(tree, path=index.path)
+        return index
+
+    @pytest.mark.parametrize(
+        ("restrict", "expected"),
+        (
+            (
+                packages.PackageRestriction("eapi", values.StrExactMatch("8")),
+                ["cat/a-2-r1", "other/c-1"],
+            ),
+            (
+                packages.PackageRestriction(
+                    "eapi", values.StrExactMatch("8"), negate=True
+                ),
+                ["cat/a-1", "cat/b-1"],
+            ),
+            (
+                packages.PackageRestriction("description", values.StrRegex("^fan")),
+                ["cat/b-1"],
+            ),
+            (parserestrict.comma_separated_containment("license")("MIT"), ["cat/b-1"]),
+            (
+                parserestrict.comma_separated_containment("keywords")("amd64"),
+                ["cat/a-1"],
+            ),
+            (
+                parserestrict.comma_separated_containment("iuse_stripped")("ssl"),
+                ["cat/a-1"],
+            ),
+            (
+                packages.PackageRestriction(
+                    "inherited", values.ContainmentMatch(frozenset(["foo"]))
+                ),
+                ["cat/a-2-r1"],
+            ),
+            (maintainer_restrict("a@gentoo.org"), ["cat/a-1", "cat/a-2-r1"]),
+            (
+                packages.PackageRestriction("maintainers", values.EqualityMatch(())),
+                ["cat/b-1", "other/c-1"],
+            ),
+            (
+                packages.PackageRestriction("longdescription", values.StrRegex("long")),
+                ["cat/a-1", "cat/a-2-r1"],
+            ),
+            (
+                packages.AndRestriction(
+                    packages.PackageRestriction("eapi", values.StrExactMatch("8")),
+                    packages.PackageRestriction(
+                        "category", values.StrExactMatch("cat")
+                    ),
+                ),
+                ["cat/a-2-r1", "other/c-1"],
+            ),
+            (
+                packages.OrRestriction(
+                    packages.PackageRestriction("eapi", values.StrExactMatch("7")),
+                    maintainer_restrict("a@gentoo.org"),
+                ),
+                ["cat/a-1", "cat/a-2-r1", "cat/b-1"],
+            ),
+            (packages.AlwaysFalse, []),
+        ),
+    )
+    def test_candidates(self, tree, tmp_path, restrict, expected):
+        index = self.mk_index(tree, tmp_path, update=True)
+        assert sorted(index.candidates(restrict)) == expected
+        # index results are a superset of the actual matches
+        matches = [x.cpvstr for x in tree.itermatch(restrict)]
+        assert set(matches).issubset(expected)
+
+    @pytest.mark.parametrize(
+        "restrict",
+        (
+            packages.AlwaysTrue,
+            atom("cat/a"),
+            packages.PackageRestriction("slot", values.StrExactMatch("0")),
+            packages.OrRestriction(
+                packages.PackageRestriction("eapi", values.StrExactMatch("8")),
+                packages.PackageRestriction("slot", values.StrExactMatch("0")),
+            ),
+            packages.PackageRestriction(
+                "license", values.AnyMatch(values.StrExactMatch("MIT"))
+            ),
+        ),
+    )
+    def test_unsupported(self, tree, tmp_path, restrict):
+        index = self.mk_index(tree, tmp_path)
+        with mock.patch.object(index, "_valid_entry") as valid_entry:
+            assert index.candidates(restrict) is None
+            # unusable indexes aren't validated
+            valid_entry.assert_not_called()
+
+    def test_invalidation(self, repo, tree, tmp_path):
+        eapi8 = packages.PackageRestriction("eapi", values.StrExactMatch("8"))
+        index = self.mk_index(tree, tmp_path)
+        # all versions are candidates until they're indexed
+        assert len(list(index.candidates(eapi8))) == 4
+        assert sorted(index.candidates(eapi8)) == ["cat/a-2-r1", "other/c-1"]
+        data = json.loads((tmp_path / "index").read_text())
+        assert sorted(data["packages"]) == [
+            "cat/a-1",
+            "cat/a-2-r1",
+            "cat/b-1",
+            "other/c-1",
+        ]
+
+        # indexes are reused across instances
+        index = self.mk_index(tree, tmp_path)
+        with mock.patch.object(index, "_index_entry") as index_entry:
+            assert sorted(index.candidates(eapi8)) == ["cat/a-2-r1", "other/c-1"]
+            index_entry.assert_not_called()
+
+        # modified ebuilds lacking valid cache entries are always candidates
+        repo.create_ebuild("cat/b-1", eapi="7")
+        repo.create_ebuild("cat/d-1")
+        index = self.mk_index(tree, tmp_path)
+        assert sorted(index.candidates(eapi8)) == [
+            "cat/a-2-r1",
+            "cat/b-1",
+            "cat/d-1",
+            "other/c-1",
+        ]
+
+        # eclass changes invalidate their consumers
+        (Path(repo.location) / "eclass" / "foo.eclass").write_text("FOO=2\n")
+        index = self.mk_index(tree, tmp_path)
+        assert sorted(index.candidates(packages.AlwaysFalse)) == [
+            "cat/a-2-r1",
+            "cat/b-1",
+            "cat/d-1",
+        ]
+
+        # regenerated entries are reindexed
+        assert not index.repo.operations.regen_cache(threads=1)
+        index = self.mk_index(tree, tmp_path)
+        assert len(list(index.candidates(eapi8))) == 4
+        assert sorted(index.candidates(eapi8)) == ["cat/a-2-r1", "other/c-1"]
+        assert not list(index.candidates(packages.AlwaysFalse))
+
+        # metadata.xml changes
+        restrict = maintainer_restrict("a@gentoo.org")
+        # package level data is only indexed by queries depending on it
+        list(index.candidates(restrict))
+        (Path(repo.location) / "cat" / "a" / "metadata.xml").unlink()
+        index = self.mk_index(tree, tmp_path)
+        assert sorted(index.candidates(restrict)) == ["cat/a-1", "cat/a-2-r1"]
+        assert not list(index.candidates(restrict))
+
+        # removed packages are dropped on updates
+        shutil.rmtree(Path(repo.location) / "other" / "c")
+        index = self.mk_index(tree, tmp_path, update=True)
+        assert sorted(index.candidates(eapi8)) == ["cat/a-2-r1"]
+        data = json.loads((tmp_path / "index").read_text())
+        assert "other/c-1" not in data["packages"]
+        assert "other/c" not in data["metadata_xml"]
+
+    def test_lazy_validation(self, tree, tmp_path):
+        index = self.mk_index(tree, tmp_path, update=True)
+        eapi8 = packages.PackageRestriction("eapi", values.StrExactMatch("8"))
+        with mock.patch.object(
+            index, "_valid_entry", wraps=index._valid_entry
+        ) as valid_entry:
+            candidates = index.candidates(eapi8)
+            valid_entry.assert_not_called()
+            assert "cat/a-2-r1" in candidates
+            assert "cat/a-1" not in candidates
+            # only checked versions are validated
+            assert sorted(x.args[:3] for x in valid_entry.call_args_list) == [
+                ("cat", "a", "1"),
+                ("cat", "a", "2-r1"),
+            ]
+
+    def test_package_level_validation(self, tree, tmp_path):
+        index = self.mk_index(tree, tmp_path, update=True)
+        index = self.mk_index(tree, tmp_path)
+        eapi8 = packages.PackageRestriction("eapi", values.StrExactMatch("8"))
+        longdesc = packages.PackageRestriction(
+            "longdescription", values.StrRegex("long")
+        )
+        with mock.patch.object(
+            index, "_update_package", wraps=index._update_package
+        ) as update_package:
+            # metadata.xml isn't checked for version level queries
+            assert "cat/a-2-r1" in index.candidates(eapi8)
+            update_package.assert_not_called()
+            candidates = index.candidates(packages.AndRestriction(eapi8, longdesc))
+            assert "cat/a-2-r1" in candidates
+            update_package.assert_called_once_with("cat", "a")
+
+    def test_update_packages(self, repo, tree, tmp_path):
+        index = self.mk_index(tree, tmp_path, update=True)
+        repo.create_ebuild("cat/a-3", eapi="8")
+        shutil.rmtree(Path(repo.location) / "other" / "c")
+        index = self.mk_index(tree, tmp_path)
+        assert not index.repo.operations.regen_cache(threads=1)
+        with mock.patch.object(
+            index, "_valid_entry", wraps=index._valid_entry
+        ) as valid_entry:
+            index.update_packages([("cat", "a"), ("other", "c")])
+            assert {x.args[:2] for x in valid_entry.call_args_list} == {("cat", "a")}
+        data = json.loads((tmp_path / "index").read_text())
+        assert sorted(data["packages"]) == [
+            "cat/a-1",
+            "cat/a-2-r1",
+            "cat/a-3",
+            "cat/b-1",
+        ]
+        assert "other/c" not in data["metadata_xml"]
+
+    def test_itermatch(self, tree, tmp_path):
+        tree = self.mk_index(tree, tmp_path).repo
+        tree.metadata_index.update()
+        restrict = packages.PackageRestriction("eapi", values.StrExactMatch("8"))
+        expected = sorted(x.cpvstr for x in tree.itermatch(restrict))
+        assert expected == ["cat/a-2-r1", "other/c-1"]
+
+        factory = tree.package_class
+        with mock.patch.object(
+            factory, "_get_metadata", wraps=factory._get_metadata
+        ) as get_metadata:
+            pkgs = tree.itermatch(restrict, sorter=sorted, metadata_index=True)
+            assert [x.cpvstr for x in pkgs] == expected
+            # metadata is only loaded for candidates
+            assert sorted(x.args[0].cpvstr for x in get_metadata.call_args_list) == (
+                expected
+            )
+
+        # repos without caches don't use indexes
+        tree = repository.UnconfiguredTree(tree.location, repo_config=tree.config)
+        pkgs = tree.itermatch(restrict, sorter=sorted, metadata_index=True)
+        assert [x.cpvstr for x in pkgs] == expected
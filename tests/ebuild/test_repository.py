@@ -1,12 +1,18 @@
+import os
 import textwrap
 from pathlib import Path
 
 import pytest
 
+from pkgcore.cache import flat_hash, sqlite
 from pkgcore.ebuild import eclass_cache
 from pkgcore.ebuild import repository, restricts
 from pkgcore.ebuild.atom import atom
+from pkgcore.operations import OperationError, regen
+from pkgcore.operations.observer import null_output
 from pkgcore.repository import errors
+from pkgcore.restrictions import packages
+from snakeoil import chksum
 from snakeoil.contexts import chdir
 
 
@@ -183,6 +189,270 @@ class TestUnconfiguredTree:
         assert {"cat": ("pkg",), "empty": ("empty",)} == dict(repo.packages)
         assert {("cat", "pkg"): ("3",), ("empty", "empty"): ()} == dict(repo.versions)
 
+    def test_layout_index(self, tmp_path, monkeypatch):
+        (tmp_path / "cat" / "pkg").mkdir(parents=True)
+        (tmp_path / "cat" / "pkg" / "pkg-3.ebuild").touch()
+        repo = self.mk_tree(tmp_path)
+        # backdate dirs so they're outside the index's racy window
+        for path in (tmp_path, tmp_path / "cat", tmp_path / "cat" / "pkg"):
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - 60 * 10**9))
+        assert dict(repo.versions) == {("cat", "pkg"): ("3",)}
+
+        # unchanged dirs aren't reread by new repo instances
+        def _fail(*args):
+            raise AssertionError("directory reread")
+
+        monkeypatch.setattr(repository, "listdir_dirs", _fail)
+        monkeypatch.setattr(repository, "listdir_files", _fail)
+        repo = self.mk_tree(tmp_path)
+        assert dict(repo.versions) == {("cat", "pkg"): ("3",)}
+
+        # modified dirs are reread
+        monkeypatch.undo()
+        (tmp_path / "cat" / "pkg" / "pkg-4.ebuild").touch()
+        repo = self.mk_tree(tmp_path)
+        assert sorted(repo.versions[("cat", "pkg")]) == ["3", "4"]
+
+    def test_ebuild_chksum_memo(self, tmp_path, pdir, monkeypatch):
+        (tmp_path / "cat" / "pkg").mkdir(parents=True)
+        (ebuild := tmp_path / "cat" / "pkg" / "pkg-1.ebuild").write_text("EAPI=7\n")
+        cache = flat_hash.md5_cache(str(tmp_path))
+        cache["cat/pkg-1"] = {
+            "EAPI": "7",
+            "SLOT": "0",
+            "_chf_": chksum.LazilyHashedPath(str(ebuild)),
+        }
+        repo = self.mk_tree(tmp_path, cache=(cache,))
+        assert repo[("cat", "pkg", "1")].slot == "0"
+        memo = repo.ebuild_chksums
+        # memoized checksums are trusted in place of hashing ebuilds
+        assert memo.secure
+        memoized = memo.get(str(ebuild), os.stat(ebuild))
+        assert memoized["md5"] == chksum.get_chksums(str(ebuild), "md5")[0]
+
+        # unchanged ebuilds are validated without being rehashed
+        def _fail(*args):
+            raise AssertionError("ebuild rehashed")
+
+        monkeypatch.setattr(chksum, "get_chksums", _fail)
+        repo = self.mk_tree(tmp_path, cache=(cache,))
+        assert repo.ebuild_chksums is memo
+        assert repo[("cat", "pkg", "1")].slot == "0"
+
+    def test_batched_cache_reads(self, tmp_path, pdir):
+        cache = flat_hash.md5_cache(str(tmp_path))
+        for cpv in ("cat/pkg-1", "cat/pkg-2", "cat/other-1"):
+            cat, pv = cpv.split("/")
+            pkg = pv.rsplit("-", 1)[0]
+            (tmp_path / cat / pkg).mkdir(parents=True, exist_ok=True)
+            (ebuild := tmp_path / cat / pkg / f"{pv}.ebuild").write_text("EAPI=7\n")
+            cache[cpv] = {
+                "EAPI": "7",
+                "SLOT": "0",
+                "_chf_": chksum.LazilyHashedPath(str(ebuild)),
+            }
+
+        batches = []
+        get_many = cache.get_many
+
+        def _get_many(cpvs):
+            batches.append(sorted(cpvs))
+            return get_many(cpvs)
+
+        cache.get_many = _get_many
+        repo = self.mk_tree(tmp_path, cache=(cache,))
+        assert sorted(pkg.cpvstr for pkg in repo) == [
+            "cat/other-1",
+            "cat/pkg-1",
+            "cat/pkg-2",
+        ]
+        assert batches == [["cat/other-1", "cat/pkg-1", "cat/pkg-2"]]
+
+    @pytest.mark.parametrize("cache_cls", (flat_hash.md5_cache, sqlite.md5_cache))
+    def test_regen_processes(self, repo, tmp_path, cache_cls):
+        for cpv in ("cat/pkg-1", "cat/pkg-2", "cat/other-1"):
+            repo.create_ebuild(cpv)
+        # metadata failures are left for the caller to report
+        repo.create_ebuild("cat/broken-1", data="die")
+        cache = cache_cls(str(tmp_path))
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        pkgs = list(tree.itermatch(packages.AlwaysTrue, pkg_filter=None))
+        failures = list(regen.regen_repository(tree, pkgs, observer=None, processes=2))
+        assert not failures
+        # entries are written by the worker processes
+        assert sorted(cache_cls(str(tmp_path), readonly=True)) == [
+            "cat/other-1",
+            "cat/pkg-1",
+            "cat/pkg-2",
+        ]
+        assert cache_cls(str(tmp_path))["cat/pkg-1"]["SLOT"] == "0"
+
+    def test_regen_eclass_affinity(self, repo, tmp_path):
+        for eclass in ("common", "rare"):
+            (Path(repo.location) / "eclass" / f"{eclass}.eclass").write_text(
+                f"{eclass.upper()}=1\n"
+            )
+        repo.create_ebuild("cat/a-1", data="inherit common rare")
+        repo.create_ebuild("cat/b-1", data="inherit common")
+        repo.create_ebuild("cat/c-1", data="inherit common rare")
+        repo.create_ebuild("cat/d-1")
+        cache = flat_hash.md5_cache(str(tmp_path))
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        pkgs = sorted(tree.itermatch(packages.AlwaysTrue, pkg_filter=None))
+        # no cache entries exist yet
+        assert regen.eclass_affinity_order(tree, pkgs) == pkgs
+        assert not list(regen.regen_repository(tree, pkgs, observer=None))
+
+        # pkgs sharing less common eclasses are grouped together
+        ordered = regen.eclass_affinity_order(tree, pkgs)
+        assert [pkg.cpvstr for pkg in ordered] == [
+            "cat/d-1",
+            "cat/b-1",
+            "cat/a-1",
+            "cat/c-1",
+        ]
+
+        class observer(null_output):
+            def info(self, msg, *args, **kwds):
+                messages.append(msg)
+
+        messages = []
+        assert not list(
+            regen.regen_repository(
+                tree, pkgs, observer=observer(), threads=1, force=True
+            )
+        )
+        # 5 inherits in total, only the first inherit of each eclass misses
+        assert messages == ["eclass preload reuse: 3/5 inherits (60.0% hit rate)"]
+
+    def test_regen_batch(self, repo, tmp_path):
+        (Path(repo.location) / "eclass" / "foo.eclass").write_text(
+            "FOO=1\nfoo_src_compile() { :; }\nEXPORT_FUNCTIONS src_compile\n"
+        )
+        repo.create_ebuild("cat/a-1", data="inherit foo\nIUSE='x\n  y'")
+        repo.create_ebuild("cat/b-1", data="die 'bad thing'")
+        repo.create_ebuild("cat/c-1", data="inherit missing")
+        repo.create_ebuild("cat/d-1", data="inherit foo\nsrc_install() { :; }")
+        cache = flat_hash.md5_cache(str(tmp_path))
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        pkgs = sorted(tree.itermatch(packages.AlwaysTrue, pkg_filter=None))
+        helper = tree._regen_operation_helper()
+        ebp = helper.ebp
+        failures = helper.regen_batch(pkgs)
+        # failures don't affect the rest of the batch or kill the processor
+        assert helper.ebp is ebp
+        assert [(pkg.cpvstr, e.msg()) for pkg, e in failures] == [
+            ("cat/b-1", "failed sourcing ebuild: bad thing"),
+            (
+                "cat/c-1",
+                "failed sourcing ebuild: inherit requires unknown eclass: missing.eclass",
+            ),
+        ]
+        assert sorted(cache) == ["cat/a-1", "cat/d-1"]
+        assert cache["cat/a-1"]["IUSE"] == "x y"
+        assert cache["cat/a-1"]["DEFINED_PHASES"] == "compile"
+        assert cache["cat/d-1"]["DEFINED_PHASES"] == "compile install"
+        assert [x[0] for x in cache["cat/d-1"]["_eclasses_"]] == ["foo"]
+        assert (helper.eclass_preload_hits, helper.eclass_preload_misses) == (0, 2)
+        # valid cache entries aren't regenerated
+        assert not helper.regen_batch(pkgs[::3])
+        assert ebp.eclass_preload_misses == 2
+        del helper
+
+    @pytest.mark.parametrize("processes", (1, 2))
+    def test_regen_profile(self, repo, tmp_path, processes):
+        for eclass in ("foo", "bar"):
+            (Path(repo.location) / "eclass" / f"{eclass}.eclass").write_text(
+                f"{eclass.upper()}=1\n"
+            )
+        repo.create_ebuild("cat/a-1", data="inherit foo bar")
+        repo.create_ebuild("cat/b-1", data="inherit foo")
+        repo.create_ebuild("cat/c-1")
+        cache = flat_hash.md5_cache(str(tmp_path))
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        pkgs = sorted(tree.itermatch(packages.AlwaysTrue, pkg_filter=None))
+        profile = regen.RegenProfile()
+        assert not list(
+            regen.regen_repository(
+                tree, pkgs, observer=None, processes=processes, profile=profile
+            )
+        )
+        records = {
+            cpv: (inherited, preloaded)
+            for cpv, _, inherited, preloaded in profile.records
+        }
+        assert set(records) == {"cat/a-1", "cat/b-1", "cat/c-1"}
+        assert records["cat/a-1"][0] == ("bar", "foo")
+        assert records["cat/b-1"][0] == ("foo",)
+        assert records["cat/c-1"] == ((), ())
+        assert all(x[1] > 0 for x in profile.records)
+        assert len(profile.slowest(2)) == 2
+        stats = profile.eclass_stats()
+        assert stats["foo"]["packages"] == 2
+        assert stats["bar"]["packages"] == 1
+        assert stats["foo"]["sourced"] + stats["foo"]["preloaded"] == 2
+
+        report = profile.report()
+        assert report["packages"] == 3
+        assert {x["package"] for x in report["records"]} == set(records)
+        assert report["eclasses"] == stats
+
+    def test_verify_cache(self, repo, tmp_path):
+        (Path(repo.location) / "eclass" / "foo.eclass").write_text("FOO=1\n")
+        for x in ("a", "b", "c", "d"):
+            repo.create_ebuild(f"cat/{x}-1", data="inherit foo")
+        cache = flat_hash.md5_cache(str(tmp_path))
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        assert not tree.operations.regen_cache(threads=1)
+        (summary,) = tree.operations.verify_cache(threads=2)
+        assert summary["entries"] == summary["valid"] == 4
+        assert not summary["stale"] + summary["orphaned"] + summary["corrupted"]
+
+        with (Path(repo.location) / "cat" / "a" / "a-1.ebuild").open("a") as f:
+            f.write("SLOT=1\n")
+        (Path(repo.location) / "cat" / "b" / "b-1.ebuild").unlink()
+        (Path(cache.location) / "cat" / "c-1").write_text("garbage\n")
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        (summary,) = tree.operations.verify_cache(threads=2)
+        assert summary["entries"] == 4
+        assert summary["valid"] == 1
+        assert summary["stale"] == ["cat/a-1"]
+        assert summary["orphaned"] == ["cat/b-1"]
+        assert summary["corrupted"] == ["cat/c-1"]
+        assert summary["pruned"] == 0
+        assert sorted(cache) == ["cat/a-1", "cat/b-1", "cat/c-1", "cat/d-1"]
+
+        # eclass changes invalidate their consumers
+        (Path(repo.location) / "eclass" / "foo.eclass").write_text("FOO=22\n")
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        (summary,) = tree.operations.verify_cache(prune=True)
+        assert summary["stale"] == ["cat/a-1", "cat/d-1"]
+        assert summary["pruned"] == 4
+        assert not list(cache)
+
+        # readonly caches can't be pruned
+        cache = flat_hash.md5_cache(str(tmp_path), readonly=True)
+        tree = repository.UnconfiguredTree(
+            repo.location, repo_config=repo.config, cache=(cache,)
+        )
+        with pytest.raises(OperationError):
+            tree.operations.verify_cache(prune=True)
+
     def test_package_mask(self, tmp_path, pdir):
         (pdir / "package.mask").write_text(
             textwrap.dedent(
@@ -0,0 +1,153 @@
+import errno
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from pkgcore.cache import flat_hash
+from pkgcore.ebuild import repo_objs, repository, tree_state
+from pkgcore.operations import OperationError
+from pkgcore.pytest.plugin import GitRepo
+
+
+def mk_tree(path, **kwargs):
+    repo_config = repo_objs.RepoConfig(location=path, disable_inst_caching=True)
+    return repository.UnconfiguredTree(path, repo_config=repo_config, **kwargs)
+
+
+class TestTreeState:
+    def test_non_git(self, tmp_path):
+        assert tree_state.git_head(str(tmp_path)) is None
+        assert tree_state.tree_state(str(tmp_path)) is None
+
+    def test_tree_state(self, repo):
+        git_repo = GitRepo(repo.location, commit=True)
+        state = tree_state.tree_state(repo.location)
+        assert state["head"].startswith(git_repo.HEAD)
+        assert state["dirty"] == []
+
+        repo.create_ebuild("cat/pkg-1")
+        state = tree_state.tree_state(repo.location)
+        assert state["dirty"] == ["cat/pkg/pkg-1.ebuild", "licenses/blank"]
+        git_repo.add_all("cat/pkg: initial import")
+        assert tree_state.git_changes(repo.location, state["head"], "HEAD") == {
+            "cat/pkg/pkg-1.ebuild",
+            "licenses/blank",
+        }
+
+    def test_collect_changes(self, repo):
+        git_repo = GitRepo(repo.location, commit=True)
+        repo.create_ebuild("cat/pkg-1")
+        git_repo.add_all("cat/pkg: initial import")
+        base = {repo.location: tree_state.tree_state(repo.location)}
+
+        repo.create_ebuild("cat/pkg-2")
+        git_repo.add_all("cat/pkg: version bump")
+        with open(os.path.join(repo.location, "eclass", "foo.eclass"), "w") as f:
+            f.write("# stub eclass\n")
+        current = {repo.location: tree_state.tree_state(repo.location)}
+        changes = tree_state.collect_changes(repo._repo, base, current)
+        assert changes.ebuilds == {("cat", "pkg", "2")}
+        assert changes.eclasses == {"foo"}
+
+        # uncommitted changes recorded for the base state are included
+        git_repo.add_all("add foo eclass")
+        changes = tree_state.collect_changes(
+            repo._repo, current, {repo.location: tree_state.tree_state(repo.location)}
+        )
+        assert not changes.ebuilds
+        assert changes.eclasses == {"foo"}
+
+        # layout changes force a full walk
+        with open(os.path.join(repo.location, "metadata", "layout.conf"), "a") as f:
+            f.write("sign-commits = false\n")
+        current = {repo.location: tree_state.tree_state(repo.location)}
+        assert tree_state.collect_changes(repo._repo, base, current) is None
+
+        # unknown current state forces a full walk
+        assert tree_state.collect_changes(repo._repo, base, {}) is None
+
+
+class TestIncrementalRegen:
+    def test_regen_targets(self, repo, tmp_path):
+        git_repo = GitRepo(repo.location, commit=True)
+        with open(os.path.join(repo.location, "eclass", "foo.eclass"), "w") as f:
+            f.write("# stub eclass\nFOO=1\n")
+        repo.create_ebuild("cat/pkg-1", data="inherit foo")
+        repo.create_ebuild("cat/pkg-2")
+        repo.create_ebuild("cat/other-1")
+        git_repo.add_all("initial import")
+
+        cache = flat_hash.md5_cache(str(tmp_path))
+        tree = mk_tree(repo.location, cache=(cache,))
+        ops = tree.operations
+        state = ops._get_regen_state()
+        assert list(json.loads(state)) == [repo.location]
+        # no recorded state requires a full regen
+        assert ops._get_regen_targets(state) is None
+        assert not ops.regen_cache()
+        assert sorted(cache) == ["cat/other-1", "cat/pkg-1", "cat/pkg-2"]
+        assert cache.get_regen_state() == state
+        # unchanged repos don't require any regen
+        assert ops._get_regen_targets(state) == ([], [])
+
+        # ebuild and eclass changes
+        with open(os.path.join(repo.location, "eclass", "foo.eclass"), "a") as f:
+            f.write("# updated\n")
+        repo.create_ebuild("cat/pkg-3")
+        os.remove(os.path.join(repo.location, "cat", "other", "other-1.ebuild"))
+        git_repo.add_all("more changes")
+        tree = mk_tree(repo.location, cache=(cache,))
+        ops = tree.operations
+        state = ops._get_regen_state()
+        pkgs, removed = ops._get_regen_targets(state)
+        assert [pkg.cpvstr for pkg in pkgs] == ["cat/pkg-1", "cat/pkg-3"]
+        assert removed == ["cat/other-1"]
+        index = tree.metadata_index
+        with mock.patch.object(index, "update") as update:
+            with mock.patch.object(index, "update_packages") as update_packages:
+                assert not ops.regen_cache(metadata_index=True)
+                # only regenerated and removed pkgs are reindexed
+                update.assert_not_called()
+                update_packages.assert_called_once_with(
+                    {("cat", "pkg"), ("cat", "other")}
+                )
+        assert sorted(cache) == ["cat/pkg-1", "cat/pkg-2", "cat/pkg-3"]
+        assert cache.get_regen_state() == state
+
+        # explicitly specified base commits override the recorded state
+        pkgs, removed = ops._get_regen_targets(state, since="HEAD~1")
+        assert [pkg.cpvstr for pkg in pkgs] == ["cat/pkg-1", "cat/pkg-3"]
+        assert removed == ["cat/other-1"]
+
+        # mismatched recorded states force full regens
+        cache.set_regen_state("{}")
+        assert ops._get_regen_targets(state) is None
+        cache.set_regen_state("invalid")
+        assert ops._get_regen_targets(state) is None
+
+    def test_failed_writes(self, repo, tmp_path):
+        git_repo = GitRepo(repo.location, commit=True)
+        repo.create_ebuild("cat/pkg-1")
+        git_repo.add_all("cat/pkg: initial import")
+        cache = flat_hash.md5_cache(str(tmp_path / "cache"))
+        ops = mk_tree(repo.location, cache=(cache,)).operations
+        assert not ops.regen_cache()
+        state = cache.get_regen_state()
+        assert state is not None
+
+        repo.create_ebuild("cat/pkg-2")
+        git_repo.add_all("cat/pkg: add 2")
+        ops = mk_tree(repo.location, cache=(cache,)).operations
+
+        # queued cache updates failing to be written don't record the state
+        def write_entry(cpv, values):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+        with mock.patch.object(cache, "_write_entry", side_effect=write_entry):
+            with pytest.raises(OperationError):
+                ops.regen_cache()
+        assert cache.get_regen_state() == state
+        pkgs, _removed = ops._get_regen_targets(ops._get_regen_state())
+        assert [pkg.cpvstr for pkg in pkgs] == ["cat/pkg-2"]
@@ -2,7 +2,9 @@ import os
 from functools import partial
 
 import pytest
+from pkgcore import const
 from pkgcore.fetch import base, errors, fetchable
+from pkgcore.util import chksum_memo, multihash
 from snakeoil import data_source
 from snakeoil.chksum import get_handlers
 
@@ -124,3 +126,49 @@ class TestFetcher:
         alt_handlers = {chf: partial(f, chf) for chf in chksums}
         assert None == self.fetcher._verify(self.fp, self.obj, handlers=alt_handlers)
         assert sorted(l) == sorted(alt_handlers)
+
+    def test_stamps(self, tmpdir, monkeypatch):
+        hashed = []
+        orig_hash_file = multihash.hash_file
+
+        def hash_file(path, chfs):
+            hashed.append(sorted(chfs))
+            return orig_hash_file(path, chfs)
+
+        monkeypatch.setattr(multihash, "hash_file", hash_file)
+        self.fetcher.stamps = chksum_memo.ChksumMemo(
+            os.path.join(str(tmpdir), "stamps"), str(tmpdir)
+        )
+        non_size = sorted(x for x in chksums if x != "size")
+        self.write_data()
+        self.fetcher._verify(self.fp, self.obj)
+        assert hashed == [non_size]
+        # unchanged files are verified against the recorded chksums
+        self.fetcher._verify(self.fp, self.obj)
+        assert hashed == [non_size]
+        obj = fetchable(self.fp, chksums={**chksums, known_chksum: 0})
+        with pytest.raises(errors.ChksumFailure) as excinfo:
+            self.fetcher._verify(self.fp, obj)
+        assert excinfo.value.chksum == known_chksum
+        assert hashed == [non_size]
+
+        # forced verification always hashes files
+        self.fetcher.force_verify = True
+        self.fetcher._verify(self.fp, self.obj)
+        assert hashed == [non_size] * 2
+        self.fetcher.force_verify = False
+
+        # modified files are rehashed
+        st = os.stat(self.fp)
+        self.write_data(data[:-1] + "!")
+        os.utime(self.fp, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        with pytest.raises(errors.ChksumFailure):
+            self.fetcher._verify(self.fp, self.obj)
+        assert hashed == [non_size] * 3
+
+    def test_distfile_stamps(self, tmpdir):
+        stamps = base.distfile_stamps(str(tmpdir))
+        assert stamps is base.distfile_stamps(str(tmpdir))
+        # stamps are trusted, so they can't live in the user cache directory
+        assert stamps.secure
+        assert stamps.path.startswith(const.SYSTEM_CACHE_PATH + os.sep)
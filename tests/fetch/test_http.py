@@ -0,0 +1,222 @@
+import os
+import stat
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+from snakeoil.chksum import get_handlers
+
+from pkgcore.fetch import errors, fetchable, http
+from pkgcore.util import chksum_memo
+
+data = b"pkgcore" * 100000
+
+
+def chksums(content, chfs=("size", "sha512", "blake2b")):
+    handlers = get_handlers(chfs)
+    values = {}
+    for chf, handler in handlers.items():
+        hasher = handler.new()()
+        hasher.update(content)
+        values[chf] = int(hasher.hexdigest(), 16)
+    return values
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(
+            (self.path, self.headers.get("Range"), self.client_address)
+        )
+        if self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/redirect") :])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content = server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        start = 0
+        if (byte_range := self.headers.get("Range")) and server.ranges:
+            start = int(byte_range.split("=")[1].rstrip("-"))
+            start = max(0, start - server.range_shift)
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        else:
+            self.send_response(200)
+        body = content[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.truncate is not None:
+            # simulate a dropped connection after partial data
+            self.wfile.write(body[: server.truncate])
+            server.truncate = None
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.files = {}
+    server.requests = []
+    server.ranges = True
+    server.range_shift = 0
+    server.truncate = None
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestFetcher:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path, server):
+        self.distdir = tmp_path
+        self.server = server
+        self.fetcher = http.fetcher(str(tmp_path), attempts=4)
+
+    def target(self, *paths, content=data, filename="file.tar.gz"):
+        for path in paths:
+            self.server.files.setdefault(path, content)
+        uris = [f"{self.server.url}{path}" for path in paths]
+        return fetchable(filename, uri=uris, chksums=chksums(content))
+
+    def test_fetch(self):
+        target = self.target("/file.tar.gz")
+        path = self.fetcher(target)
+        assert path == str(self.distdir / "file.tar.gz")
+        assert (self.distdir / "file.tar.gz").read_bytes() == data
+        # existing files are verified without refetching
+        assert self.fetcher(target) == path
+        assert len(self.server.requests) == 1
+
+    def test_connection_reuse(self):
+        for i in range(3):
+            self.fetcher(self.target(f"/{i}", filename=str(i)))
+        assert len(self.server.requests) == 3
+        assert len({x[2] for x in self.server.requests}) == 1
+
+    def test_failover(self):
+        target = self.target("/missing", "/redirect/file.tar.gz")
+        del self.server.files["/missing"]
+        self.server.files["/file.tar.gz"] = data
+        assert self.fetcher(target)
+        assert [x[0] for x in self.server.requests] == [
+            "/missing",
+            "/redirect/file.tar.gz",
+            "/file.tar.gz",
+        ]
+
+    def test_resume(self):
+        target = self.target("/file.tar.gz")
+        (self.distdir / "file.tar.gz").write_bytes(data[:1000])
+        assert self.fetcher(target)
+        assert (self.distdir / "file.tar.gz").read_bytes() == data
+        assert self.server.requests[0][1] == "bytes=1000-"
+
+    def test_resume_wrong_range(self):
+        # partial responses not starting at the requested offset are refetched
+        self.server.range_shift = 100
+        target = self.target("/file.tar.gz")
+        (self.distdir / "file.tar.gz").write_bytes(data[:1000])
+        assert self.fetcher(target)
+        assert (self.distdir / "file.tar.gz").read_bytes() == data
+        assert [x[1] for x in self.server.requests] == ["bytes=1000-", None]
+
+    def test_resume_unsupported(self):
+        self.server.ranges = False
+        target = self.target("/file.tar.gz")
+        (self.distdir / "file.tar.gz").write_bytes(b"garbage")
+        assert self.fetcher(target)
+        assert (self.distdir / "file.tar.gz").read_bytes() == data
+
+    def test_interrupted(self):
+        self.server.truncate = 5000
+        target = self.target("/file.tar.gz", "/other")
+        assert self.fetcher(target)
+        assert (self.distdir / "file.tar.gz").read_bytes() == data
+        # interrupted transfers are resumed from the same URI
+        assert [x[:2] for x in self.server.requests] == [
+            ("/file.tar.gz", None),
+            ("/file.tar.gz", "bytes=5000-"),
+        ]
+
+    def test_chksum_failure(self):
+        target = self.target("/file.tar.gz", content=data[:-1] + b"!")
+        target.chksums = chksums(data)
+        with pytest.raises(errors.ChksumFailure):
+            self.fetcher(target)
+
+    def test_missing(self):
+        target = self.target("/missing")
+        del self.server.files["/missing"]
+        with pytest.raises(errors.FetchFailed):
+            self.fetcher(target)
+        assert not (self.distdir / "file.tar.gz").exists()
+
+    def test_unsupported_scheme(self):
+        target = self.target("/file.tar.gz")
+        target.uri = ["ftp://example.com/file.tar.gz"] + list(target.uri)
+        assert self.fetcher(target)
+
+    def test_progress(self):
+        reports = []
+        self.fetcher.progress = lambda *args: reports.append(args)
+        self.fetcher.blocksize = 4096
+        target = self.target("/file.tar.gz")
+        (self.distdir / "file.tar.gz").write_bytes(data[:1000])
+        assert self.fetcher(target)
+        # resumed transfers include the existing data
+        assert reports[0] == ("file.tar.gz", 5096, len(data))
+        assert reports[-1] == ("file.tar.gz", len(data), len(data))
+        assert [x[1] for x in reports] == sorted(x[1] for x in reports)
+
+    @pytest.mark.skipif(os.getuid() != 0, reason="need to be root")
+    def test_userpriv(self):
+        target = self.target("/file.tar.gz")
+        path = self.distdir / "file.tar.gz"
+        ids = (os.geteuid() + 1000, os.getegid() + 1000)
+        with mock.patch.object(http, "is_userpriv_capable", return_value=True):
+            with mock.patch.multiple(http, portage_uid=ids[0], portage_gid=ids[1]):
+                assert self.fetcher(target)
+        st = path.stat()
+        # distfiles are accessible to userpriv fetchers
+        assert (st.st_uid, st.st_gid) == ids
+        assert stat.S_IMODE(st.st_mode) == 0o664
+
+        # ownership is left alone when disabled
+        path.unlink()
+        self.fetcher.userpriv = False
+        with mock.patch.object(http, "is_userpriv_capable", return_value=True):
+            assert self.fetcher(target)
+        assert path.stat().st_uid == os.geteuid()
+
+    def test_stamps(self, tmp_path):
+        stamps = chksum_memo.ChksumMemo(str(tmp_path / "stamps"), str(self.distdir))
+        self.fetcher.stamps = stamps
+        target = self.target("/file.tar.gz")
+        path = self.fetcher(target)
+        # chksums calculated while downloading are recorded
+        assert stamps.get(path, os.stat(path)) == target.chksums
@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from pkgcore.fetch import custom, fetchable
+from pkgcore.fetch.pipeline import FetchPipeline, HostLimiter
+
+
+class RecordingObserver:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, msg, *args):
+        self.messages.append(("info", msg % args))
+
+    def error(self, msg, *args):
+        self.messages.append(("error", msg % args))
+
+
+class TestHostLimiter:
+    def test_hosts(self):
+        limiter = HostLimiter(1)
+        assert limiter("https://a.org/foo") is limiter("http://user@A.org/bar")
+        assert limiter("https://a.org/foo") is not limiter("https://b.org/foo")
+
+    def test_limit(self):
+        limiter = HostLimiter(2)
+        lock = threading.Lock()
+        active = []
+        concurrent = []
+
+        def fetch(uri):
+            with limiter(uri):
+                with lock:
+                    active.append(uri)
+                    concurrent.append(len(active))
+                time.sleep(0.05)
+                with lock:
+                    active.remove(uri)
+
+        threads = [
+            threading.Thread(target=fetch, args=(f"https://a.org/{i}",))
+            for i in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert max(concurrent) == 2
+
+
+class TestFetchPipeline:
+    def test_fetch(self):
+        observer = RecordingObserver()
+        fetched = []
+        files = [fetchable(f"file{i}") for i in range(4)]
+
+        def fetch(target):
+            fetched.append(target.filename)
+            if target.filename == "file2":
+                raise OSError("failed")
+            return target.filename != "file3"
+
+        with FetchPipeline(2, observer=observer) as pipeline:
+            pipeline.submit(files[:3], fetch)
+            # files are only fetched once
+            pipeline.submit(files[1:], fetch)
+            assert pipeline.wait(files[:2]) == []
+            assert pipeline.wait(files) == files[2:]
+            # unknown files are ignored
+            assert pipeline.wait([fetchable("unknown")]) == []
+        assert sorted(fetched) == ["file0", "file1", "file2", "file3"]
+        assert ("info", "fetching file0") in observer.messages
+        errors = sorted(msg for level, msg in observer.messages if level == "error")
+        assert [x.rsplit(" ", 1)[0] for x in errors] == [
+            "failed fetching file2",
+            "failed fetching file3",
+        ]
+
+    def test_concurrency(self):
+        barrier = threading.Barrier(3, timeout=10)
+        files = [fetchable(f"file{i}") for i in range(3)]
+        with FetchPipeline(3) as pipeline:
+            pipeline.submit(files, lambda target: barrier.wait() is not None)
+            assert pipeline.wait(files) == []
+
+    def test_progress(self):
+        observer = RecordingObserver()
+        files = [fetchable("file0"), fetchable("file1")]
+
+        def fetch(target):
+            pipeline.progress(target.filename, 1 << 20, 4 << 20)
+            pipeline.progress(target.filename, 3 << 20, None)
+            return True
+
+        with FetchPipeline(1, observer=observer, interval=0) as pipeline:
+            pipeline.submit(files, fetch)
+            assert pipeline.wait(files) == []
+            # untracked files aren't reported
+            pipeline.interval = 5
+            pipeline.progress("file0", 1, 2)
+        messages = [msg for level, msg in observer.messages]
+        assert messages[:4] == [
+            "fetching file0",
+            "fetching file0: 1024/4096 KiB (25%)",
+            "fetching file0: 3072 KiB",
+            "fetched file0 (1/2)",
+        ]
+        assert len(messages) == 8
+
+        # reports are throttled per file
+        observer.messages.clear()
+        with FetchPipeline(1, observer=observer, interval=60) as pipeline:
+            pipeline.submit(files[:1], fetch)
+            assert pipeline.wait(files) == []
+        assert [msg for level, msg in observer.messages] == [
+            "fetching file0",
+            "fetched file0 (1/1)",
+        ]
+
+    def test_shutdown(self):
+        event = threading.Event()
+        files = [fetchable(f"file{i}") for i in range(3)]
+        pipeline = FetchPipeline(1)
+        pipeline.submit(files, lambda target: event.wait(10))
+        event.set()
+        pipeline.shutdown()
+        # queued fetches are cancelled
+        assert pipeline.wait(files[:1]) == []
+        assert set(pipeline.wait(files)).issubset(files[1:])
+
+
+def test_custom_fetcher_limiter(tmp_path):
+    uris = []
+
+    @contextmanager
+    def limiter(uri):
+        uris.append(uri)
+        yield
+
+    fetcher = custom.fetcher(
+        str(tmp_path),
+        'printf asdf > "${DISTDIR}/${FILE}" # ${URI}',
+        userpriv=False,
+        limiter=limiter,
+    )
+    target = fetchable(
+        "foo", uri=["https://a.org/foo", "https://b.org/foo"], chksums={"size": 4}
+    )
+    assert fetcher.fetch(target) == str(tmp_path / "foo")
+    assert uris == ["https://a.org/foo"]
@@ -1,13 +1,33 @@
 from collections import OrderedDict
 from functools import partial
+from itertools import chain
 
-from pkgcore.repository.multiplex import tree
+from pkgcore.ebuild.cpv import VersionedCPV
+from pkgcore.repository.misc import caching_repo, multiplex_sorting_repo
+from pkgcore.repository.multiplex import _merge_params, tree
+from pkgcore.resolver.plan import highest_iter_sort, lowest_iter_sort
 from pkgcore.repository.util import SimpleTree
 from pkgcore.restrictions import packages, values
 
 rev_sorted = partial(sorted, reverse=True)
 
 
+class RepoPkg(VersionedCPV):
+    __slots__ = ("repo",)
+
+    def __init__(self, repo, *args):
+        super().__init__(*args)
+        object.__setattr__(self, "repo", repo)
+
+
+class RepoTree(SimpleTree):
+    """Tree whose packages reference it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.package_class = partial(RepoPkg, self)
+
+
 class TestMultiplex:
     kls = staticmethod(tree)
     tree1_pkgs = (
@@ -60,3 +80,53 @@ class TestMultiplex:
             x.cpvstr
             for x in self.ctree.itermatch(packages.AlwaysTrue, sorter=rev_sorted)
         ) == rev_sorted(self.tree1_list + self.tree2_list)
+
+    def test_sorting_merge(self):
+        expected = sorted(self.tree1_list + self.tree2_list)
+        restrict = packages.AlwaysTrue
+        assert [
+            x.cpvstr for x in self.ctree.itermatch(restrict, sorter=sorted)
+        ] == expected
+
+        # arbitrary sorters are merged via pairwise comparisons
+        def sorter(l):
+            return sorted(l, reverse=True)
+
+        assert [
+            x.cpvstr for x in self.ctree.itermatch(restrict, sorter=sorter)
+        ] == expected[::-1]
+
+        # matches across many repos are streamed in order
+        trees = [SimpleTree({"cat": {"pkg": [str(x)]}}) for x in range(20, 0, -1)]
+        ctree = self.kls(*trees)
+        assert [x.fullver for x in ctree.itermatch(restrict, sorter=rev_sorted)] == [
+            str(x) for x in range(20, 0, -1)
+        ]
+        assert [x.fullver for x in ctree.itermatch(restrict, sorter=sorted)] == [
+            str(x) for x in range(1, 21)
+        ]
+
+    def test_sorting_resolver_sorters(self):
+        tree1 = RepoTree(self.d1, livefs=True)
+        tree2 = RepoTree(self.d2)
+        trees = [tree2, tree1]
+        pkg = next(iter(tree1))
+        for sorter, reverse, rank in (
+            (highest_iter_sort, True, 1),
+            (lowest_iter_sort, False, 0),
+        ):
+            # resolver sorters are merged by key instead of pairwise sorting
+            key, merge_reverse = _merge_params(sorter)
+            assert merge_reverse == reverse
+            assert key((pkg,)) == (pkg, rank)
+            key, _ = _merge_params(partial(sorter, pkg_grabber=lambda x: x))
+            assert key(pkg) == (pkg, rank)
+
+            # per-repo sorted matches are merged with equal packages ordered
+            # by livefs status
+            dbs = [caching_repo(x, partial(sorted, reverse=reverse)) for x in trees]
+            repo = multiplex_sorting_repo(sorter, dbs)
+            expected = [x[0] for x in sorter([(x,) for x in chain(tree1, tree2)])]
+            assert [
+                (x.cpvstr, x.repo) for x in repo.itermatch(packages.AlwaysTrue)
+            ] == [(x.cpvstr, x.repo) for x in expected]
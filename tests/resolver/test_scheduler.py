@@ -0,0 +1,132 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pkgcore.resolver.scheduler import BuildScheduler, build_graph
+from pkgcore.test.misc import FakePkg
+
+
+def mk_op(cpv, desc="add", **deps):
+    data = {k.upper(): v for k, v in deps.items()}
+    return SimpleNamespace(desc=desc, pkg=FakePkg(cpv, eapi="8", data=data))
+
+
+class TestBuildGraph:
+    def test_deps(self):
+        ops = [
+            mk_op("dev-libs/a-1"),
+            mk_op("dev-libs/b-1"),
+            mk_op("dev-libs/c-1", depend=">=dev-libs/a-1", rdepend="dev-libs/d"),
+            mk_op("dev-libs/d-1", bdepend="|| ( dev-libs/b dev-libs/c )"),
+            mk_op("dev-libs/e-1", idepend="<dev-libs/a-1 !dev-libs/b"),
+        ]
+        # deps are only matched against previous ops and blockers are ignored
+        assert build_graph(ops) == [set(), set(), {0}, {1, 2}, set()]
+
+    def test_remove_barrier(self):
+        ops = [
+            mk_op("dev-libs/a-1"),
+            mk_op("dev-libs/b-1"),
+            mk_op("dev-libs/c-1", desc="remove"),
+            mk_op("dev-libs/d-1"),
+            mk_op("dev-libs/e-1", desc="remove"),
+            mk_op("dev-libs/f-1", rdepend="dev-libs/a"),
+        ]
+        assert build_graph(ops) == [set(), set(), {0, 1}, {2}, {2, 3}, {0, 4}]
+
+
+class TestBuildScheduler:
+    def run_ops(self, ops, results=(), **kwargs):
+        merged = []
+        sched = BuildScheduler(ops, **kwargs)
+        ret = sched.run(
+            lambda op: results.get(op.pkg.key, op.pkg.cpvstr) if results else op,
+            lambda op, result: merged.append(op.pkg.key) or result is not None,
+        )
+        return ret, merged, sched
+
+    def test_sequential(self):
+        ops = [mk_op(f"dev-libs/{x}-1") for x in "abc"]
+        ret, merged, _ = self.run_ops(ops)
+        assert ret
+        assert merged == ["dev-libs/a", "dev-libs/b", "dev-libs/c"]
+
+    def test_concurrent(self):
+        ops = [
+            mk_op("dev-libs/a-1"),
+            mk_op("dev-libs/b-1"),
+            mk_op("dev-libs/c-1", depend="dev-libs/a dev-libs/b"),
+        ]
+        barrier = threading.Barrier(2, timeout=10)
+        merged = []
+
+        def build(op):
+            # independent builds must run at the same time
+            if op.pkg.package != "c":
+                barrier.wait()
+            else:
+                assert sorted(merged) == ["dev-libs/a", "dev-libs/b"]
+            return op
+
+        sched = BuildScheduler(ops, jobs=2)
+        assert sched.run(build, lambda op, result: merged.append(op.pkg.key))
+        assert merged[-1] == "dev-libs/c"
+
+    @pytest.mark.parametrize(("load", "expected"), ((5, 1), (0.5, 3)))
+    def test_load_average(self, load, expected):
+        ops = [mk_op(f"dev-libs/{x}-1") for x in "abc"]
+        lock = threading.Lock()
+        running = []
+        concurrent = []
+
+        def build(op):
+            with lock:
+                running.append(op)
+                concurrent.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.remove(op)
+            return op
+
+        sched = BuildScheduler(ops, jobs=3, load_average=1, getloadavg=lambda: (load,))
+        sched.poll_interval = 0.01
+        assert sched.run(build, lambda op, result: True)
+        assert max(concurrent) == expected
+
+    @pytest.mark.parametrize("failure", ("build", "merge"))
+    def test_failures(self, failure):
+        ops = [
+            mk_op("dev-libs/a-1"),
+            mk_op("dev-libs/b-1", rdepend="dev-libs/a"),
+            mk_op("dev-libs/c-1", rdepend="dev-libs/b"),
+            mk_op("dev-libs/d-1"),
+        ]
+        results = {"dev-libs/a": False if failure == "build" else None}
+
+        # only dependents of failed ops are skipped
+        ret, merged, sched = self.run_ops(ops, results, ignore_failures=True)
+        assert not ret
+        assert [x.pkg.key for x in sched.failed] == ["dev-libs/a"]
+        assert [x.pkg.key for x in sched.skipped] == ["dev-libs/b", "dev-libs/c"]
+        assert "dev-libs/d" in merged
+
+        # all remaining ops are skipped
+        ret, merged, sched = self.run_ops(ops, results)
+        assert not ret
+        assert [x.pkg.key for x in sched.failed] == ["dev-libs/a"]
+        assert [x.pkg.key for x in sched.skipped] == [
+            "dev-libs/b",
+            "dev-libs/c",
+            "dev-libs/d",
+        ]
+
+    def test_exceptions(self):
+        ops = [mk_op("dev-libs/a-1"), mk_op("dev-libs/b-1")]
+
+        def build(op):
+            raise ValueError(op.pkg.key)
+
+        with pytest.raises(ValueError):
+            BuildScheduler(ops).run(build, lambda op, result: True)
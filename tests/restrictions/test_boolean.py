@@ -1,11 +1,37 @@
+from itertools import product
+
 import pytest
 
-from pkgcore.restrictions import boolean, restriction
+from pkgcore.restrictions import boolean, restriction, values
 
 true = restriction.AlwaysBool(node_type="foo", negate=True)
 false = restriction.AlwaysBool(node_type="foo", negate=False)
 
 
+def assert_compiled(restrict, vals=range(4)):
+    func = restrict.compile()
+    for val in vals:
+        assert func(val) == restrict.match(val), f"{restrict!r} mismatch for {val!r}"
+
+
+def iter_compile_trees(kls):
+    """Yield nested restrictions mixing constants, values, and negations."""
+    leaves = (
+        true,
+        false,
+        values.EqualityMatch(1),
+        values.EqualityMatch(2, negate=True),
+        values.FunctionRestriction(lambda x: x % 2),
+    )
+    for children, negate in product(product(leaves, repeat=2), (False, True)):
+        yield kls(*children, negate=negate)
+        for nested_kls, nested_negate in product(
+            (boolean.AndRestriction, boolean.OrRestriction), (False, True)
+        ):
+            nested = nested_kls(*children, negate=nested_negate)
+            yield kls(values.EqualityMatch(3, negate=True), nested, negate=negate)
+
+
 class AlwaysForcableBool(boolean.base):
     __slots__ = ()
 
@@ -99,6 +125,30 @@ class TestAndRestriction(base):
         assert self.kls(false, false, node_type="foo", negate=True).match(None)
         assert not self.kls(true, true, node_type="foo", negate=True).match(None)
 
+    def test_compile(self):
+        for r in iter_compile_trees(self.kls):
+            assert_compiled(r)
+        assert_compiled(self.kls())
+        assert_compiled(
+            self.kls(*(values.EqualityMatch(x, negate=True) for x in range(100)))
+        )
+
+        # constant children are collapsed
+        assert restriction.compile_node(self.kls(true, true)) == (0, True)
+        assert restriction.compile_node(self.kls(true, false)) == (0, False)
+        assert restriction.compile_node(self.kls(false, negate=True)) == (0, True)
+
+        # cheaper checks run first
+        calls = []
+        r = self.kls(
+            values.FunctionRestriction(calls.append),
+            self.kls(values.EqualityMatch(0), values.StrExactMatch("0")),
+        )
+        assert not r.compile()(1)
+        assert not calls
+        assert r.compile()(0)
+        assert calls == [0]
+
     def test_dnf_solutions(self):
         assert self.kls(true, true).dnf_solutions() == [[true, true]]
         assert self.kls(self.kls(true, true), true).dnf_solutions() == [
@@ -142,6 +192,26 @@ class TestOrRestriction(base):
             assert not self.kls(node_type="foo", negate=True, *x).match(None)
         assert self.kls(false, false, node_type="foo", negate=True).match(None)
 
+    def test_compile(self):
+        for r in iter_compile_trees(self.kls):
+            assert_compiled(r)
+        assert_compiled(self.kls())
+        assert_compiled(self.kls(*(values.EqualityMatch(x) for x in range(100))))
+
+        # constant children are collapsed
+        assert restriction.compile_node(self.kls(false, false)) == (0, False)
+        assert restriction.compile_node(self.kls(false, true)) == (0, True)
+        assert restriction.compile_node(self.kls(true, negate=True)) == (0, False)
+
+        # cheaper checks run first
+        calls = []
+        r = self.kls(
+            values.FunctionRestriction(calls.append, negate=True),
+            self.kls(values.EqualityMatch(0), values.StrExactMatch("1")),
+        )
+        assert r.compile()(0)
+        assert not calls
+
     def test_dnf_solutions(self):
         assert self.kls(true, true).dnf_solutions() == [[true], [true]]
         assert list(
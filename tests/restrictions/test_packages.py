@@ -1,3 +1,4 @@
+from itertools import product
 from types import SimpleNamespace
 
 import pytest
@@ -98,6 +99,33 @@ class TestPackageRestriction(TestRestriction):
         inst = self.kls("one.dar", AlwaysSelfIntersect())
         hash(inst)
 
+    def test_compile(self, caplog):
+        strexact = values.StrExactMatch
+        pkgs = (
+            SimpleNamespace(category="foon", package="dar"),
+            SimpleNamespace(category="dar", package="foon"),
+            SimpleNamespace(category="foon"),
+        )
+        for negate, child in product(
+            (False, True),
+            (strexact("foon"), values.AlwaysTrue, values.AlwaysFalse),
+        ):
+            for attr in ("category", "package", "package.missing"):
+                r = self.kls(attr, child, negate=negate)
+                func = r.compile()
+                for pkg in pkgs:
+                    assert func(pkg) == r.match(pkg), f"{r!r} mismatch for {pkg!r}"
+        assert not caplog.records
+
+        class foo:
+            def __getattr__(self, attr):
+                raise ValueError(attr)
+
+        func = self.kls("foon", strexact("foon")).compile()
+        with pytest.raises(ValueError):
+            func(foo())
+        assert len(caplog.records) == 1
+
 
 class values_callback(values.base):
     __slots__ = ("callback",)
@@ -182,6 +210,11 @@ class TestPackageRestrictionMulti:
             )
         ]
 
+        # multiple attributes are passed through when compiled
+        l.clear()
+        assert o.compile()(pkg)
+        assert l == [(None, [2, 1])]
+
 
 def test_conditional():
     p = (packages.PackageRestriction("one", values.AlwaysTrue),)
@@ -45,6 +45,13 @@ class TestBase(TestRestriction):
         self.assertNotForceTrue(false, args)
         self.assertForceFalse(false, args)
 
+    def test_compile(self):
+        # subclasses only overriding match() are matched via it
+        true = self.bool_kls(negate=False)
+        assert restriction.compile_node(true) == (restriction.default_cost, true.match)
+        assert true.compile()(None)
+        assert not self.bool_kls(negate=True).compile()(None)
+
 
 class TestAlwaysBool(TestRestriction):
     bool_kls = partial(restriction.AlwaysBool, "foo")
@@ -69,9 +76,24 @@ class TestAlwaysBool(TestRestriction):
         assert false_r == self.bool_kls(False)
         assert true_r != false_r
 
+    def test_compile(self):
+        true_r = self.bool_kls(True)
+        false_r = self.bool_kls(False)
+        assert restriction.compile_node(true_r) == (0, True)
+        assert restriction.compile_node(false_r) == (0, False)
+        assert true_r.compile()(None)
+        assert not false_r.compile()(None)
+        assert restriction.compile_node(restriction.Negate(true_r)) == (0, False)
+        negated = restriction.Negate(restriction.AnyMatch(NoneMatch(), "foo")).compile()
+        assert not negated([None])
+        assert negated(["spork"])
+        assert restriction.compile_node(restriction.FakeType(true_r, "foo")) == (
+            0,
+            True,
+        )
+
 
 class NoneMatch(restriction.base):
-
     """Only matches None."""
 
     __slots__ = ()
@@ -24,7 +24,6 @@ class TestBase(TestRestriction):
 
 
 class TestGetAttr(TestRestriction):
-
     """Test bits of GetAttrRestriction that differ from PackageRestriction."""
 
     def test_force(self):
@@ -401,3 +400,34 @@ class TestAnyMatch:
         restrict = values.AnyMatch(values.AlwaysTrue)
         assert restrict.force_True(None, None, list(range(2)))
         assert not restrict.force_False(None, None, list(range(2)))
+
+
+@pytest.mark.parametrize("negate", (True, False))
+@pytest.mark.parametrize(
+    "kls",
+    (
+        partial(values.StrRegex, "^fo+$"),
+        partial(values.StrRegex, "O", case_sensitive=False),
+        partial(values.StrRegex, "o", match=True),
+        partial(values.StrExactMatch, "foo"),
+        partial(values.StrExactMatch, "FOO", case_sensitive=False),
+        partial(values.StrGlobMatch, "fo"),
+        partial(values.StrGlobMatch, "OO", case_sensitive=False, prefix=False),
+        partial(values.EqualityMatch, "foo"),
+        partial(values.EqualityMatch, 1),
+        partial(values.ContainmentMatch, ("o", "x")),
+        partial(values.ContainmentMatch, ("o", "x"), match_all=True),
+    ),
+)
+def test_compile(kls, negate):
+    restrict = kls(negate=negate)
+    func = restrict.compile()
+    vals = ("foo", "Foo", "bar", "box", None, 1, ("o",), {"o", "x"}, frozenset("ox"))
+    for val in vals:
+        try:
+            expected = restrict.match(val)
+        except TypeError:
+            with pytest.raises(TypeError):
+                func(val)
+        else:
+            assert func(val) == expected, f"{restrict!r} mismatch for {val!r}"
@@ -1,3 +1,7 @@
+from snakeoil.chksum import LazilyHashedPath
+from snakeoil.test.argparse_helpers import FakeStreamFormatter
+
+from pkgcore.cache import flat_hash, sqlite
 from pkgcore.config import basics
 from pkgcore.config.hint import ConfigHint
 from pkgcore.scripts import pclonecache
@@ -40,3 +44,59 @@ class TestCommandline(ArgParseMixin):
                 }
             ),
         )
+
+    def test_clone(self, tmp_path):
+        eclass = tmp_path / "eclass" / "foo.eclass"
+        eclass.parent.mkdir()
+        eclass.write_text("# foo\n")
+        ebuild = tmp_path / "foo-1.ebuild"
+        ebuild.write_text("EAPI=8\n")
+        data = {
+            "EAPI": "8",
+            "INHERIT": "foo",
+            "SLOT": "0",
+            "_eclasses_": {"foo": LazilyHashedPath(str(eclass))},
+            "_chf_": LazilyHashedPath(str(ebuild)),
+        }
+        source = flat_hash.md5_cache(str(tmp_path / "source"))
+        for x in range(3):
+            source[f"cat/pkg-{x}"] = dict(data)
+        target_path = str(tmp_path / "target.sqlite")
+        sections = {
+            "source": basics.HardCodedConfigSection(
+                {"class": flat_hash.md5_cache, "location": str(tmp_path / "source")}
+            ),
+            "target": basics.HardCodedConfigSection(
+                {"class": sqlite.md5_cache, "location": target_path}
+            ),
+        }
+
+        def clone(*args):
+            options = self.parse("source", "target", *args, **sections)
+            out = FakeStreamFormatter()
+            options.main_func(options, out, FakeStreamFormatter())
+            return out.get_text_stream()
+
+        assert "3 updated, 0 unchanged, 0 deleted" in clone()
+        target = sqlite.md5_cache(target_path)
+        assert sorted(target) == ["cat/pkg-0", "cat/pkg-1", "cat/pkg-2"]
+        assert target["cat/pkg-0"] == source["cat/pkg-0"]
+
+        # only changed entries are copied
+        source["cat/pkg-0"] = dict(data, SLOT="1")
+        del source["cat/pkg-2"]
+        assert "1 updated, 1 unchanged, 0 deleted" in clone("--no-delete")
+        assert target["cat/pkg-0"]["SLOT"] == "1"
+        assert "0 updated, 2 unchanged, 1 deleted" in clone()
+        assert sorted(target) == ["cat/pkg-0", "cat/pkg-1"]
+
+        # incompatible caches are rejected
+        sections["target"] = basics.HardCodedConfigSection(
+            {"class": flat_hash.database, "location": str(tmp_path / "mtime")}
+        )
+        self.assertError(
+            "incompatible cache formats: can't import 'md5' entries into 'mtime' cache",
+            "source",
+            "target",
+            **sections,
+        )
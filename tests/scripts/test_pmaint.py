@@ -268,3 +268,76 @@ class TestRegen(ArgParseMixin):
         options = self.parse("fake", "--threads", "2", domain=make_domain())
         assert isinstance(options.repos[0], util.SimpleTree)
         assert options.threads == 2
+
+    def test_since(self):
+        options = self.parse("fake", domain=make_domain())
+        assert options.since is None
+        options = self.parse("fake", "--since", "HEAD~5", domain=make_domain())
+        assert options.since == "HEAD~5"
+
+    def test_processes(self):
+        options = self.parse("fake", domain=make_domain())
+        assert options.processes == 1
+        options = self.parse("fake", "--processes", "4", domain=make_domain())
+        assert options.processes == 4
+        self.assertError(
+            "argument -p/--processes: must be >= 1",
+            "fake",
+            "--processes",
+            "0",
+            domain=make_domain(),
+        )
+
+    def test_profile(self):
+        options = self.parse("fake", domain=make_domain())
+        assert options.profile_out is None
+        assert options.profile_top == 10
+        options = self.parse(
+            "fake",
+            "--profile-out",
+            "regen.json",
+            "--profile-top",
+            "5",
+            domain=make_domain(),
+        )
+        assert options.profile_out == "regen.json"
+        assert options.profile_top == 5
+
+
+class TestCache(ArgParseMixin):
+    _argparser = pmaint.cache
+
+    def test_parser(self):
+        options = self.parse("fake", "--threads", "2", domain=make_domain())
+        assert isinstance(options.repos[0], util.SimpleTree)
+        assert options.threads == 2
+        assert not options.prune
+        assert options.format == "text"
+        options = self.parse(
+            "fake", "--prune", "--format", "json", domain=make_domain()
+        )
+        assert options.prune
+        assert options.format == "json"
+        self.assertError(
+            "argument -t/--threads: must be >= 1",
+            "fake",
+            "--threads",
+            "0",
+            domain=make_domain(),
+        )
+
+
+class TestDistfiles(ArgParseMixin):
+    _argparser = pmaint.distfiles
+
+    def test_parser(self):
+        options = self.parse("fake", "--threads", "2", domain=make_domain())
+        assert isinstance(options.repos[0], util.SimpleTree)
+        assert options.threads == 2
+        self.assertError(
+            "argument -t/--threads: must be >= 1",
+            "fake",
+            "--threads",
+            "0",
+            domain=make_domain(),
+        )
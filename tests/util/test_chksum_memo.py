@@ -0,0 +1,128 @@
+import os
+from unittest import mock
+
+from pkgcore.util import chksum_memo
+
+
+class TestChksumMemo:
+    def mk_file(self, path, data="data"):
+        path.write_text(data)
+        return str(path), os.stat(path)
+
+    def test_get_update(self, tmp_path):
+        memo = chksum_memo.ChksumMemo(str(tmp_path / "memo"), str(tmp_path))
+        path, st = self.mk_file(tmp_path / "foo")
+        assert memo.get(path, st) == {}
+        memo.update(path, st, {"md5": 1})
+        assert memo.get(path, st) == {"md5": 1}
+        memo.update(path, st, {"sha512": 2})
+        assert memo.get(path, st) == {"md5": 1, "sha512": 2}
+
+        # modified files invalidate their entries
+        path, st = self.mk_file(tmp_path / "foo", "modified data")
+        assert memo.get(path, st) == {}
+        memo.update(path, st, {"md5": 3})
+        assert memo.get(path, st) == {"md5": 3}
+
+        # paths outside the root are ignored
+        path, st = self.mk_file(tmp_path.parent / "bar")
+        memo.update(path, st, {"md5": 1})
+        assert memo.get(path, st) == {}
+
+    def test_persistence(self, tmp_path):
+        memo_path = str(tmp_path / "cache" / "memo")
+        memo = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        path, st = self.mk_file(tmp_path / "foo")
+        memo.update(path, st, {"md5": 0xDEADBEEF, "size": 4})
+        memo.flush()
+
+        memo = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        assert memo.get(path, st) == {"md5": 0xDEADBEEF, "size": 4}
+
+        # moving the root location invalidates the memo
+        memo = chksum_memo.ChksumMemo(memo_path, str(tmp_path / "moved"))
+        assert not memo.entries
+
+    def test_secure(self, tmp_path):
+        memo_path = tmp_path / "cache" / "memo"
+        memo = chksum_memo.ChksumMemo(str(memo_path), str(tmp_path), secure=True)
+        path, st = self.mk_file(tmp_path / "foo")
+        memo.update(path, st, {"md5": 1})
+        memo.flush()
+        assert not memo_path.stat().st_mode & 0o022
+
+        memo = chksum_memo.ChksumMemo(str(memo_path), str(tmp_path), secure=True)
+        assert memo.get(path, st) == {"md5": 1}
+
+        # group or world writable memos are ignored
+        for mode in (0o664, 0o646):
+            memo_path.chmod(mode)
+            memo = chksum_memo.ChksumMemo(str(memo_path), str(tmp_path), secure=True)
+            assert memo.get(path, st) == {}
+            # insecure memos load regardless
+            memo = chksum_memo.ChksumMemo(str(memo_path), str(tmp_path))
+            assert "foo" in memo.entries
+        memo_path.chmod(0o644)
+
+        # memos owned by other users are ignored
+        with mock.patch("os.geteuid", return_value=os.geteuid() + 1):
+            memo = chksum_memo.ChksumMemo(str(memo_path), str(tmp_path), secure=True)
+            assert memo.get(path, st) == {}
+
+        # files modified in place with their mtime restored are invalidated
+        with open(path, "r+") as f:
+            f.write("DATA")
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        new_st = os.stat(path)
+        assert chksum_memo.stat_key(new_st) == chksum_memo.stat_key(st)
+        memo = chksum_memo.ChksumMemo(str(memo_path), str(tmp_path), secure=True)
+        assert memo.get(path, st) == {"md5": 1}
+        assert memo.get(path, new_st) == {}
+
+    def test_concurrent_flush(self, tmp_path):
+        memo_path = str(tmp_path / "cache" / "memo")
+        files = [self.mk_file(tmp_path / x) for x in ("a", "b", "c")]
+        memo = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        memo.update(*files[0], {"md5": 1})
+        memo.update(*files[1], {"md5": 1})
+        memo.flush()
+
+        # e.g. forked regen workers sharing the same memo
+        memo1 = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        memo2 = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        memo1.update(*files[1], {"md5": 2})
+        memo2.update(*files[2], {"md5": 3})
+        memo2.discard(files[0][0])
+        memo1.flush()
+        memo2.flush()
+
+        # changes from all writers are retained
+        memo = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        assert memo.get(*files[0]) == {}
+        assert memo.get(*files[1]) == {"md5": 2}
+        assert memo.get(*files[2]) == {"md5": 3}
+
+        # cleared memos replace the on disk data
+        memo.clear()
+        memo.update(*files[0], {"md5": 4})
+        memo.flush()
+        memo = chksum_memo.ChksumMemo(memo_path, str(tmp_path))
+        assert list(memo.entries) == ["a"]
+
+    def test_max_entries(self, tmp_path):
+        memo = chksum_memo.ChksumMemo(str(tmp_path / "memo"), str(tmp_path))
+        memo.max_entries = 2
+        files = [self.mk_file(tmp_path / x) for x in ("a", "b", "c")]
+        for path, st in files:
+            memo.update(path, st, {"md5": 1})
+        assert list(memo.entries) == ["b", "c"]
+
+        # recently used entries are retained
+        memo.get(*files[1])
+        memo.update(*files[0], {"md5": 1})
+        assert list(memo.entries) == ["b", "a"]
+
+    def test_get_memo(self, tmp_path):
+        memo = chksum_memo.get_memo("test", "repo", str(tmp_path))
+        assert memo is chksum_memo.get_memo("test", "repo", str(tmp_path))
+        assert memo is not chksum_memo.get_memo("test", "repo2", str(tmp_path))
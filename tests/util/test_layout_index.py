@@ -0,0 +1,79 @@
+import os
+
+from pkgcore.util import layout_index
+
+
+def age(path, seconds=60):
+    """Backdate a path's mtime so it's outside the index's racy window."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 10**9))
+
+
+class TestLayoutIndex:
+    def test_listdir(self, tmp_path):
+        index = layout_index.LayoutIndex(str(tmp_path / "index"), str(tmp_path))
+        (tmp_path / "cat" / "pkg").mkdir(parents=True)
+        calls = []
+
+        def listdir(path):
+            calls.append(path)
+            return sorted(os.listdir(path))
+
+        # recently modified dirs aren't indexed
+        assert index.listdir("cat", listdir) == ("pkg",)
+        assert index.listdir("cat", listdir) == ("pkg",)
+        assert len(calls) == 2
+        assert not index.entries
+
+        age(tmp_path / "cat")
+        assert index.listdir("cat", listdir) == ("pkg",)
+        assert index.listdir("cat", listdir) == ("pkg",)
+        assert len(calls) == 3
+        assert calls[-1] == str(tmp_path / "cat")
+
+        # modified dirs are reread
+        (tmp_path / "cat" / "pkg2").mkdir()
+        age(tmp_path / "cat", 30)
+        assert index.listdir("cat", listdir) == ("pkg", "pkg2")
+        assert len(calls) == 4
+
+        # the root dir is referenced via an empty path
+        age(tmp_path)
+        assert index.listdir("", listdir) == tuple(sorted(os.listdir(tmp_path)))
+        assert calls[-1] == str(tmp_path)
+
+    def test_persistence(self, tmp_path):
+        index_path = str(tmp_path / "cache" / "index")
+        index = layout_index.LayoutIndex(index_path, str(tmp_path))
+        (tmp_path / "cat" / "pkg").mkdir(parents=True)
+        (tmp_path / "empty").mkdir()
+        for x in ("cat", "empty"):
+            age(tmp_path / x)
+        assert index.listdir("cat", os.listdir) == ("pkg",)
+        assert index.listdir("empty", os.listdir) == ()
+        index.flush()
+
+        def _fail(path):
+            raise AssertionError(f"{path} reread")
+
+        index = layout_index.LayoutIndex(index_path, str(tmp_path))
+        assert index.listdir("cat", _fail) == ("pkg",)
+        assert index.listdir("empty", _fail) == ()
+
+        # moving the root location invalidates the index
+        index = layout_index.LayoutIndex(index_path, str(tmp_path / "moved"))
+        assert not index.entries
+
+    def test_max_entries(self, tmp_path):
+        index = layout_index.LayoutIndex(str(tmp_path / "index"), str(tmp_path))
+        index.max_entries = 2
+        for x in ("a", "b", "c"):
+            (tmp_path / x).mkdir()
+            age(tmp_path / x)
+            index.listdir(x, os.listdir)
+        assert list(index.entries) == ["b", "c"]
+
+    def test_get_index(self, tmp_path):
+        index = layout_index.get_index("repo", str(tmp_path))
+        assert index is layout_index.get_index("repo", str(tmp_path))
+        assert index is not layout_index.get_index("repo2", str(tmp_path))
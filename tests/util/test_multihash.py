@@ -0,0 +1,55 @@
+import pytest
+from snakeoil.chksum import MissingChksumHandler, get_chksums, get_handlers
+
+from pkgcore.util import multihash
+
+chfs = ("size", "sha512", "blake2b", "md5")
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    # force multiple reads per file
+    monkeypatch.setattr(multihash, "blocksize", 1000)
+    paths = []
+    for i, size in enumerate((0, 999, 1000, 12345)):
+        path = tmp_path / f"file{i}"
+        path.write_bytes(bytes(x % 251 for x in range(size)))
+        paths.append(str(path))
+    return paths
+
+
+def test_hash_file(files):
+    for path in files:
+        chksums = multihash.hash_file(path, chfs)
+        assert list(chksums) == list(chfs)
+        assert list(chksums.values()) == get_chksums(path, *chfs)
+    assert multihash.hash_file(files[-1], ["size"]) == {"size": 12345}
+
+
+def test_hash_files(files, tmp_path):
+    missing = str(tmp_path / "missing")
+    results = list(multihash.hash_files(files + [missing], chfs, threads=3))
+    assert [x[0] for x in results] == files + [missing]
+    for path, chksums in results[:-1]:
+        assert list(chksums.values()) == get_chksums(path, *chfs)
+    assert isinstance(results[-1][1], FileNotFoundError)
+
+
+def test_missing_handler(files):
+    with pytest.raises(MissingChksumHandler):
+        multihash.hash_file(files[0], ["sha512", "nonexistent"])
+    with pytest.raises(MissingChksumHandler):
+        list(multihash.hash_files(files, ["nonexistent"]))
+
+
+def test_new_hashers(monkeypatch):
+    hashers = multihash.new_hashers(x for x in ("md5", "sha512"))
+    assert sorted(hashers) == ["md5", "sha512"]
+
+    # handler lookups skipping unknown types are still caught for iterators
+    def known_handlers(chfs):
+        return get_handlers([x for x in chfs if x != "nonexistent"])
+
+    monkeypatch.setattr(multihash, "get_handlers", known_handlers)
+    with pytest.raises(MissingChksumHandler):
+        multihash.new_hashers(x for x in ("md5", "nonexistent"))